@@ -0,0 +1,153 @@
+"""
+响应压缩中间件
+按客户端Accept-Encoding选择brotli（安装了brotli包时）或gzip，小于compression_minimum_size的响应不压缩。
+流式响应（导出等）逐块压缩并立即发送，不需要等待完整响应；已压缩的内容类型（图片、Parquet等）原样发送。
+压缩级别由compression_profile在CPU和带宽之间取舍。
+"""
+
+from typing import Dict, Optional, Tuple
+import zlib
+
+import anyio.to_thread
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES, IdentityResponder
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .metrics import registry
+
+try:
+    import brotli
+except ImportError:  # 未安装brotli时只使用gzip
+    brotli = None
+
+# 压缩档位：(gzip级别, brotli质量)
+# speed适合CPU紧张、内网或带宽充足的部署；size适合带宽昂贵的公网/移动端；balanced为两者折中
+COMPRESSION_PROFILES: Dict[str, Tuple[int, int]] = {
+    "speed": (1, 1),
+    "balanced": (5, 4),
+    "size": (9, 9),
+}
+
+# 已经压缩过的内容类型，再压缩只浪费CPU（Parquet导出文件内部已按列压缩）
+EXCLUDED_CONTENT_TYPES = DEFAULT_EXCLUDED_CONTENT_TYPES + ("application/vnd.apache.parquet",)
+
+compression_input_bytes = registry.counter(
+    "http_compression_input_bytes_total", "Response bytes before compression", ("encoding",)
+)
+compression_output_bytes = registry.counter(
+    "http_compression_output_bytes_total", "Response bytes after compression", ("encoding",)
+)
+
+
+class _Responder(IdentityResponder):
+    """在Starlette的逐块压缩流程上统计压缩前后字节数，大块数据在线程中压缩，不阻塞事件循环"""
+    
+    thread_minimum_size = 128 * 1024
+    
+    async def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if len(body) >= self.thread_minimum_size:
+            compressed = await anyio.to_thread.run_sync(self.compress, body, more_body)
+        else:
+            compressed = self.compress(body, more_body)
+        compression_input_bytes.inc(len(body), encoding=self.content_encoding)
+        compression_output_bytes.inc(len(compressed), encoding=self.content_encoding)
+        return compressed
+    
+    def compress(self, body: bytes, more_body: bool) -> bytes:
+        raise NotImplementedError
+
+
+class GZipResponder(_Responder):
+    content_encoding = "gzip"
+    
+    def __init__(self, app: ASGIApp, minimum_size: int, level: int):
+        super().__init__(app, minimum_size, exclude_content_types=EXCLUDED_CONTENT_TYPES)
+        self.level = level
+        self.compressor = None
+    
+    def compress(self, body: bytes, more_body: bool) -> bytes:
+        # 确定需要压缩时才创建压缩器（高压缩级别的压缩器占用数百KB内存）
+        if self.compressor is None:
+            self.compressor = zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        # 流式响应每块都刷新输出，客户端可以立即解压已收到的部分
+        return self.compressor.compress(body) + self.compressor.flush(zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH)
+
+
+class BrotliResponder(_Responder):
+    content_encoding = "br"
+    
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int):
+        super().__init__(app, minimum_size, exclude_content_types=EXCLUDED_CONTENT_TYPES)
+        self.quality = quality
+        self.compressor = None
+    
+    def compress(self, body: bytes, more_body: bool) -> bytes:
+        if self.compressor is None:
+            self.compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=self.quality)
+        compressed = self.compressor.process(body)
+        return compressed + (self.compressor.flush() if more_body else self.compressor.finish())
+
+
+def accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    """解析Accept-Encoding，{编码: q值}"""
+    encodings = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        encodings[name.strip().lower()] = quality
+    return encodings
+
+
+class CompressionMiddleware:
+    """
+    gzip/brotli响应压缩
+    
+    Args:
+        app: ASGI应用
+        minimum_size: 小于该字节数的响应不压缩（压缩收益抵不过CPU和头部开销）
+        profile: 压缩档位（COMPRESSION_PROFILES）
+        enable_brotli: 客户端支持且安装了brotli时是否优先使用brotli
+    """
+    
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, profile: str = "balanced",
+                 enable_brotli: bool = True):
+        if profile not in COMPRESSION_PROFILES:
+            raise ValueError(f"未知的压缩档位: {profile}，可选: {', '.join(COMPRESSION_PROFILES)}")
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level, self.brotli_quality = COMPRESSION_PROFILES[profile]
+        self.enable_brotli = enable_brotli and brotli is not None
+    
+    def choose_encoding(self, accept_encoding: str) -> Optional[str]:
+        """按客户端偏好选择编码（q值相同时brotli优先），不可接受任何压缩编码时返回None"""
+        encodings = accepted_encodings(accept_encoding)
+        candidates = (["br"] if self.enable_brotli else []) + ["gzip"]
+        best, best_quality = None, 0.0
+        for encoding in candidates:
+            quality = encodings.get(encoding, encodings.get("*", 0.0))
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        encoding = self.choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding == "br":
+            responder = BrotliResponder(self.app, self.minimum_size, self.brotli_quality)
+        elif encoding == "gzip":
+            responder = GZipResponder(self.app, self.minimum_size, self.gzip_level)
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size, exclude_content_types=EXCLUDED_CONTENT_TYPES)
+        await responder(scope, receive, send)
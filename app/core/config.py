@@ -10,6 +10,19 @@ class Settings(BaseSettings):
     db_name: str = "hrepo_db"
     db_user: str = "user"
     db_password: str = "password"
+    db_pool_size: int = 10  # 连接池常驻连接数
+    db_max_overflow: int = 20  # 连接池满时最多额外创建的连接数
+    db_pool_timeout: float = 10  # 等待空闲连接的最长秒数，超时抛出错误
+    db_pool_recycle: int = 300  # 连接使用超过该秒数后重建
+    db_pool_slow_checkout: float = 1.0  # 等待连接超过该秒数时记录警告
+    db_statement_timeout: int = 0  # 单条SQL最长执行毫秒数（PostgreSQL statement_timeout），0为不限制
+    db_echo: bool = False  # 是否在日志中输出所有SQL语句（与debug无关）
+    database_replica_urls: str = ""  # 只读副本连接串，多个用逗号分隔；为空时所有查询走主库
+    db_replica_max_lag: float = 5.0  # 副本回放延迟超过该秒数时读取回退到主库
+    db_replica_lag_check_interval: float = 5.0  # 检测副本延迟的最短间隔秒数
+    db_replica_connect_timeout: int = 2  # 连接副本的超时秒数，副本不可达时尽快回退到主库
+    db_replica_sticky_seconds: float = 10.0  # 用户写入后该秒数内的读取仍走主库（读己之写）
+    contact_partitions: int = 0  # contacts表按user_id哈希分区的分区数，0为不分区；已有数据库修改后需执行迁移转换
     
     # FastAPI Configuration
     secret_key: str = "your-secret-key-here"
@@ -23,11 +36,75 @@ class Settings(BaseSettings):
     email_263_smtp_port: int = 587
     email_263_pop3_host: str = "pop.263.net"
     email_263_pop3_port: int = 995
+    password_hash_workers: int = 4  # 计算bcrypt/PBKDF2密码哈希的线程数（不宜超过CPU核数）
+    password_hash_max_pending: int = 64  # 排队和计算中的哈希任务上限，超过时请求返回503
     
     # Email Authentication Configuration
     email_auth_enabled: bool = True
     email_auth_timeout: int = 30
     email_ssl_verify: bool = True
+
+    # Email Send Rate Limit Configuration
+    email_send_account_rate: float = 0.5  # 每个邮箱账户每秒补充的发送令牌数
+    email_send_account_burst: float = 10  # 每个邮箱账户允许的突发发送数
+    email_send_domain_rate: float = 0.2  # 每个收件人域名每秒补充的发送令牌数
+    email_send_domain_burst: float = 5  # 每个收件人域名允许的突发发送数
+    email_send_max_wait: float = 30  # 单次发送最长排队秒数，超过则延迟并提示重试
+    email_smtp_idle_reconnect: float = 20  # 批量发送中限流等待超过该秒数时先关闭SMTP会话，等待后重新连接（避免服务器空闲超时断开）
+
+    # Email Sync Configuration
+    email_sync_batch_size: int = 200  # 每条UID FETCH命令获取的邮件头数量
+    email_idle_enabled: bool = False  # 是否启动IMAP IDLE推送监听
+    email_idle_folder: str = "INBOX"  # 监听的文件夹
+    email_idle_max_watchers: int = 100  # 最多同时监听的邮箱账户数
+    email_idle_refresh_interval: int = 60  # 刷新监听账户列表的间隔秒数
+    email_idle_sync_concurrency: int = 4  # 新邮件同步的最大并发数
+    email_idle_renew_seconds: int = 1740  # 重新发起IDLE的间隔秒数（RFC 2177建议不超过29分钟）
+    email_idle_poll_interval: int = 300  # 服务器不支持IDLE时的NOOP轮询间隔秒数
+    email_body_fetch_chunk_size: int = 1024 * 1024  # 获取邮件正文时每条FETCH读取的字节数
+    email_body_max_text_size: int = 1024 * 1024  # 邮件正文（纯文本+HTML）最多保存的字节数
+    email_attachment_spool_size: int = 1024 * 1024  # 附件超过该大小时写入磁盘临时文件再上传
+    email_attachment_url_expires: int = 3600  # 附件下载链接有效秒数
+
+    # Contact Import Configuration
+    contact_import_chunk_size: int = 1000  # 每批校验和写入的行数
+    contact_import_max_errors: int = 1000  # 最多返回的行错误数
+    contact_import_spool_size: int = 10 * 1024 * 1024  # 上传文件超过该大小时写入磁盘临时文件
+    contact_import_max_file_size: int = 200 * 1024 * 1024  # 上传文件大小上限
+    contact_import_workers: int = 2  # 同时执行的导入任务数
+    
+    # Batch Operation Configuration
+    batch_max_operations: int = 1000  # 单次批量操作的最大项数
+    
+    # Export Configuration
+    export_batch_size: int = 1000  # 导出时服务端游标每批读取的行数，也是每个输出数据块的行数
+    
+    # HTTP Cache Configuration（响应带ETag，客户端带If-None-Match重新请求时数据未变化返回304）
+    cache_control_contacts: str = "private, no-cache"  # 联系人列表的Cache-Control（no-cache为每次使用前向服务器验证）
+    cache_control_customer_statistics: str = "private, no-cache"  # 客户统计概览的Cache-Control
+    cache_control_email_template: str = "private, no-cache"  # 邮件模板详情的Cache-Control
+    
+    # Response Compression Configuration
+    compression_enabled: bool = True  # 是否压缩响应（反向代理已负责压缩时关闭）
+    compression_minimum_size: int = 1024  # 小于该字节数的响应不压缩
+    compression_profile: str = "balanced"  # 压缩档位：speed（省CPU）、balanced、size（省带宽）
+    compression_brotli: bool = True  # 客户端支持且安装了brotli包时优先使用brotli
+    
+    # Result Cache Configuration（联系人、客户列表查询结果缓存，写入提交后立即失效）
+    result_cache_backend: Optional[str] = None  # memory（进程内，多进程部署时其他进程最长ttl秒内可能读到旧数据）、redis（共享，使用redis_url）、none（关闭）；为空时设置了REDIS_URL用redis，否则关闭
+    result_cache_ttl: int = 60  # 缓存结果的最长保留秒数
+    result_cache_max_entries: int = 10000  # 进程内缓存的最多条目数（超过时淘汰最久未使用的）
+    
+    # Contact Dedup Configuration
+    contact_dedup_min_score: float = 0.8  # 判定为重复的最低相似度
+    contact_dedup_auto_merge_score: float = 1.0  # 自动合并的最低相似度（1为邮箱相同）
+    contact_dedup_auto_merge_min_score: float = 0.95  # 自动合并请求中min_score允许的最小值
+    contact_dedup_max_block_size: int = 200  # 分桶内联系人超过该数量时不做两两比较
+    
+    # Tag Reindex Configuration
+    tag_reindex_on_startup: bool = False  # 启动时在后台把旧版标签JSON转换为标签关联（每个工作进程都会启动，多进程部署建议用命令行执行）
+    tag_reindex_batch_size: int = 1000  # 每批转换的联系人数（每批一个短事务）
+    tag_reindex_pause: float = 0.05  # 每批之间的间隔秒数，避免持续占用数据库
     
     # Hunter.io API Configuration
     hunter_api_key: str = "your-hunter-api-key"
@@ -1,18 +1,415 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, exc, text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Set
+import functools
+import inspect
+import itertools
+import logging
+import threading
+import time
+
 from .config import settings
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Connection pool metrics
+pool_checkout_wait = registry.histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled database connection"
+)
+pool_checkout_timeouts = registry.counter(
+    "db_pool_checkout_timeouts_total", "Connection checkouts that failed with a pool timeout"
+)
+connection_hold_time = registry.histogram(
+    "db_pool_connection_hold_seconds", "Time a connection stays checked out of the pool"
+)
+session_duration = registry.histogram(
+    "db_session_duration_seconds", "Lifetime of request-scoped database sessions"
+)
+sessions_active = registry.gauge(
+    "db_sessions_active", "Request-scoped database sessions currently open"
+)
+read_routing = registry.counter(
+    "db_read_routing_total", "Statements issued inside read-only service methods, by target", ("target",)
+)
+replica_lag = registry.gauge(
+    "db_replica_lag_seconds", "Last measured replay lag per replica (-1 when unreachable)", ("replica",)
+)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waits for a free connection"""
+    
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_checkout_timeouts.inc()
+            logger.warning(
+                f"Database pool exhausted: {self.checkedout()} connections in use "
+                f"(pool_size={self.size()}, max_overflow={self._max_overflow})"
+            )
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            pool_checkout_wait.observe(waited)
+            if waited >= settings.db_pool_slow_checkout:
+                logger.warning(f"Waited {waited:.3f}s for a database connection ({self.checkedout()} in use)")
+
+
+def _connect_args(url: str, connect_timeout: Optional[int] = None) -> dict:
+    """Driver connect arguments (server-side statement timeout and connect timeout for PostgreSQL)"""
+    args = {}
+    if url.startswith("postgresql"):
+        if settings.db_statement_timeout:
+            args["options"] = f"-c statement_timeout={settings.db_statement_timeout}"
+        if connect_timeout:
+            args["connect_timeout"] = connect_timeout
+    return args
+
 
 # Create database engine
 engine = create_engine(
     settings.database_url,
+    poolclass=InstrumentedQueuePool,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
     pool_pre_ping=True,
-    pool_recycle=300,
-    echo=settings.debug
+    connect_args=_connect_args(settings.database_url),
+    echo=settings.db_echo
 )
 
+registry.gauge("db_pool_size", "Configured connection pool size", function=lambda: engine.pool.size())
+registry.gauge("db_pool_checked_out", "Connections currently in use", function=lambda: engine.pool.checkedout())
+registry.gauge("db_pool_checked_in", "Idle connections in the pool", function=lambda: engine.pool.checkedin())
+registry.gauge("db_pool_overflow", "Overflow connections currently open", function=lambda: engine.pool.overflow())
+
+
+@event.listens_for(engine, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    connection_record.info["checkout_at"] = time.perf_counter()
+
+
+@event.listens_for(engine, "checkin")
+def _on_checkin(dbapi_connection, connection_record):
+    checkout_at = connection_record.info.pop("checkout_at", None)
+    if checkout_at is not None:
+        connection_hold_time.observe(time.perf_counter() - checkout_at)
+
+
+# Replay lag of a streaming replica; a server that is not in recovery (or has replayed
+# everything it received) reports zero
+REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class ReplicaRouter:
+    """Picks a read replica whose replay lag is within db_replica_max_lag
+    
+    Lag is measured at most once per db_replica_lag_check_interval per replica, on a background
+    thread started when a request finds the measurement due; requests never wait for the probe and
+    use the last known value (a replica is not used until its first probe succeeds). Users who
+    committed a write within db_replica_sticky_seconds keep reading from the primary (tracked per
+    process, so the lag limit is what bounds staleness when requests of the same user hit
+    different workers).
+    """
+    
+    def __init__(self, engines: List):
+        self.engines = engines
+        self._lag: List[Optional[float]] = [None] * len(engines)
+        self._checked_at = [float("-inf")] * len(engines)
+        self._checking = [False] * len(engines)
+        self._recent_writers: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._next = itertools.count()
+    
+    def _refresh(self, index: int):
+        """Start a background lag probe for the replica if one is due and none is running"""
+        with self._lock:
+            if self._checking[index] or \
+                    time.monotonic() - self._checked_at[index] < settings.db_replica_lag_check_interval:
+                return
+            self._checking[index] = True
+        threading.Thread(target=self._probe, args=(index,), name=f"replica-probe-{index}", daemon=True).start()
+    
+    def _probe(self, index: int):
+        lag = None
+        try:
+            with self.engines[index].connect() as connection:
+                lag = float(connection.execute(REPLICA_LAG_SQL).scalar() or 0)
+        except Exception as e:
+            logger.warning(f"Replica {index} health check failed: {e}")
+        finally:
+            with self._lock:
+                self._lag[index] = lag
+                self._checked_at[index] = time.monotonic()
+                self._checking[index] = False
+        replica_lag.set(-1 if lag is None else lag, replica=str(index))
+        if lag is not None and lag > settings.db_replica_max_lag:
+            logger.warning(f"Replica {index} is {lag:.1f}s behind, reading from the primary")
+    
+    def choose(self):
+        """Next healthy replica engine (round robin), or None when all are lagging or unreachable"""
+        start = next(self._next)
+        for offset in range(len(self.engines)):
+            index = (start + offset) % len(self.engines)
+            self._refresh(index)
+            lag = self._lag[index]
+            if lag is not None and lag <= settings.db_replica_max_lag:
+                return self.engines[index]
+        return None
+    
+    def record_writes(self, user_ids: Iterable[int]):
+        now = time.monotonic()
+        with self._lock:
+            for user_id in user_ids:
+                self._recent_writers[user_id] = now
+            if len(self._recent_writers) > 10000:
+                cutoff = now - settings.db_replica_sticky_seconds
+                self._recent_writers = {
+                    user_id: at for user_id, at in self._recent_writers.items() if at >= cutoff
+                }
+    
+    def wrote_recently(self, user_id: Optional[int]) -> bool:
+        if user_id is None:
+            return False
+        written_at = self._recent_writers.get(user_id)
+        return written_at is not None and time.monotonic() - written_at < settings.db_replica_sticky_seconds
+
+
+replica_urls = [url.strip() for url in settings.database_replica_urls.split(",") if url.strip()]
+replica_router = ReplicaRouter([
+    create_engine(
+        url,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=True,
+        connect_args=_connect_args(url, settings.db_replica_connect_timeout),
+        echo=settings.db_echo
+    )
+    for url in replica_urls
+]) if replica_urls else None
+
+
+# Per-user change counters (user_change_counters table): every committed write to a tracked
+# table bumps the writing user's counter for the affected scopes in the same transaction
+CHANGE_SCOPES = {
+    "contacts": ("contacts",),
+    "contact_tags": ("contacts",),
+    "contact_tag_associations": ("contacts",),
+    "customers": ("customers",),
+    "email_templates": ("email_templates",),
+}
+# Deleting contacts clears customers.contact_id in the database (foreign key or trigger)
+DELETE_SCOPES = {"contacts": ("customers",)}
+# Counter row bumped when a write cannot be attributed to a user
+GLOBAL_CHANGES = 0
+
+BUMP_CHANGE_COUNTERS_SQL = text("""
+    INSERT INTO user_change_counters (user_id, scope, version)
+    SELECT user_id, scope, 1
+    FROM unnest(CAST(:user_ids AS integer[]), CAST(:scopes AS varchar[])) AS changes (user_id, scope)
+    ORDER BY user_id, scope
+    ON CONFLICT (user_id, scope) DO UPDATE SET version = user_change_counters.version + 1
+""")
+
+CHANGE_VERSION_SQL = text("""
+    SELECT user_id, version FROM user_change_counters
+    WHERE scope = :scope AND user_id IN (:user_id, 0)
+""")
+
+
+class RoutingSession(Session):
+    """Session that sends statements issued by read-only service methods to a replica
+    
+    Everything else stays on the primary: statements outside a replica_reads method, DML, flushes,
+    any statement after the session has written (read-your-writes within a request), reads for a
+    user who wrote recently (read-your-writes across requests) and reads while replicas lag.
+    """
+    
+    def _use_replica(self, clause) -> bool:
+        info = self.info
+        return bool(
+            info.get("replica_scope")
+            and not info.get("primary_scope")
+            and not info.get("has_writes")
+            and not (clause is not None and getattr(clause, "is_dml", False))
+            and not replica_router.wrote_recently(info.get("replica_user_id"))
+        )
+    
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if replica_router is not None and self.info.get("replica_scope"):
+            if self._use_replica(clause):
+                # Keep one replica per session so related queries see the same snapshot
+                replica = self.info.get("replica_bind") or replica_router.choose()
+                if replica is not None:
+                    self.info["replica_bind"] = replica
+                    read_routing.inc(target="replica")
+                    return replica
+            read_routing.inc(target="primary")
+        return super().get_bind(mapper, clause=clause, **kw)
+
+
+def _written_user_ids(statement, parameters) -> Set[int]:
+    """user_id values a DML statement writes or filters on (values(), WHERE and executemany params)"""
+    sources = [parameters] if isinstance(parameters, dict) else list(parameters or [])
+    try:
+        sources.append(statement.compile(dialect=engine.dialect).params)
+    except Exception:
+        pass
+    user_ids = set()
+    for params in sources:
+        for key, value in params.items():
+            if key == "user_id" or key.startswith("user_id_"):
+                user_ids.update(value if isinstance(value, (list, tuple, set)) else [value])
+    return {user_id for user_id in user_ids if isinstance(user_id, int)}
+
+
+def _mark_written(session: Session, user_ids: Iterable[int]):
+    session.info["has_writes"] = True
+    session.info.setdefault("written_user_ids", set()).update(user_ids)
+
+
+def _mark_changed(session: Session, table_name: str, user_ids: Set[int], is_delete: bool):
+    scopes = CHANGE_SCOPES.get(table_name, ()) + (DELETE_SCOPES.get(table_name, ()) if is_delete else ())
+    if scopes:
+        changes = session.info.setdefault("changed_scopes", set())
+        changes.update((user_id, scope) for user_id in (user_ids or {None}) for scope in scopes)
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _track_statement_writes(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    statement = orm_execute_state.statement
+    table_name = getattr(statement.table, "name", None)
+    if replica_router is None and table_name not in CHANGE_SCOPES:
+        return
+    user_ids = _written_user_ids(statement, orm_execute_state.parameters)
+    if replica_router is not None:
+        _mark_written(orm_execute_state.session, user_ids)
+    _mark_changed(orm_execute_state.session, table_name, user_ids, orm_execute_state.is_delete)
+
+
+@event.listens_for(RoutingSession, "before_flush")
+def _track_flush_writes(session, flush_context, instances):
+    user_ids = set()
+    deleted = session.deleted
+    for obj in itertools.chain(session.new, session.dirty, deleted):
+        user_id = getattr(obj, "user_id", None)
+        if user_id is not None:
+            user_ids.add(user_id)
+        _mark_changed(session, obj.__table__.name, {user_id} - {None}, obj in deleted)
+    if replica_router is not None:
+        _mark_written(session, user_ids)
+
+
+@event.listens_for(RoutingSession, "before_commit")
+def _bump_change_counters(session):
+    # Flush first so pending objects are tracked, then bump in the committing transaction
+    session.flush()
+    changes = session.info.pop("changed_scopes", None)
+    if not changes:
+        return
+    # Rows without a user_id column (tag associations) belong to the users written alongside
+    # them; when the transaction wrote no user-scoped rows fall back to the global counter
+    known_users = {user_id for user_id, _ in changes if user_id is not None} or {GLOBAL_CHANGES}
+    resolved = sorted({
+        (user_id, scope)
+        for owner, scope in changes
+        for user_id in ([owner] if owner is not None else known_users)
+    })
+    session.connection(bind_arguments={"bind": engine}).execute(BUMP_CHANGE_COUNTERS_SQL, {
+        "user_ids": [user_id for user_id, _ in resolved],
+        "scopes": [scope for _, scope in resolved],
+    })
+    # Kept until after_commit for listeners that invalidate derived caches (result_cache)
+    session.info["committed_changes"] = resolved
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _remember_writers(session):
+    user_ids = session.info.pop("written_user_ids", None)
+    if replica_router is not None and user_ids:
+        replica_router.record_writes(user_ids)
+
+
+@event.listens_for(RoutingSession, "after_soft_rollback")
+def _forget_writers(session, previous_transaction):
+    session.info.pop("written_user_ids", None)
+    session.info.pop("changed_scopes", None)
+    session.info.pop("committed_changes", None)
+
+
+@contextmanager
+def _replica_scope(db: Session, user_id: Optional[int]):
+    info = db.info
+    saved = info.get("replica_scope", 0), info.get("replica_user_id")
+    info["replica_scope"] = saved[0] + 1
+    info["replica_user_id"] = saved[1] if user_id is None else user_id
+    try:
+        yield
+    finally:
+        info["replica_scope"], info["replica_user_id"] = saved
+
+
+def replica_reads(method):
+    """Mark a read-only service method (self.db session, optional user_id argument) as replica-safe"""
+    signature = inspect.signature(method)
+    
+    def scope(args, kwargs):
+        return _replica_scope(args[0].db, signature.bind_partial(*args, **kwargs).arguments.get("user_id"))
+    
+    if inspect.isgeneratorfunction(method):
+        @functools.wraps(method)
+        def generator_wrapper(*args, **kwargs):
+            with scope(args, kwargs):
+                yield from method(*args, **kwargs)
+        return generator_wrapper
+    
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with scope(args, kwargs):
+            return method(*args, **kwargs)
+    return wrapper
+
+
+def change_version(db: Session, user_id: int, scope: str) -> str:
+    """Change counter of a user's data scope, for ETags
+    
+    Read through the same routing as replica_reads service methods and before the data it
+    describes, so a lagging replica can only pair the version with newer data, never older.
+    """
+    with _replica_scope(db, user_id):
+        versions = dict(db.execute(CHANGE_VERSION_SQL, {"user_id": user_id, "scope": scope}).all())
+    return f"{versions.get(GLOBAL_CHANGES, 0)}.{versions.get(user_id, 0)}"
+
+
+@contextmanager
+def primary_reads(db: Session):
+    """Force reads inside the block to the primary (e.g. reads that drive a following write)"""
+    db.info["primary_scope"] = db.info.get("primary_scope", 0) + 1
+    try:
+        yield
+    finally:
+        db.info["primary_scope"] -= 1
+
+
 # Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine)
 
 # Create base class for models
 Base = declarative_base()
@@ -21,7 +418,11 @@ Base = declarative_base()
 def get_db():
     """Dependency to get database session"""
     db = SessionLocal()
+    sessions_active.inc()
+    start = time.perf_counter()
     try:
         yield db
     finally:
         db.close()
+        sessions_active.dec()
+        session_duration.observe(time.perf_counter() - start)
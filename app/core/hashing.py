@@ -0,0 +1,107 @@
+"""
+密码哈希线程池
+bcrypt和PBKDF2每次计算约100ms，在async路由中直接调用会阻塞事件循环，期间该进程的其他请求全部等待。
+哈希计算在固定大小的线程池中执行（hashlib和bcrypt计算时释放GIL，多个线程可以同时使用多个CPU核）；
+排队和执行中的任务数达到password_hash_max_pending时立即拒绝，登录、创建账户的突发请求不会无限排队。
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+import asyncio
+import threading
+import time
+
+from .config import settings
+from .metrics import registry
+
+hash_wait = registry.histogram(
+    "password_hash_queue_wait_seconds", "Time hashing jobs wait for a pool worker", ("kind",)
+)
+hash_duration = registry.histogram(
+    "password_hash_duration_seconds", "Time spent computing password hashes", ("kind",)
+)
+hash_rejected = registry.counter(
+    "password_hash_rejected_total", "Hashing jobs rejected because the pool queue was full", ("kind",)
+)
+
+
+class HashingBusyError(RuntimeError):
+    """哈希线程池排队任务已满"""
+
+
+class HashingPool:
+    """
+    有界的哈希线程池
+    
+    Args:
+        workers: 工作线程数（同时计算的哈希数，不宜超过CPU核数）
+        max_pending: 排队和执行中的任务数上限，达到后新任务抛出HashingBusyError
+    """
+    
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.queued = 0
+        self.running = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+    
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """首次使用时创建线程池"""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        return self._executor
+    
+    def submit(self, kind: str, fn: Callable[..., Any], *args: Any) -> Future:
+        """
+        提交哈希任务
+        
+        Args:
+            kind: 哈希类型（指标标签，如bcrypt、pbkdf2）
+        
+        Raises:
+            HashingBusyError: 排队和执行中的任务数已达上限
+        """
+        with self._lock:
+            if self.queued + self.running >= self.max_pending:
+                hash_rejected.inc(kind=kind)
+                raise HashingBusyError("密码处理繁忙，请稍后重试")
+            self.queued += 1
+        submitted = time.perf_counter()
+        
+        def job():
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+            started = time.perf_counter()
+            hash_wait.observe(started - submitted, kind=kind)
+            try:
+                return fn(*args)
+            finally:
+                hash_duration.observe(time.perf_counter() - started, kind=kind)
+                with self._lock:
+                    self.running -= 1
+        
+        future = self.executor.submit(job)
+        # 开始执行前被取消（客户端断开）的任务不会运行job，在这里移出排队数
+        future.add_done_callback(lambda done: done.cancelled() and self._forget_cancelled())
+        return future
+    
+    def _forget_cancelled(self):
+        with self._lock:
+            self.queued -= 1
+    
+    async def run(self, kind: str, fn: Callable[..., Any], *args: Any) -> Any:
+        """在线程池中计算并等待结果，不阻塞事件循环"""
+        return await asyncio.wrap_future(self.submit(kind, fn, *args))
+
+
+hashing_pool = HashingPool(settings.password_hash_workers, settings.password_hash_max_pending)
+
+registry.gauge("password_hash_queue_depth", "Hashing jobs waiting for a pool worker",
+               function=lambda: hashing_pool.queued)
+registry.gauge("password_hash_in_progress", "Hashing jobs currently being computed",
+               function=lambda: hashing_pool.running)
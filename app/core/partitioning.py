@@ -0,0 +1,54 @@
+"""
+按用户哈希分区
+大租户的数据按user_id哈希分散到多个分区，带user_id条件的查询只访问一个分区（分区裁剪）。
+建表（create_all）和迁移共用这里的DDL。
+"""
+
+from typing import List
+import re
+
+# 分区命名为 表名_p序号
+PARTITION_NAME = re.compile(r"^\w+_p\d+$")
+
+# PostgreSQL不能用外键引用分区表中不含分区键的列（contacts.id），
+# 分区后联系人被删除时由该触发器完成原外键的级联：删除标签关联、清空客户的来源联系人
+CONTACT_REFERENCES_FUNCTION = """
+CREATE OR REPLACE FUNCTION contacts_delete_references() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM contact_tag_associations a USING deleted_contacts d WHERE a.contact_id = d.id;
+    UPDATE customers c SET contact_id = NULL FROM deleted_contacts d
+        WHERE c.contact_id = d.id AND c.user_id = d.user_id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+CONTACT_REFERENCES_TRIGGER = """
+CREATE TRIGGER contacts_delete_references AFTER DELETE ON contacts
+    REFERENCING OLD TABLE AS deleted_contacts
+    FOR EACH STATEMENT EXECUTE FUNCTION contacts_delete_references()
+"""
+
+DROP_CONTACT_REFERENCES = [
+    "DROP TRIGGER IF EXISTS contacts_delete_references ON contacts",
+    "DROP FUNCTION IF EXISTS contacts_delete_references()",
+]
+
+
+def hash_partition_ddl(table: str, partitions: int) -> List[str]:
+    """创建哈希分区的语句"""
+    return [
+        f"CREATE TABLE {table}_p{remainder} PARTITION OF {table} "
+        f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+        for remainder in range(partitions)
+    ]
+
+
+def is_partition(table_name: str) -> bool:
+    """是否为分区子表（迁移比对时忽略，分区由父表定义）"""
+    return bool(PARTITION_NAME.match(table_name))
+
+
+def contact_partition_ddl(partitions: int) -> List[str]:
+    """联系人表分区及替代外键的触发器"""
+    return hash_partition_ddl("contacts", partitions) + [CONTACT_REFERENCES_FUNCTION, CONTACT_REFERENCES_TRIGGER]
@@ -0,0 +1,101 @@
+"""
+快速JSON响应与条件请求
+路由直接返回FastJSONResponse时，FastAPI不再按response_model重新校验和序列化（response_model仅用于接口文档），
+列表数据由response_rows按响应模型字段直接从列投影查询结果取值，datetime等类型由orjson原生序列化。
+轮询接口按数据变更计数生成ETag，客户端数据未变化时直接返回304，不查询也不序列化数据。
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Sequence, Type
+from datetime import date, datetime
+from enum import Enum
+import hashlib
+import json
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import Row
+
+from .metrics import registry
+
+try:
+    import orjson
+except ImportError:  # 未安装orjson时退回标准库json（输出相同，只是更慢）
+    orjson = None
+
+not_modified_responses = registry.counter(
+    "http_not_modified_total", "Conditional GETs answered with 304 Not Modified", ("route",)
+)
+
+
+def _json_default(value: Any) -> Any:
+    """标准库json不支持的类型，格式与Pydantic输出一致"""
+    if isinstance(value, datetime):
+        text = value.isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"无法序列化{type(value).__name__}类型")
+
+
+def dumps(content: Any) -> bytes:
+    """序列化为JSON字节串（UTC时间输出为Z后缀，与Pydantic一致）"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_json_default
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """用orjson序列化的JSON响应"""
+    
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def response_rows(model: Type[BaseModel], rows: Sequence[Row],
+                  **computed: Callable[[Dict[str, tuple]], Sequence[Any]]) -> List[Dict[str, Any]]:
+    """
+    将列投影查询结果按响应模型字段整列转换为响应数据，字段顺序与Pydantic输出一致
+    
+    先把结果行转置为列，计算字段对整列处理，最后每行只构建一个字典（不创建ORM对象和Pydantic模型）
+    
+    Args:
+        model: 响应模型（只使用其字段列表，不做校验）
+        rows: 查询结果行，列名与响应字段同名（可以多出计算字段需要的列）
+        computed: 需要计算的字段，{字段名: 取值函数}，函数接收{列名: 整列值}，返回该字段的整列值；
+                  按参数顺序计算，后面的函数可以使用前面计算出的列
+    """
+    if not rows:
+        return []
+    columns = dict(zip(rows[0]._fields, zip(*rows)))
+    for name, compute in computed.items():
+        columns[name] = compute(columns)
+    names = list(model.model_fields)
+    return [dict(zip(names, values)) for values in zip(*(columns[name] for name in names))]
+
+
+def make_etag(*parts: Any) -> str:
+    """由数据版本、查询参数等生成弱ETag（语义相同即可，压缩等传输编码不影响）"""
+    digest = hashlib.blake2b("|".join(map(str, parts)).encode("utf-8"), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def cache_headers(etag: str, cache_control: str) -> Dict[str, str]:
+    """响应的ETag和Cache-Control头"""
+    return {"ETag": etag, "Cache-Control": cache_control}
+
+
+def not_modified(request: Request, etag: str, cache_control: str) -> Optional[Response]:
+    """请求的If-None-Match与ETag匹配（弱比较）时返回304响应，否则返回None"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    if etag.removeprefix("W/") not in {tag.strip().removeprefix("W/") for tag in header.split(",")}:
+        return None
+    route = request.scope.get("route")
+    not_modified_responses.inc(route=getattr(route, "path", request.url.path))
+    return Response(status_code=304, headers=cache_headers(etag, cache_control))
@@ -0,0 +1,266 @@
+"""
+列表查询结果缓存
+同样的筛选条件和分页会被多个标签页反复查询，结果按(用户, 规范化的筛选条件, 分页)缓存。
+缓存键包含该用户数据范围（与变更计数相同的scope）的代数，写入提交时递增代数，旧结果立即不再命中，无需逐条删除。
+后端由result_cache_backend选择：memory（进程内LRU，多进程部署时其他进程的失效不可见）、redis（多进程/多实例共享）、none（关闭）；
+未设置时，配置了REDIS_URL使用redis，否则不缓存。
+"""
+
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import threading
+import time
+
+from sqlalchemy import event
+
+from .config import settings
+from .database import GLOBAL_CHANGES, RoutingSession
+from .metrics import registry
+from .responses import dumps
+
+logger = logging.getLogger(__name__)
+
+cache_requests = registry.counter(
+    "result_cache_requests_total", "List query result cache lookups", ("cache", "result")
+)
+cache_errors = registry.counter(
+    "result_cache_errors_total", "Result cache backend failures (treated as misses)", ("operation",)
+)
+
+
+class MemoryBackend:
+    """进程内LRU缓存，条目超过max_entries时淘汰最久未使用的"""
+    
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+    
+    def generations(self, keys: Sequence[str]) -> List[int]:
+        with self._lock:
+            return [self._generations.get(key, 0) for key in keys]
+    
+    def bump(self, keys: Iterable[str]):
+        with self._lock:
+            for key in keys:
+                self._generations[key] = self._generations.get(key, 0) + 1
+    
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+    
+    def set(self, key: str, value: Any, ttl: int):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def _encode_page(page: Tuple[Tuple[str, ...], List[tuple], int]) -> bytes:
+    """缓存结果序列化为JSON（共享的Redis中不存放pickle数据），记录datetime列以便还原类型"""
+    fields, values, total = page
+    datetime_columns = [
+        index for index in range(len(fields)) if any(isinstance(row[index], datetime) for row in values)
+    ]
+    return dumps({"fields": fields, "datetimes": datetime_columns, "rows": values, "total": total})
+
+
+def _decode_page(data: bytes) -> Tuple[Tuple[str, ...], List[tuple], int]:
+    page = json.loads(data)
+    values = page["rows"]
+    for index in page["datetimes"]:
+        for row in values:
+            if row[index] is not None:
+                row[index] = datetime.fromisoformat(row[index])
+    return tuple(page["fields"]), values, page["total"]
+
+
+class RedisBackend:
+    """Redis缓存，代数用INCR递增，结果按ttl过期并以JSON保存；redis包在首次使用时才导入"""
+    
+    def __init__(self, url: str, prefix: str = "hrepo:cache:", timeout: float = 0.5):
+        self.url = url
+        self.prefix = prefix
+        self.timeout = timeout
+        self._client = None
+        self._lock = threading.Lock()
+    
+    @property
+    def client(self):
+        """延迟创建Redis客户端（自带连接池，线程安全）"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import redis
+                    self._client = redis.Redis.from_url(
+                        self.url, socket_timeout=self.timeout, socket_connect_timeout=self.timeout
+                    )
+        return self._client
+    
+    def generations(self, keys: Sequence[str]) -> List[int]:
+        return [int(value or 0) for value in self.client.mget([self.prefix + key for key in keys])]
+    
+    def bump(self, keys: Iterable[str]):
+        pipeline = self.client.pipeline(transaction=False)
+        for key in keys:
+            pipeline.incr(self.prefix + key)
+        pipeline.execute()
+    
+    def get(self, key: str) -> Optional[Any]:
+        value = self.client.get(self.prefix + key)
+        return None if value is None else _decode_page(value)
+    
+    def set(self, key: str, value: Any, ttl: int):
+        self.client.set(self.prefix + key, _encode_page(value), ex=ttl)
+
+
+def create_backend(name: Optional[str]):
+    """
+    按名称创建缓存后端，none时返回None（不缓存）
+    
+    未指定时，显式配置了REDIS_URL使用redis；否则不缓存（进程内缓存的失效对其他工作进程不可见，
+    多进程部署时会在ttl内返回旧数据，需要显式选择memory）
+    """
+    if not name:
+        name = "redis" if "redis_url" in settings.model_fields_set else "none"
+    if name == "memory":
+        return MemoryBackend(settings.result_cache_max_entries)
+    if name == "redis":
+        return RedisBackend(settings.redis_url)
+    if name == "none":
+        return None
+    raise ValueError(f"未知的结果缓存后端: {name}，可选: memory、redis、none")
+
+
+backend = create_backend(settings.result_cache_backend)
+
+
+def _generation_key(scope: str, user_id: int) -> str:
+    return f"gen:{scope}:{user_id}"
+
+
+def _normalize(value: Any) -> Any:
+    """筛选条件规范化：空字符串等同于未设置，列表去重排序，枚举取值"""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, str):
+        return value or None
+    if isinstance(value, (list, tuple, set)):
+        return tuple(sorted({_normalize(item) for item in value} - {None}, key=str)) or None
+    return value
+
+
+@functools.lru_cache(maxsize=64)
+def _row_type(fields: Tuple[str, ...]):
+    """缓存结果行的类型（与Row一样支持下标、按列名取值和_fields）"""
+    return namedtuple("CachedRow", fields)
+
+
+def _bypass(db) -> bool:
+    """会话中有未提交的写入时不读也不写缓存（缓存只保存已提交的数据）"""
+    return bool(db.info.get("changed_scopes") or db.new or db.dirty or db.deleted)
+
+
+def _read_from_replica(db) -> bool:
+    """会话读过只读副本：副本可能落后于已递增的代数，结果不能按当前代数缓存"""
+    return db.info.get("replica_bind") is not None
+
+
+def cached_page(scope: str):
+    """
+    缓存返回(结果行, 总数)的列表查询方法
+    
+    方法需要有self.db会话和user_id参数，其余参数（筛选条件和分页）规范化后组成缓存键；
+    写在replica_reads之外，命中时不查询数据库。未命中时从只读副本读到的结果不写入缓存。
+    
+    Args:
+        scope: 数据范围（database.CHANGE_SCOPES中的值），该用户此范围的数据提交写入后缓存失效
+    """
+    def decorator(method: Callable) -> Callable:
+        signature = inspect.signature(method)
+        name = method.__qualname__
+        
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            params = dict(bound.arguments)
+            service, user_id = params.pop("self"), params.pop("user_id")
+            if backend is None or _bypass(service.db):
+                return method(*args, **kwargs)
+            
+            filters = repr(sorted((key, _normalize(value)) for key, value in params.items()))
+            digest = hashlib.blake2b(f"{name}|{filters}".encode("utf-8"), digest_size=16).hexdigest()
+            try:
+                generations = backend.generations(
+                    [_generation_key(scope, GLOBAL_CHANGES), _generation_key(scope, user_id)]
+                )
+                key = f"{scope}:{user_id}:{'.'.join(map(str, generations))}:{digest}"
+                cached = backend.get(key)
+            except Exception as e:
+                cache_errors.inc(operation="get")
+                logger.warning(f"读取结果缓存失败: {e}")
+                return method(*args, **kwargs)
+            
+            if cached is not None:
+                cache_requests.inc(cache=scope, result="hit")
+                fields, values, total = cached
+                row_type = _row_type(fields)
+                return [row_type._make(row) for row in values], total
+            
+            cache_requests.inc(cache=scope, result="miss")
+            rows, total = method(*args, **kwargs)
+            if _read_from_replica(service.db):
+                return rows, total
+            fields = tuple(rows[0]._fields) if rows else ()
+            try:
+                backend.set(key, (fields, [tuple(row) for row in rows], total), settings.result_cache_ttl)
+            except Exception as e:
+                cache_errors.inc(operation="set")
+                logger.warning(f"写入结果缓存失败: {e}")
+            return rows, total
+        return wrapper
+    return decorator
+
+
+def invalidate(changes: Iterable[Tuple[int, str]]):
+    """递增(用户ID, 数据范围)的缓存代数，该用户此范围已缓存的结果不再命中"""
+    if backend is None:
+        return
+    keys = sorted({_generation_key(scope, user_id) for user_id, scope in changes})
+    if not keys:
+        return
+    try:
+        backend.bump(keys)
+    except Exception as e:
+        cache_errors.inc(operation="invalidate")
+        logger.warning(f"结果缓存失效失败（最长{settings.result_cache_ttl}秒内可能读到旧数据）: {e}")
+
+
+# 提交前后各递增一次代数（database中before_commit的监听先注册，已经计算出committed_changes）：
+# 提交前递增保证看到新变更计数（ETag）的请求不会命中旧结果，
+# 提交后递增使提交期间按新代数缓存的旧数据失效
+@event.listens_for(RoutingSession, "before_commit")
+def _invalidate_before_commit(session):
+    invalidate(session.info.get("committed_changes", ()))
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _invalidate_after_commit(session):
+    invalidate(session.info.pop("committed_changes", ()))
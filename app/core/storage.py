@@ -0,0 +1,72 @@
+"""
+对象存储（OSS/MinIO）客户端
+使用S3兼容接口，配置来自settings.oss_*，boto3在首次使用时才导入
+"""
+
+import threading
+from typing import Optional, BinaryIO
+
+from .config import settings
+
+
+class ObjectStorage:
+    """S3兼容对象存储"""
+    
+    def __init__(self, endpoint_url: str, access_key: str, secret_key: str, bucket_name: str):
+        self.endpoint_url = endpoint_url
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.bucket_name = bucket_name
+        self._client = None
+        self._lock = threading.Lock()
+    
+    @property
+    def client(self):
+        """延迟创建boto3客户端（线程安全，可在多个线程间共享）"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import boto3
+                    self._client = boto3.client(
+                        's3',
+                        endpoint_url=self.endpoint_url,
+                        aws_access_key_id=self.access_key,
+                        aws_secret_access_key=self.secret_key
+                    )
+        return self._client
+    
+    def upload_fileobj(self, fileobj: BinaryIO, key: str, content_type: Optional[str] = None) -> str:
+        """
+        上传文件对象，大文件自动使用分片上传，不会整体读入内存
+        
+        Returns:
+            对象key
+        """
+        extra_args = {"ContentType": content_type} if content_type else None
+        self.client.upload_fileobj(fileobj, self.bucket_name, key, ExtraArgs=extra_args)
+        return key
+    
+    def delete_objects(self, keys: list):
+        """批量删除对象（每次请求最多1000个）"""
+        for start in range(0, len(keys), 1000):
+            self.client.delete_objects(
+                Bucket=self.bucket_name,
+                Delete={"Objects": [{"Key": key} for key in keys[start:start + 1000]], "Quiet": True}
+            )
+    
+    def get_download_url(self, key: str, expires_in: int = 3600) -> str:
+        """生成临时下载链接"""
+        return self.client.generate_presigned_url(
+            'get_object',
+            Params={"Bucket": self.bucket_name, "Key": key},
+            ExpiresIn=expires_in
+        )
+
+
+# 全局对象存储实例
+object_storage = ObjectStorage(
+    endpoint_url=settings.oss_endpoint_url,
+    access_key=settings.oss_access_key,
+    secret_key=settings.oss_secret_key,
+    bucket_name=settings.oss_bucket_name
+)
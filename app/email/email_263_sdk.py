@@ -2,19 +2,32 @@
 263邮箱SDK
 """
 
+import re
 import smtplib
 import imaplib
 import ssl
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
-from typing import List, Optional, Dict, Any, Tuple
+from email.utils import make_msgid, formatdate
+from typing import List, Optional, Dict, Any, Tuple, Callable
 from datetime import datetime
 import logging
 
+from .header_parser import StreamingHeaderParser, extract_headers
+from .mime_stream import MimeStreamParser
+
 logger = logging.getLogger(__name__)
 
+CRLF = b"\r\n"
+
+# IMAP FETCH响应中的元数据
+_FETCH_UID_RE = re.compile(rb'UID (\d+)')
+_FETCH_SIZE_RE = re.compile(rb'RFC822\.SIZE (\d+)')
+_FETCH_FLAGS_RE = re.compile(rb'FLAGS \(([^)]*)\)')
+
 
 class Email263SDK:
     """263邮箱SDK类"""
@@ -85,6 +98,48 @@ class Email263SDK:
             "test_time": datetime.now()
         }
     
+    def _create_smtp_connection(self) -> smtplib.SMTP:
+        """创建并登录SMTP连接"""
+        if self.is_ssl:
+            server = smtplib.SMTP_SSL(self.smtp_server, self.smtp_port)
+        else:
+            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
+            if self.is_ssl:
+                server.starttls()
+        
+        server.login(self.email_address, self.password)
+        return server
+    
+    @staticmethod
+    def _quit_smtp(server: smtplib.SMTP):
+        """结束SMTP会话（服务器已断开时直接关闭连接）"""
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+    
+    def build_message(self, to_emails: List[str], subject: str, content: str,
+                      cc_emails: Optional[List[str]] = None,
+                      is_html: bool = False) -> MIMEMultipart:
+        """构建MIME邮件，并生成真实的Message-ID"""
+        msg = MIMEMultipart('alternative')
+        msg['From'] = self.email_address
+        msg['To'] = ', '.join(to_emails)
+        msg['Subject'] = subject
+        msg['Date'] = formatdate(localtime=True)
+        msg['Message-ID'] = make_msgid(domain=self.email_address.rsplit('@', 1)[-1])
+        
+        if cc_emails:
+            msg['Cc'] = ', '.join(cc_emails)
+        
+        # 添加邮件内容
+        if is_html:
+            msg.attach(MIMEText(content, 'html', 'utf-8'))
+        else:
+            msg.attach(MIMEText(content, 'plain', 'utf-8'))
+        
+        return msg
+    
     def send_email(self, to_emails: List[str], subject: str, content: str, 
                    cc_emails: Optional[List[str]] = None, 
                    bcc_emails: Optional[List[str]] = None,
@@ -92,29 +147,10 @@ class Email263SDK:
         """发送邮件"""
         try:
             # 创建邮件
-            msg = MIMEMultipart('alternative')
-            msg['From'] = self.email_address
-            msg['To'] = ', '.join(to_emails)
-            msg['Subject'] = subject
-            
-            if cc_emails:
-                msg['Cc'] = ', '.join(cc_emails)
-            
-            # 添加邮件内容
-            if is_html:
-                msg.attach(MIMEText(content, 'html', 'utf-8'))
-            else:
-                msg.attach(MIMEText(content, 'plain', 'utf-8'))
+            msg = self.build_message(to_emails, subject, content, cc_emails, is_html)
             
             # 连接SMTP服务器
-            if self.is_ssl:
-                server = smtplib.SMTP_SSL(self.smtp_server, self.smtp_port)
-            else:
-                server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-                if self.is_ssl:
-                    server.starttls()
-            
-            server.login(self.email_address, self.password)
+            server = self._create_smtp_connection()
             
             # 发送邮件
             all_recipients = to_emails.copy()
@@ -124,13 +160,13 @@ class Email263SDK:
                 all_recipients.extend(bcc_emails)
             
             text = msg.as_string()
-            server.sendmail(self.email_address, all_recipients, text)
+            refused = server.sendmail(self.email_address, all_recipients, text)
             server.quit()
             
             return {
                 "success": True,
-                "sent_count": len(all_recipients),
-                "message_ids": [f"msg_{datetime.now().timestamp()}"],  # 简化处理
+                "sent_count": len(all_recipients) - len(refused),
+                "message_ids": [msg['Message-ID']],
                 "error_message": None,
                 "sent_time": datetime.now()
             }
@@ -146,52 +182,367 @@ class Email263SDK:
                 "sent_time": datetime.now()
             }
     
-    def get_emails(self, folder: str = 'INBOX', limit: int = 50) -> Dict[str, Any]:
-        """获取邮件列表"""
-        try:
-            # 连接IMAP服务器
-            if self.is_ssl:
-                server = imaplib.IMAP4_SSL(self.imap_server, self.imap_port)
-            else:
-                server = imaplib.IMAP4(self.imap_server, self.imap_port)
-                if self.is_ssl:
-                    server.starttls()
+    @staticmethod
+    def _encode_data(msg: MIMEMultipart) -> bytes:
+        """将邮件转换为DATA命令的传输格式（CRLF换行、行首句点转义、结束符）"""
+        data = re.sub(r'(?:\r\n|\n|\r(?!\n))', '\r\n', msg.as_string()).encode('ascii')
+        data = re.sub(br'(?m)^\.', b'..', data)
+        if data[-2:] != CRLF:
+            data += CRLF
+        return data + b"." + CRLF
+    
+    def _pipelined_sendmail(self, server: smtplib.SMTP, recipients: List[str],
+                            data: bytes) -> Dict[str, Tuple[int, bytes]]:
+        """
+        使用PIPELINING（RFC 2920）发送单封邮件
+        
+        MAIL FROM、所有RCPT TO和DATA在一次写入中发出，再依次读取响应，
+        每封邮件只需两次网络往返。
+        
+        Returns:
+            被拒绝的收件人字典 {收件人: (状态码, 响应)}
+        """
+        options = ""
+        if server.has_extn('size'):
+            options = f" SIZE={len(data)}"
+        commands = [f"MAIL FROM:{smtplib.quoteaddr(self.email_address)}{options}"]
+        commands.extend(f"RCPT TO:{smtplib.quoteaddr(rcpt)}" for rcpt in recipients)
+        commands.append("DATA")
+        server.send("".join(command + "\r\n" for command in commands))
+        
+        mail_code, mail_resp = server.getreply()
+        refused = {}
+        for rcpt in recipients:
+            code, resp = server.getreply()
+            if code not in (250, 251):
+                refused[rcpt] = (code, resp)
+        data_code, data_resp = server.getreply()
+        
+        if mail_code != 250:
+            server.rset()
+            raise smtplib.SMTPSenderRefused(mail_code, mail_resp, self.email_address)
+        if data_code != 354:
+            server.rset()
+            if len(refused) == len(recipients):
+                raise smtplib.SMTPRecipientsRefused(refused)
+            raise smtplib.SMTPDataError(data_code, data_resp)
+        
+        server.send(data)
+        code, resp = server.getreply()
+        if code != 250:
+            raise smtplib.SMTPDataError(code, resp)
+        return refused
+    
+    def send_batch(self, messages: List[Dict[str, Any]],
+                   before_send: Optional[Callable[[int, Dict[str, Any]], Tuple[Optional[str], float]]] = None,
+                   reconnect_after: Optional[float] = None) -> Dict[str, Any]:
+        """
+        批量发送多封邮件，复用同一个已认证的SMTP会话
+        
+        会阻塞等待（限流）和网络IO，应在工作线程中调用
+        
+        Args:
+            messages: 邮件列表，每项包含to_emails、subject、content，
+                可选cc_emails、bcc_emails、is_html
+            before_send: 每封邮件发送前的回调（如限流），返回(错误信息, 发送前需等待的秒数)，
+                有错误信息时跳过该邮件
+            reconnect_after: 发送前需等待的秒数超过该值时先关闭SMTP会话，等待后重新连接，
+                避免空闲会话被服务器超时断开
             
-            server.login(self.email_address, self.password)
-            server.select(folder)
+        Returns:
+            包含每封邮件发送结果和真实Message-ID的字典
+        """
+        results = []
+        server = None
+        try:
+            server = self._create_smtp_connection()
+            server.ehlo_or_helo_if_needed()
+            use_pipelining = server.has_extn('pipelining')
             
-            # 搜索邮件
-            status, messages = server.search(None, 'ALL')
-            if status != 'OK':
-                server.logout()
-                return {
+            for index, message in enumerate(messages):
+                to_emails = list(message["to_emails"])
+                cc_emails = list(message.get("cc_emails") or [])
+                bcc_emails = list(message.get("bcc_emails") or [])
+                recipients = to_emails + cc_emails + bcc_emails
+                result = {
+                    "index": index,
                     "success": False,
-                    "emails": [],
-                    "error_message": "搜索邮件失败",
-                    "fetch_time": datetime.now()
+                    "to_emails": to_emails,
+                    "message_id": None,
+                    "sent_count": 0,
+                    "refused_recipients": [],
+                    "error_message": None
                 }
+                results.append(result)
+                
+                if before_send:
+                    skip_reason, wait = before_send(index, message)
+                    if skip_reason:
+                        result["error_message"] = skip_reason
+                        continue
+                    if wait > 0:
+                        if reconnect_after is not None and wait > reconnect_after:
+                            self._quit_smtp(server)
+                            server = None
+                        time.sleep(wait)
+                        if server is None:
+                            server = self._create_smtp_connection()
+                            server.ehlo_or_helo_if_needed()
+                            use_pipelining = server.has_extn('pipelining')
+                
+                try:
+                    msg = self.build_message(
+                        to_emails, message["subject"], message["content"],
+                        cc_emails, message.get("is_html", False)
+                    )
+                    if use_pipelining:
+                        refused = self._pipelined_sendmail(server, recipients, self._encode_data(msg))
+                    else:
+                        refused = server.sendmail(self.email_address, recipients, msg.as_string())
+                    
+                    result["success"] = True
+                    result["message_id"] = msg['Message-ID']
+                    result["sent_count"] = len(recipients) - len(refused)
+                    result["refused_recipients"] = list(refused.keys())
+                except smtplib.SMTPServerDisconnected:
+                    raise
+                except smtplib.SMTPRecipientsRefused as e:
+                    result["refused_recipients"] = list(e.recipients.keys())
+                    result["error_message"] = f"收件人全部被拒绝: {str(e)}"
+                except smtplib.SMTPException as e:
+                    result["error_message"] = f"发送邮件失败: {str(e)}"
+                    logger.warning(f"批量发送第 {index} 封邮件失败: {e}")
             
-            # 获取最新的邮件
-            email_ids = messages[0].split()
-            if len(email_ids) > limit:
-                email_ids = email_ids[-limit:]
+            server.quit()
+            error_msg = None
             
-            emails = []
-            for email_id in email_ids:
+        except Exception as e:
+            error_msg = f"批量发送邮件失败: {str(e)}"
+            logger.error(error_msg)
+            if server is not None:
                 try:
-                    status, msg_data = server.fetch(email_id, '(RFC822)')
-                    if status == 'OK':
-                        # 这里可以解析邮件内容，暂时简化处理
-                        emails.append({
-                            "id": email_id.decode(),
-                            "subject": "邮件主题",  # 需要解析邮件头
-                            "from": "发件人",      # 需要解析邮件头
-                            "date": datetime.now().isoformat(),
-                            "size": len(msg_data[0][1])
-                        })
-                except Exception as e:
-                    logger.warning(f"解析邮件 {email_id} 失败: {e}")
-                    continue
+                    server.close()
+                except Exception:
+                    pass
+        
+        # 会话中断时，未处理的邮件标记为失败
+        for index in range(len(results), len(messages)):
+            results.append({
+                "index": index,
+                "success": False,
+                "to_emails": list(messages[index]["to_emails"]),
+                "message_id": None,
+                "sent_count": 0,
+                "refused_recipients": [],
+                "error_message": error_msg
+            })
+        for result in results:
+            if not result["success"] and result["error_message"] is None:
+                result["error_message"] = error_msg
+        
+        sent_count = sum(1 for result in results if result["success"])
+        return {
+            "success": error_msg is None and sent_count == len(messages),
+            "sent_count": sent_count,
+            "failed_count": len(messages) - sent_count,
+            "results": results,
+            "error_message": error_msg,
+            "sent_time": datetime.now()
+        }
+    
+    def create_imap_connection(self) -> imaplib.IMAP4:
+        """创建并登录IMAP连接"""
+        if self.is_ssl:
+            server = imaplib.IMAP4_SSL(self.imap_server, self.imap_port)
+        else:
+            server = imaplib.IMAP4(self.imap_server, self.imap_port)
+            if self.is_ssl:
+                server.starttls()
+        
+        server.login(self.email_address, self.password)
+        return server
+    
+    @staticmethod
+    def select_folder(server: imaplib.IMAP4, folder: str = 'INBOX') -> Dict[str, Optional[int]]:
+        """
+        以只读方式选择文件夹
+        
+        Returns:
+            {"uid_validity": UIDVALIDITY, "uid_next": UIDNEXT, "exists": 邮件数}
+        """
+        status, data = server.select(folder, readonly=True)
+        if status != 'OK':
+            raise imaplib.IMAP4.error(f"选择文件夹 {folder} 失败: {data}")
+        
+        def _response_int(name: str) -> Optional[int]:
+            _, values = server.response(name)
+            if values and values[-1] is not None:
+                return int(values[-1])
+            return None
+        
+        return {
+            "uid_validity": _response_int('UIDVALIDITY'),
+            "uid_next": _response_int('UIDNEXT'),
+            "exists": int(data[0]) if data and data[0] else 0
+        }
+    
+    @staticmethod
+    def search_uids(server: imaplib.IMAP4, since_uid: int = 0) -> List[int]:
+        """按UID搜索大于since_uid的邮件"""
+        status, data = server.uid('SEARCH', None, f'UID {since_uid + 1}:*')
+        if status != 'OK':
+            raise imaplib.IMAP4.error(f"搜索邮件失败: {data}")
+        # "n:*"在没有新邮件时仍会返回当前最大UID，需要过滤
+        return sorted(uid for uid in (int(x) for x in data[0].split()) if uid > since_uid)
+    
+    @staticmethod
+    def _compress_uids(uids: List[int]) -> str:
+        """将有序UID列表压缩为IMAP序列集，如[1,2,3,7] -> "1:3,7" """
+        ranges = []
+        start = prev = uids[0]
+        for uid in uids[1:]:
+            if uid == prev + 1:
+                prev = uid
+                continue
+            ranges.append(f"{start}:{prev}" if start != prev else str(start))
+            start = prev = uid
+        ranges.append(f"{start}:{prev}" if start != prev else str(start))
+        return ",".join(ranges)
+    
+    @staticmethod
+    def parse_header(uid: int, header_bytes: bytes, size: Optional[int] = None,
+                     flags: Optional[List[str]] = None) -> Dict[str, Any]:
+        """解析邮件头"""
+        header = extract_headers(StreamingHeaderParser.parse([header_bytes]))
+        header.update({"uid": uid, "size": size, "flags": flags or []})
+        return header
+    
+    def fetch_headers(self, server: imaplib.IMAP4, uids: List[int]) -> List[Dict[str, Any]]:
+        """
+        用一条UID FETCH命令批量获取邮件头
+        
+        只请求BODY.PEEK[HEADER]（不会标记已读），正文按需通过fetch_message流式获取
+        """
+        if not uids:
+            return []
+        status, data = server.uid(
+            'FETCH', self._compress_uids(sorted(uids)), '(UID RFC822.SIZE FLAGS BODY.PEEK[HEADER])'
+        )
+        if status != 'OK':
+            raise imaplib.IMAP4.error(f"获取邮件头失败: {data}")
+        
+        messages = []
+        for item in data:
+            if not isinstance(item, tuple):
+                continue
+            meta, header_bytes = item
+            uid_match = _FETCH_UID_RE.search(meta)
+            if not uid_match:
+                continue
+            size_match = _FETCH_SIZE_RE.search(meta)
+            flags_match = _FETCH_FLAGS_RE.search(meta)
+            try:
+                messages.append(self.parse_header(
+                    int(uid_match.group(1)),
+                    header_bytes,
+                    size=int(size_match.group(1)) if size_match else None,
+                    flags=flags_match.group(1).decode().split() if flags_match else []
+                ))
+            except Exception as e:
+                logger.warning(f"解析邮件头 UID {uid_match.group(1)} 失败: {e}")
+        return sorted(messages, key=lambda message: message["uid"])
+    
+    def iter_new_headers(self, server: imaplib.IMAP4, since_uid: int = 0, batch_size: int = 200):
+        """
+        按批次获取UID大于since_uid的邮件头
+        
+        每批发出一条UID FETCH，逐批产出(本批请求的UID, 解析成功的邮件头)，调用方可在每批后持久化同步位置；
+        解析失败或服务器未返回的UID不在邮件头中
+        """
+        uids = self.search_uids(server, since_uid)
+        for i in range(0, len(uids), batch_size):
+            batch = uids[i:i + batch_size]
+            yield batch, self.fetch_headers(server, batch)
+    
+    @staticmethod
+    def iter_body(server: imaplib.IMAP4, uid: int, chunk_size: int = 1024 * 1024):
+        """
+        按UID分段读取完整邮件（BODY.PEEK[]<offset.size>部分获取，不标记已读）
+        
+        每次只在内存中保留一段数据，返回的片段小于chunk_size即表示读取完毕
+        """
+        offset = 0
+        while True:
+            status, data = server.uid('FETCH', str(uid), f'(BODY.PEEK[]<{offset}.{chunk_size}>)')
+            if status != 'OK':
+                raise imaplib.IMAP4.error(f"获取邮件内容失败: {data}")
+            chunk = None
+            for item in data:
+                if isinstance(item, tuple):
+                    chunk = item[1] or b""
+                    break
+            if chunk is None:
+                if offset == 0:
+                    raise imaplib.IMAP4.error(f"邮件不存在: UID {uid}")
+                return
+            if chunk:
+                yield chunk
+            if len(chunk) < chunk_size:
+                return
+            offset += len(chunk)
+    
+    def fetch_message(self, uid: int, attachment_sink_factory: Callable[[Dict[str, Any]], Any],
+                      folder: str = 'INBOX', uid_validity: Optional[int] = None,
+                      chunk_size: int = 1024 * 1024, max_text_size: int = 1024 * 1024) -> Dict[str, Any]:
+        """
+        按UID流式获取并解析完整邮件
+        
+        Args:
+            uid: 邮件UID
+            attachment_sink_factory: 根据附件信息创建附件sink（write/close），由调用方决定附件存放位置
+            folder: 文件夹
+            uid_validity: 同步时记录的UIDVALIDITY，与服务器不一致说明UID已失效
+            chunk_size: 每次FETCH读取的字节数
+            max_text_size: 正文最多保留的字节数
+        
+        Returns:
+            MimeStreamParser的解析结果
+        """
+        server = self.create_imap_connection()
+        try:
+            folder_state = self.select_folder(server, folder)
+            if uid_validity is not None and folder_state["uid_validity"] != uid_validity:
+                raise imaplib.IMAP4.error(f"文件夹 {folder} 的UIDVALIDITY已变化，请重新同步")
+            
+            parser = MimeStreamParser(attachment_sink_factory, max_text_size=max_text_size)
+            for chunk in self.iter_body(server, uid, chunk_size):
+                parser.feed(chunk)
+            return parser.close()
+        finally:
+            server.logout()
+    
+    def get_emails(self, folder: str = 'INBOX', limit: int = 50) -> Dict[str, Any]:
+        """获取邮件列表（最新的limit封邮件的邮件头）"""
+        try:
+            # 连接IMAP服务器
+            server = self.create_imap_connection()
+            self.select_folder(server, folder)
+            
+            # 搜索邮件并获取最新的邮件
+            uids = self.search_uids(server)
+            if len(uids) > limit:
+                uids = uids[-limit:]
+            
+            emails = []
+            for header in self.fetch_headers(server, uids):
+                emails.append({
+                    "id": str(header["uid"]),
+                    "message_id": header["message_id"],
+                    "subject": header["subject"],
+                    "from": header["from"],
+                    "date": header["date"].isoformat() if header["date"] else None,
+                    "size": header["size"]
+                })
             
             server.logout()
             
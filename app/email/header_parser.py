@@ -0,0 +1,123 @@
+"""
+邮件头流式解析模块
+逐块读取邮件数据，遇到邮件头结束（空行）即停止，不在内存中保留邮件正文
+"""
+
+from email import policy
+from email.feedparser import BytesFeedParser
+from email.message import Message
+from email.utils import getaddresses, parsedate_to_datetime
+from typing import Iterable, List, Optional, Dict, Any, Tuple
+from datetime import datetime
+
+# 邮件头与正文之间的空行
+_HEADER_TERMINATORS = (b"\r\n\r\n", b"\n\n")
+
+
+class StreamingHeaderParser:
+    """流式邮件头解析器
+    
+    通过feed()逐块输入原始邮件数据，解析器在读到邮件头结束后忽略后续数据，
+    因此即使输入完整的RFC822邮件，内存占用也只与邮件头大小有关。
+    """
+    
+    def __init__(self):
+        self._parser = BytesFeedParser(policy=policy.default)
+        self._tail = b""  # 上一块的末尾，用于识别跨块的空行
+        self.done = False
+    
+    def feed(self, chunk: bytes) -> bool:
+        """输入一块数据，返回邮件头是否已经读完"""
+        if self.done or not chunk:
+            return self.done
+        
+        data = self._tail + chunk
+        end = -1
+        for terminator in _HEADER_TERMINATORS:
+            position = data.find(terminator)
+            if position != -1 and (end == -1 or position < end):
+                end = position + len(terminator)
+        
+        if end != -1:
+            # 只输入邮件头部分（扣除已经输入过的_tail）
+            self._parser.feed(data[len(self._tail):end])
+            self.done = True
+        else:
+            self._parser.feed(chunk)
+            self._tail = data[-3:]
+        return self.done
+    
+    def close(self) -> Message:
+        """结束解析，返回只包含邮件头的Message对象"""
+        return self._parser.close()
+    
+    @classmethod
+    def parse(cls, chunks: Iterable[bytes]) -> Message:
+        """从数据块迭代器中解析邮件头"""
+        parser = cls()
+        for chunk in chunks:
+            if parser.feed(chunk):
+                break
+        return parser.close()
+
+
+def _header_value(headers: Message, name: str) -> Optional[str]:
+    """读取邮件头，不规范的编码按原始值返回"""
+    try:
+        value = headers.get(name)
+        return str(value).strip() if value is not None else None
+    except Exception:
+        raw = headers.get_all(name, failobj=[None])[0]
+        return str(raw) if raw is not None else None
+
+
+def normalize_address(address: Optional[str]) -> Optional[str]:
+    """规范化邮箱地址（去空白、小写）"""
+    if not address:
+        return None
+    address = address.strip().strip("<>").lower()
+    return address if "@" in address else None
+
+
+def parse_addresses(value: Optional[str]) -> List[Tuple[str, str]]:
+    """解析地址列表，返回[(显示名, 规范化地址)]"""
+    if not value:
+        return []
+    addresses = []
+    for name, address in getaddresses([value]):
+        normalized = normalize_address(address)
+        if normalized:
+            addresses.append((name, normalized))
+    return addresses
+
+
+def parse_date(value: Optional[str]) -> Optional[datetime]:
+    """解析Date邮件头"""
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def extract_headers(headers: Message) -> Dict[str, Any]:
+    """从Message中提取常用邮件头"""
+    from_value = _header_value(headers, 'From') or ""
+    to_value = _header_value(headers, 'To') or ""
+    cc_value = _header_value(headers, 'Cc') or ""
+    from_addresses = parse_addresses(from_value)
+    
+    return {
+        "message_id": _header_value(headers, 'Message-ID'),
+        "in_reply_to": _header_value(headers, 'In-Reply-To'),
+        "subject": _header_value(headers, 'Subject') or "",
+        "from": from_value,
+        "to": to_value,
+        "cc": cc_value,
+        "from_name": from_addresses[0][0] if from_addresses else None,
+        "from_address": from_addresses[0][1] if from_addresses else None,
+        "to_addresses": [address for _, address in parse_addresses(to_value)],
+        "cc_addresses": [address for _, address in parse_addresses(cc_value)],
+        "date": parse_date(_header_value(headers, 'Date'))
+    }
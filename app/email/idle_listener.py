@@ -0,0 +1,380 @@
+"""
+IMAP IDLE推送监听模块
+每个激活的邮箱账户一个长连接IDLE协程，统一运行在asyncio事件循环上，
+收到新邮件通知后触发增量同步（写入邮件往来记录并更新客户计数）
+"""
+
+import asyncio
+import ssl
+import itertools
+import re
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple, Callable
+import logging
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_EXISTS_RE = re.compile(rb'^\* \d+ EXISTS', re.IGNORECASE)
+
+
+class ImapIdleError(Exception):
+    """IDLE连接异常"""
+    pass
+
+
+class ImapIdleClient:
+    """基于asyncio的精简IMAP客户端，只实现IDLE监听所需的命令"""
+    
+    def __init__(self, host: str, port: int, is_ssl: bool = True, timeout: float = 30):
+        self.host = host
+        self.port = port
+        self.is_ssl = is_ssl
+        self.timeout = timeout
+        self.capabilities: List[str] = []
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._tags = itertools.count(1)
+        self._idling = False
+    
+    @property
+    def supports_idle(self) -> bool:
+        return "IDLE" in self.capabilities
+    
+    async def _readline(self, timeout: Optional[float] = None) -> bytes:
+        line = await asyncio.wait_for(self._reader.readline(), timeout or self.timeout)
+        if not line:
+            raise ImapIdleError("连接已被服务器关闭")
+        return line.rstrip(b"\r\n")
+    
+    async def _send(self, data: bytes):
+        self._writer.write(data)
+        await self._writer.drain()
+    
+    async def _command(self, command: str) -> List[bytes]:
+        """发送命令并读取到对应的tagged响应，返回untagged响应行"""
+        tag = f"A{next(self._tags):04d}"
+        await self._send(f"{tag} {command}\r\n".encode())
+        untagged = []
+        while True:
+            line = await self._readline()
+            if line.startswith(tag.encode() + b" "):
+                status = line[len(tag) + 1:].split(b" ", 1)[0].upper()
+                if status != b"OK":
+                    raise ImapIdleError(f"IMAP命令失败: {line.decode(errors='replace')}")
+                return untagged
+            untagged.append(line)
+    
+    @staticmethod
+    def _quote(value: str) -> str:
+        return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    
+    async def connect(self):
+        """建立连接并读取欢迎信息"""
+        ssl_context = ssl.create_default_context() if self.is_ssl else None
+        if ssl_context is not None and not settings.email_ssl_verify:
+            ssl_context.check_hostname = False
+            ssl_context.verify_mode = ssl.CERT_NONE
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=ssl_context), self.timeout
+        )
+        greeting = await self._readline()
+        if not greeting.startswith(b"* OK"):
+            raise ImapIdleError(f"IMAP服务器拒绝连接: {greeting.decode(errors='replace')}")
+    
+    async def login(self, username: str, password: str):
+        """登录并读取服务器能力"""
+        await self._command(f"LOGIN {self._quote(username)} {self._quote(password)}")
+        for line in await self._command("CAPABILITY"):
+            if line.upper().startswith(b"* CAPABILITY"):
+                self.capabilities = line.decode(errors="replace").upper().split()[2:]
+    
+    async def select(self, folder: str = "INBOX"):
+        """以只读方式选择文件夹"""
+        await self._command(f"EXAMINE {self._quote(folder)}")
+    
+    async def noop(self) -> bool:
+        """NOOP轮询，返回是否有新邮件（用于不支持IDLE的服务器）"""
+        return any(_EXISTS_RE.match(line) for line in await self._command("NOOP"))
+    
+    async def idle(self, timeout: float) -> bool:
+        """
+        进入IDLE等待服务器推送
+        
+        收到EXISTS通知或超时（需定期重新发起IDLE，RFC 2177建议不超过29分钟）后退出IDLE。
+        
+        Returns:
+            是否收到新邮件通知
+        """
+        tag = f"A{next(self._tags):04d}"
+        await self._send(f"{tag} IDLE\r\n".encode())
+        line = await self._readline()
+        if not line.startswith(b"+"):
+            raise ImapIdleError(f"IDLE命令失败: {line.decode(errors='replace')}")
+        self._idling = True
+        
+        has_new_mail = False
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while not has_new_mail:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                line = await self._readline(timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            if _EXISTS_RE.match(line):
+                has_new_mail = True
+        
+        await self._send(b"DONE\r\n")
+        self._idling = False
+        while True:
+            line = await self._readline()
+            if line.startswith(tag.encode() + b" "):
+                break
+            if _EXISTS_RE.match(line):
+                has_new_mail = True
+        return has_new_mail
+    
+    async def close(self):
+        """登出并关闭连接"""
+        if self._writer is None:
+            return
+        try:
+            if self._idling:
+                await self._send(b"DONE\r\n")
+                self._idling = False
+            await asyncio.wait_for(self._command("LOGOUT"), 5)
+        except Exception:
+            pass
+        try:
+            self._writer.close()
+            await asyncio.wait_for(self._writer.wait_closed(), 5)
+        except Exception:
+            pass
+        self._writer = None
+
+
+class IdleWatcher:
+    """单个邮箱账户的IDLE监听协程"""
+    
+    MAX_BACKOFF = 300  # 重连最长等待秒数
+    
+    def __init__(self, account: Dict[str, Any], on_new_mail: Callable, folder: str = "INBOX"):
+        self.account = account
+        self.on_new_mail = on_new_mail
+        self.folder = folder
+        self.status = "starting"
+        self.last_event_at: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        self.task = asyncio.create_task(self.run(), name=f"imap-idle-{self.account['id']}")
+    
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except (asyncio.CancelledError, Exception):
+                pass
+    
+    async def _sync(self):
+        self.last_event_at = datetime.now()
+        await self.on_new_mail(self.account, self.folder)
+    
+    async def run(self):
+        backoff = 1
+        while True:
+            client = ImapIdleClient(
+                self.account["imap_server"], self.account["imap_port"], self.account["is_ssl"],
+                timeout=settings.email_auth_timeout
+            )
+            try:
+                await client.connect()
+                await client.login(self.account["email_address"], self.account["password"])
+                await client.select(self.folder)
+                # 连接建立后先补齐断线期间的邮件
+                await self._sync()
+                self.status = "idle" if client.supports_idle else "polling"
+                self.last_error = None
+                backoff = 1
+                
+                while True:
+                    if client.supports_idle:
+                        has_new_mail = await client.idle(settings.email_idle_renew_seconds)
+                    else:
+                        await asyncio.sleep(settings.email_idle_poll_interval)
+                        has_new_mail = await client.noop()
+                    if has_new_mail:
+                        await self._sync()
+            
+            except asyncio.CancelledError:
+                self.status = "stopped"
+                raise
+            except Exception as e:
+                self.status = "error"
+                self.last_error = str(e)
+                logger.warning(f"邮箱 {self.account['email_address']} IDLE监听异常，{backoff}秒后重连: {e}")
+                await client.close()
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.MAX_BACKOFF)
+            finally:
+                await client.close()
+    
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "email_account_id": self.account["id"],
+            "email_address": self.account["email_address"],
+            "folder": self.folder,
+            "status": self.status,
+            "last_event_at": self.last_event_at.isoformat() if self.last_event_at else None,
+            "last_error": self.last_error
+        }
+
+
+class IdleSupervisor:
+    """IDLE监听监督器
+    
+    定期加载激活的邮箱账户，为每个账户维护一个IdleWatcher（总数受max_watchers限制），
+    账户停用、删除或配置变化时停止/重建监听；新邮件同步在线程池中执行并限制并发。
+    """
+    
+    def __init__(self, max_watchers: int, refresh_interval: float, sync_concurrency: int,
+                 folder: str = "INBOX"):
+        self.max_watchers = max_watchers
+        self.refresh_interval = refresh_interval
+        self.folder = folder
+        self._sync_semaphore = asyncio.Semaphore(sync_concurrency)
+        self._watchers: Dict[int, IdleWatcher] = {}
+        self._task: Optional[asyncio.Task] = None
+    
+    @staticmethod
+    def _config_key(account: Dict[str, Any]) -> Tuple:
+        return (account["email_address"], account["password"], account["imap_server"],
+                account["imap_port"], account["is_ssl"])
+    
+    def _load_accounts(self) -> List[Dict[str, Any]]:
+        """加载需要监听的激活账户（在线程中执行）"""
+        from ..core.database import SessionLocal
+        from ..models.email_account import EmailAccount
+        from ..services.email_account_service import EmailAccountService
+        
+        db = SessionLocal()
+        try:
+            account_service = EmailAccountService(db)
+            accounts = db.query(EmailAccount).filter(
+                EmailAccount.is_active == True
+            ).order_by(EmailAccount.id).limit(self.max_watchers).all()
+            
+            result = []
+            for account in accounts:
+                sdk = account_service.create_sdk(account)
+                result.append({
+                    "id": account.id,
+                    "user_id": account.user_id,
+                    "email_address": sdk.email_address,
+                    "password": sdk.password,
+                    "imap_server": sdk.imap_server,
+                    "imap_port": sdk.imap_port,
+                    "is_ssl": sdk.is_ssl
+                })
+            return result
+        finally:
+            db.close()
+    
+    def _sync_account(self, account: Dict[str, Any], folder: str):
+        """增量同步账户文件夹（在线程中执行）"""
+        from ..core.database import SessionLocal
+        from ..services.email_sync_service import EmailSyncService
+        
+        db = SessionLocal()
+        try:
+            result = EmailSyncService(db).sync_folder(
+                account["id"], account["user_id"], folder, return_messages=False
+            )
+            if result.success and result.new_count:
+                logger.info(f"邮箱 {account['email_address']} 收到 {result.new_count} 封新邮件")
+            elif not result.success:
+                logger.warning(f"邮箱 {account['email_address']} 同步失败: {result.error_message}")
+        finally:
+            db.close()
+    
+    async def _on_new_mail(self, account: Dict[str, Any], folder: str):
+        async with self._sync_semaphore:
+            await asyncio.to_thread(self._sync_account, account, folder)
+    
+    async def _reconcile(self):
+        accounts = {account["id"]: account for account in await asyncio.to_thread(self._load_accounts)}
+        
+        for account_id in list(self._watchers):
+            watcher = self._watchers[account_id]
+            account = accounts.get(account_id)
+            if account is None or self._config_key(account) != self._config_key(watcher.account):
+                await watcher.stop()
+                del self._watchers[account_id]
+        
+        for account_id, account in accounts.items():
+            if account_id not in self._watchers:
+                watcher = IdleWatcher(account, self._on_new_mail, self.folder)
+                watcher.start()
+                self._watchers[account_id] = watcher
+    
+    async def _run(self):
+        while True:
+            try:
+                await self._reconcile()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"刷新IDLE监听账户失败: {e}")
+            await asyncio.sleep(self.refresh_interval)
+    
+    def start(self):
+        """启动监督器（需在事件循环中调用）"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="imap-idle-supervisor")
+    
+    async def stop(self):
+        """停止监督器和所有监听"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.gather(*(watcher.stop() for watcher in self._watchers.values()))
+        self._watchers.clear()
+    
+    def get_status(self, account_ids: Optional[List[int]] = None) -> Dict[str, Any]:
+        """获取监听状态，用于监控"""
+        watchers = [
+            watcher.get_status() for account_id, watcher in self._watchers.items()
+            if account_ids is None or account_id in account_ids
+        ]
+        return {
+            "running": self._task is not None,
+            "max_watchers": self.max_watchers,
+            "active_watchers": len(self._watchers),
+            "watchers": watchers
+        }
+
+
+_supervisor: Optional[IdleSupervisor] = None
+
+
+def get_idle_supervisor() -> IdleSupervisor:
+    """获取全局IDLE监督器实例"""
+    global _supervisor
+    if _supervisor is None:
+        _supervisor = IdleSupervisor(
+            max_watchers=settings.email_idle_max_watchers,
+            refresh_interval=settings.email_idle_refresh_interval,
+            sync_concurrency=settings.email_idle_sync_concurrency,
+            folder=settings.email_idle_folder
+        )
+    return _supervisor
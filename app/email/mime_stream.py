@@ -0,0 +1,289 @@
+"""
+MIME流式解析模块
+逐块解析完整邮件：邮件头和文本正文增量提取，附件边解码边写入临时文件（超过阈值落盘），
+由调用方提供的sink上传到对象存储，整个过程内存占用与附件大小无关
+"""
+
+import binascii
+import tempfile
+from email import policy
+from email.parser import BytesHeaderParser
+from email.message import Message
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+from .header_parser import extract_headers
+
+_MAX_PARTIAL_LINE = 8192  # 超过该长度的不完整行不可能是边界行，直接作为内容输出
+
+
+class _Base64Decoder:
+    """增量base64解码，保留不足4字符的尾部到下一块"""
+    
+    def __init__(self):
+        self._pending = b""
+    
+    def decode(self, data: bytes) -> bytes:
+        data = self._pending + b"".join(data.split())
+        usable = len(data) - len(data) % 4
+        self._pending = data[usable:]
+        try:
+            return binascii.a2b_base64(data[:usable]) if usable else b""
+        except binascii.Error:
+            return b""
+    
+    def flush(self) -> bytes:
+        pending, self._pending = self._pending, b""
+        if not pending:
+            return b""
+        try:
+            return binascii.a2b_base64(pending + b"=" * (-len(pending) % 4))
+        except binascii.Error:
+            return b""
+
+
+class _QuotedPrintableDecoder:
+    """按行增量解码quoted-printable"""
+    
+    def __init__(self):
+        self._pending = b""
+    
+    def decode(self, data: bytes) -> bytes:
+        data = self._pending + data
+        end = data.rfind(b"\n") + 1
+        self._pending = data[end:]
+        return binascii.a2b_qp(data[:end]) if end else b""
+    
+    def flush(self) -> bytes:
+        pending, self._pending = self._pending, b""
+        return binascii.a2b_qp(pending) if pending else b""
+
+
+class _IdentityDecoder:
+    """7bit/8bit/binary不需要解码"""
+    
+    def decode(self, data: bytes) -> bytes:
+        return data
+    
+    def flush(self) -> bytes:
+        return b""
+
+
+def _get_decoder(encoding: Optional[str]):
+    encoding = (encoding or "").strip().lower()
+    if encoding == "base64":
+        return _Base64Decoder()
+    if encoding == "quoted-printable":
+        return _QuotedPrintableDecoder()
+    return _IdentityDecoder()
+
+
+class SpooledAttachment:
+    """附件sink：解码后的内容先写入SpooledTemporaryFile，结束时交给uploader上传"""
+    
+    def __init__(self, info: Dict[str, Any], uploader: Callable, max_memory: int):
+        self.info = info
+        self.uploader = uploader
+        self.size = 0
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_memory)
+    
+    def write(self, data: bytes):
+        self.size += len(data)
+        self._file.write(data)
+    
+    def close(self) -> Dict[str, Any]:
+        """上传并返回附件引用"""
+        try:
+            self._file.seek(0)
+            storage_key = self.uploader(self._file, self.info)
+            return dict(self.info, size=self.size, storage_key=storage_key)
+        finally:
+            self._file.close()
+
+
+class _Part:
+    """正在解析的叶子部件"""
+    
+    def __init__(self, headers: Message, sink=None, text_limit: int = 0):
+        self.headers = headers
+        self.decoder = _get_decoder(headers.get('Content-Transfer-Encoding'))
+        self.sink = sink
+        self.text_limit = text_limit
+        self.text = bytearray()
+        self.truncated = False
+    
+    def write(self, data: bytes):
+        decoded = self.decoder.decode(data)
+        self._write_decoded(decoded)
+    
+    def _write_decoded(self, decoded: bytes):
+        if not decoded:
+            return
+        if self.sink is not None:
+            self.sink.write(decoded)
+            return
+        remaining = self.text_limit - len(self.text)
+        if remaining > 0:
+            self.text.extend(decoded[:remaining])
+        if len(decoded) > remaining:
+            self.truncated = True
+    
+    def finish(self):
+        self._write_decoded(self.decoder.flush())
+
+
+class MimeStreamParser:
+    """
+    MIME流式解析器
+    
+    通过feed()逐块输入原始邮件数据，close()返回解析结果：
+    {"headers": 邮件头, "text": 纯文本正文, "html": HTML正文, "attachments": [附件引用],
+     "truncated": 正文是否被截断}
+    """
+    
+    def __init__(self, attachment_sink_factory: Callable[[Dict[str, Any]], Any],
+                 max_text_size: int = 1024 * 1024):
+        self.attachment_sink_factory = attachment_sink_factory
+        self.max_text_size = max_text_size
+        self.headers: Optional[Dict[str, Any]] = None
+        self.text_parts: List[Tuple[str, str]] = []  # [(content_type, text)]
+        self.attachments: List[Dict[str, Any]] = []
+        self.truncated = False
+        
+        self._boundaries: List[bytes] = []
+        self._state = "headers"  # headers / body / skip
+        self._header_lines: List[bytes] = []
+        self._part: Optional[_Part] = None
+        self._partial = b""  # 尚未结束的行
+        self._midline = False  # 当前行的开头部分已经作为内容输出
+        self._pending_eol = b""  # 上一行的换行符，属于下一个边界行时需要丢弃
+        self._attachment_index = 0
+    
+    # 行处理
+    def feed(self, chunk: bytes):
+        data = self._partial + chunk
+        start = 0
+        while True:
+            end = data.find(b"\n", start)
+            if end == -1:
+                break
+            line = data[start:end + 1]
+            content = line.rstrip(b"\r\n")
+            self._process_line(content, line[len(content):])
+            start = end + 1
+        self._partial = data[start:]
+        
+        # 超长的不完整行（如无换行的二进制内容）直接作为正文输出，避免缓冲无限增长
+        if len(self._partial) > _MAX_PARTIAL_LINE and self._state == "body":
+            self._write_body(self._partial, b"")
+            self._partial = b""
+            self._midline = True
+    
+    def _process_line(self, content: bytes, eol: bytes):
+        midline, self._midline = self._midline, False
+        
+        if self._state == "headers":
+            if content:
+                self._header_lines.append(content + eol)
+            else:
+                self._start_entity()
+            return
+        
+        if not midline and content.startswith(b"--") and self._boundaries:
+            if self._handle_boundary(content):
+                return
+        
+        if self._state == "body":
+            self._write_body(content, eol)
+    
+    def _write_body(self, content: bytes, eol: bytes):
+        # 上一行的换行符只有在确定下一行不是边界时才写入
+        self._part.write(self._pending_eol + content)
+        self._pending_eol = eol
+    
+    def _handle_boundary(self, content: bytes) -> bool:
+        stripped = content.rstrip(b" \t")
+        for level in range(len(self._boundaries) - 1, -1, -1):
+            boundary = self._boundaries[level]
+            if stripped == b"--" + boundary:
+                self._finish_part()
+                del self._boundaries[level + 1:]
+                self._state = "headers"
+                self._header_lines = []
+                return True
+            if stripped == b"--" + boundary + b"--":
+                self._finish_part()
+                del self._boundaries[level:]
+                self._state = "skip"
+                return True
+        return False
+    
+    # 部件处理
+    def _start_entity(self):
+        headers = BytesHeaderParser(policy=policy.default).parsebytes(b"".join(self._header_lines))
+        self._header_lines = []
+        if self.headers is None:
+            self.headers = extract_headers(headers)
+        
+        content_type = headers.get_content_type()
+        boundary = headers.get_param('boundary') if headers.get_content_maintype() == 'multipart' else None
+        if boundary:
+            self._boundaries.append(str(boundary).encode())
+            self._state = "skip"  # 跳过preamble直到第一个边界
+            return
+        
+        self._state = "body"
+        self._pending_eol = b""
+        if self._is_attachment(headers):
+            self._attachment_index += 1
+            info = {
+                "index": self._attachment_index,
+                "filename": headers.get_filename() or f"attachment-{self._attachment_index}",
+                "content_type": content_type,
+                "content_id": (headers.get('Content-ID') or "").strip("<> ") or None
+            }
+            self._part = _Part(headers, sink=self.attachment_sink_factory(info))
+        else:
+            used = sum(len(text) for _, text in self.text_parts)
+            self._part = _Part(headers, text_limit=max(self.max_text_size - used, 0))
+    
+    @staticmethod
+    def _is_attachment(headers: Message) -> bool:
+        disposition = (headers.get_content_disposition() or "").lower()
+        if disposition == "attachment" or headers.get_filename():
+            return True
+        return headers.get_content_type() not in ("text/plain", "text/html")
+    
+    def _finish_part(self):
+        part, self._part = self._part, None
+        self._pending_eol = b""
+        if part is None:
+            return
+        part.finish()
+        if part.sink is not None:
+            self.attachments.append(part.sink.close())
+            return
+        charset = part.headers.get_content_charset() or "utf-8"
+        try:
+            text = bytes(part.text).decode(charset, errors="replace")
+        except LookupError:
+            text = bytes(part.text).decode("utf-8", errors="replace")
+        self.text_parts.append((part.headers.get_content_type(), text))
+        self.truncated = self.truncated or part.truncated
+    
+    def close(self) -> Dict[str, Any]:
+        """结束解析，返回解析结果"""
+        if self._partial:
+            content = self._partial.rstrip(b"\r\n")
+            self._process_line(content, self._partial[len(content):])
+            self._partial = b""
+        if self._state == "headers" and self._header_lines:
+            self._start_entity()
+        self._finish_part()
+        
+        return {
+            "headers": self.headers or {},
+            "text": "\n".join(text for content_type, text in self.text_parts if content_type == "text/plain") or None,
+            "html": "\n".join(text for content_type, text in self.text_parts if content_type == "text/html") or None,
+            "attachments": self.attachments,
+            "truncated": self.truncated
+        }
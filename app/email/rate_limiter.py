@@ -0,0 +1,204 @@
+"""
+邮件发送限流模块
+按邮箱账户和收件人域名分别维护令牌桶，避免突发发送被服务商限流或被对方域名灰名单
+"""
+
+import asyncio
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Any
+import logging
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """令牌桶
+
+    采用预约方式实现：每次发送预占一个令牌，令牌不足时允许透支，
+    透支部分换算为需要等待的秒数，后来的请求自然排在前面请求之后。
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate  # 每秒补充的令牌数
+        self.capacity = capacity  # 桶容量（允许的突发数量）
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        """按流逝时间补充令牌"""
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+
+    def reserve(self, now: float) -> float:
+        """预占一个令牌，返回需要等待的秒数"""
+        self._refill(now)
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def cancel(self):
+        """退还一个预占的令牌"""
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def is_idle(self, now: float) -> bool:
+        """桶已满说明近期没有发送，可以回收"""
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+    def snapshot(self, now: float) -> Dict[str, Any]:
+        """当前桶状态"""
+        self._refill(now)
+        return {
+            "tokens": round(self.tokens, 3),
+            "capacity": self.capacity,
+            "rate_per_second": self.rate,
+            "wait_seconds": round(-self.tokens / self.rate, 3) if self.tokens < 0 else 0.0
+        }
+
+
+class SendRateLimiter:
+    """邮件发送限流器
+
+    - 账户维度：每个邮箱账户一个令牌桶，防止263等服务商因突发发送封禁账户
+    - 域名维度：每个收件人域名一个令牌桶（所有账户共享），防止对方服务器灰名单
+    
+    同时记录每个账户发送过的域名，状态查询只返回调用者自己账户涉及的域名
+    """
+
+    MAX_BUCKETS = 10000  # 桶数量超过该值时回收空闲桶
+
+    def __init__(
+        self,
+        account_rate: float,
+        account_burst: float,
+        domain_rate: float,
+        domain_burst: float,
+        max_wait: float
+    ):
+        self.account_rate = account_rate
+        self.account_burst = account_burst
+        self.domain_rate = domain_rate
+        self.domain_burst = domain_burst
+        self.max_wait = max_wait
+        self._account_buckets: Dict[int, TokenBucket] = {}
+        self._domain_buckets: Dict[str, TokenBucket] = {}
+        self._account_domains: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_domains(emails: Iterable[str]) -> List[str]:
+        """提取去重后的收件人域名"""
+        domains = []
+        for email in emails:
+            domain = str(email).rsplit("@", 1)[-1].strip().lower()
+            if domain and domain not in domains:
+                domains.append(domain)
+        return domains
+
+    def _get_bucket(self, buckets: Dict, key, rate: float, capacity: float, now: float) -> TokenBucket:
+        bucket = buckets.get(key)
+        if bucket is None:
+            if len(buckets) >= self.MAX_BUCKETS:
+                idle_keys = [k for k, b in buckets.items() if b.is_idle(now)]
+                for idle_key in idle_keys:
+                    del buckets[idle_key]
+                self._forget_idle(buckets, idle_keys)
+            bucket = TokenBucket(rate, capacity)
+            buckets[key] = bucket
+        return bucket
+
+    def _forget_idle(self, buckets: Dict, idle_keys: List):
+        """回收空闲桶后，同步清理账户发送过的域名记录"""
+        if buckets is self._account_buckets:
+            for account_id in idle_keys:
+                self._account_domains.pop(account_id, None)
+        else:
+            removed = set(idle_keys)
+            for domains in self._account_domains.values():
+                domains -= removed
+    
+    def reserve(self, account_id: int, recipients: Iterable[str]) -> Tuple[bool, float]:
+        """
+        为一次发送预占账户令牌和所有收件人域名令牌
+
+        Returns:
+            (是否预占成功, 需要等待的秒数)。等待时间超过max_wait时不预占，
+            返回False和建议的重试等待时间
+        """
+        now = time.monotonic()
+        with self._lock:
+            reserved = [self._get_bucket(
+                self._account_buckets, account_id, self.account_rate, self.account_burst, now
+            )]
+            domains = self.get_domains(recipients)
+            self._account_domains.setdefault(account_id, set()).update(domains)
+            for domain in domains:
+                reserved.append(self._get_bucket(
+                    self._domain_buckets, domain, self.domain_rate, self.domain_burst, now
+                ))
+
+            wait = max(bucket.reserve(now) for bucket in reserved)
+            if wait > self.max_wait:
+                for bucket in reserved:
+                    bucket.cancel()
+                return False, wait
+            return True, wait
+
+    async def acquire(self, account_id: int, recipients: Iterable[str]) -> Tuple[bool, float]:
+        """
+        获取发送许可，令牌不足时异步等待（不阻塞事件循环）
+        
+        同步代码（如工作线程中的批量发送）应使用reserve，自行决定如何等待
+
+        Returns:
+            (是否获得许可, 等待/建议重试的秒数)
+        """
+        acquired, wait = self.reserve(account_id, recipients)
+        if acquired and wait > 0:
+            logger.info(f"邮箱账户 {account_id} 发送限流，排队等待 {wait:.2f} 秒")
+            await asyncio.sleep(wait)
+        return acquired, wait
+
+    def get_status(self, account_ids: Optional[Iterable[int]] = None) -> Dict[str, Any]:
+        """
+        获取令牌桶状态，用于监控
+        
+        Args:
+            account_ids: 只返回这些账户及其发送过的收件人域名的状态（域名桶由所有账户共享，
+                不返回其他用户的收件人域名）；为None时返回全部
+        """
+        now = time.monotonic()
+        with self._lock:
+            if account_ids is None:
+                accounts = list(self._account_buckets.items())
+                domains = list(self._domain_buckets)
+            else:
+                accounts = [(k, self._account_buckets[k]) for k in account_ids if k in self._account_buckets]
+                domains = sorted(set().union(*(self._account_domains.get(k, ()) for k, _ in accounts)))
+            return {
+                "config": {
+                    "account_rate_per_second": self.account_rate,
+                    "account_burst": self.account_burst,
+                    "domain_rate_per_second": self.domain_rate,
+                    "domain_burst": self.domain_burst,
+                    "max_wait_seconds": self.max_wait
+                },
+                "accounts": {str(k): b.snapshot(now) for k, b in accounts},
+                "domains": {k: self._domain_buckets[k].snapshot(now) for k in domains if k in self._domain_buckets}
+            }
+
+
+# 全局限流器实例
+send_rate_limiter = SendRateLimiter(
+    account_rate=settings.email_send_account_rate,
+    account_burst=settings.email_send_account_burst,
+    domain_rate=settings.email_send_domain_rate,
+    domain_burst=settings.email_send_domain_burst,
+    max_wait=settings.email_send_max_wait
+)
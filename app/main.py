@@ -1,5 +1,6 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 import sys
 import os
 
@@ -7,7 +8,12 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.core.config import settings
-from app.routers import overseas_router, hunter_router, contacts_router, email_templates_router, customers_router, email_accounts_router
+from app.core.compression import CompressionMiddleware
+from app.core.metrics import registry
+from app.core.responses import FastJSONResponse
+from app.email.idle_listener import get_idle_supervisor
+from app.services.tag_reindex_service import tag_reindexer
+from app.routers import overseas_router, hunter_router, contacts_router, email_templates_router, customers_router, email_accounts_router, email_messages_router
 
 # Create FastAPI app
 app = FastAPI(
@@ -37,7 +43,8 @@ app = FastAPI(
     """,
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=FastJSONResponse
 )
 
 # Add CORS middleware
@@ -49,6 +56,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 响应压缩（gzip/brotli）
+if settings.compression_enabled:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.compression_minimum_size,
+        profile=settings.compression_profile,
+        enable_brotli=settings.compression_brotli
+    )
+
 # Include routers
 app.include_router(overseas_router)
 app.include_router(hunter_router)
@@ -56,6 +72,7 @@ app.include_router(contacts_router)
 app.include_router(email_templates_router)
 app.include_router(customers_router)
 app.include_router(email_accounts_router)
+app.include_router(email_messages_router)
 
 
 @app.get("/")
@@ -79,11 +96,23 @@ def health_check():
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    """Prometheus metrics endpoint"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.on_event("startup")
 async def startup_event():
     """Application startup event"""
     print("Starting HRepo API...")
     print(f"Debug mode: {settings.debug}")
+    if settings.email_idle_enabled:
+        get_idle_supervisor().start()
+        print("IMAP IDLE邮件监听已启动")
+    if settings.tag_reindex_on_startup:
+        tag_reindexer.start()
+        print("旧版标签转换已在后台启动")
     print("海外客户搜索系统启动完成")
 
 
@@ -91,6 +120,8 @@ async def startup_event():
 async def shutdown_event():
     """Application shutdown event"""
     print("Shutting down HRepo API...")
+    if settings.email_idle_enabled:
+        await get_idle_supervisor().stop()
 
 
 if __name__ == "__main__":
@@ -7,5 +7,8 @@ from .user import User
 from .email_template import EmailTemplate
 from .customer import Customer
 from .email_account import EmailAccount
+from .email_sync import EmailSyncState
+from .email_message import EmailMessage, EmailAttachment
+from .change_counter import UserChangeCounter
 
-__all__ = ["Contact", "ContactTag", "User", "EmailTemplate", "Customer", "EmailAccount"]
+__all__ = ["Contact", "ContactTag", "User", "EmailTemplate", "Customer", "EmailAccount", "EmailSyncState", "EmailMessage", "EmailAttachment", "UserChangeCounter"]
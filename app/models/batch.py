@@ -0,0 +1,53 @@
+"""
+批量操作数据模型
+联系人、客户等资源的批量创建/更新/删除共用
+"""
+
+from pydantic import BaseModel
+from typing import Optional, List, Dict, Any
+from enum import Enum
+
+
+class BatchOperation(str, Enum):
+    """批量操作类型枚举"""
+    CREATE = "create"
+    UPDATE = "update"
+    DELETE = "delete"
+
+
+class BatchOperationItem(BaseModel):
+    """批量操作项"""
+    op: BatchOperation
+    id: Optional[int] = None  # 更新/删除的记录ID
+    data: Optional[Dict[str, Any]] = None  # 创建/更新的字段，按资源的Create/Update模型校验
+
+
+class BatchRequest(BaseModel):
+    """批量操作请求模型"""
+    operations: List[BatchOperationItem]
+
+
+class BatchItemResult(BaseModel):
+    """批量操作项结果"""
+    index: int  # 在请求operations中的位置
+    op: BatchOperation
+    success: bool
+    id: Optional[int] = None  # 记录ID（创建时为新记录ID）
+    error_message: Optional[str] = None
+
+
+class BatchResponse(BaseModel):
+    """批量操作响应模型"""
+    success: bool  # 所有操作是否全部成功
+    total: int
+    succeeded: int
+    failed: int
+    results: List[BatchItemResult]
+    error_message: Optional[str] = None
+
+
+class UpsertResponse(BaseModel):
+    """批量写入（按邮箱新建或更新）响应模型"""
+    success: bool
+    inserted_count: int
+    updated_count: int
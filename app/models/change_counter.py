@@ -0,0 +1,16 @@
+"""
+数据变更计数模型
+"""
+
+from sqlalchemy import Column, Integer, String, BigInteger
+
+from ..core.database import Base
+
+
+class UserChangeCounter(Base):
+    """用户数据变更计数表 - 数据库会话提交写入时按数据范围递增（见core.database.CHANGE_SCOPES），用于接口ETag"""
+    __tablename__ = "user_change_counters"
+    
+    user_id = Column(Integer, primary_key=True)  # 无法确定写入用户时计入0（全局计数）
+    scope = Column(String(50), primary_key=True)  # 数据范围，如contacts、customers、email_templates
+    version = Column(BigInteger, nullable=False, default=0)
@@ -2,30 +2,82 @@
 联系人数据模型
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Table
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Table, Index, UniqueConstraint, DDL, event, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import List, Optional
 from datetime import datetime
+from enum import Enum
+import json
 
+from ..core.config import settings
 from ..core.database import Base
+from ..core.partitioning import contact_partition_ddl
 
-# 联系人标签关联表
+# contacts按user_id哈希分区（contact_partitions > 0，已有数据库由迁移0003转换）。
+# 分区表的主键必须包含分区键，其他表也不能再用外键引用contacts.id，由删除触发器代替
+CONTACTS_PARTITIONED = settings.contact_partitions > 0
+
+
+def contact_foreign_key(ondelete: str) -> list:
+    """引用contacts.id的外键（分区后不建外键）"""
+    return [] if CONTACTS_PARTITIONED else [ForeignKey('contacts.id', ondelete=ondelete)]
+
+
+# 联系人标签关联表 - 联系人通过标签ID引用标签，重命名/删除标签不需要改写联系人
 contact_tag_association = Table(
     'contact_tag_associations',
     Base.metadata,
-    Column('contact_id', Integer, ForeignKey('contacts.id'), primary_key=True),
-    Column('tag_id', Integer, ForeignKey('contact_tags.id'), primary_key=True)
+    Column('contact_id', Integer, *contact_foreign_key('CASCADE'), primary_key=True),
+    Column('tag_id', Integer, ForeignKey('contact_tags.id', ondelete='CASCADE'), primary_key=True),
+    # 按标签查联系人（主键只能支持按联系人查标签）
+    Index('ix_contact_tag_associations_tag_id', 'tag_id')
 )
 
 
+def parse_legacy_tags(tags_json: Optional[str]) -> List[str]:
+    """解析旧版标签JSON"""
+    if not tags_json:
+        return []
+    try:
+        names = json.loads(tags_json)
+    except json.JSONDecodeError:
+        return []
+    return [str(name) for name in names if name] if isinstance(names, list) else []
+
+
+def merge_tag_names(names: Optional[List[str]], tags_json: Optional[str]) -> List[str]:
+    """合并标签名称（关联标签在前，尚未转换的旧版JSON标签在后）"""
+    names = list(names or [])
+    return names + [name for name in parse_legacy_tags(tags_json) if name not in names]
+
+
+def describe_contact(position: Optional[str], company: Optional[str]) -> str:
+    """联系人描述：职位 at 公司"""
+    desc_parts = []
+    if position:
+        desc_parts.append(position)
+    if company:
+        desc_parts.append(f"at {company}")
+    return " ".join(desc_parts) if desc_parts else "No description"
+
+
 class Contact(Base):
     """联系人数据表 - 简化版本"""
     __tablename__ = "contacts"
+    __table_args__ = (
+        # 同一用户下邮箱唯一（不区分大小写），创建和导入通过INSERT ... ON CONFLICT按该索引去重
+        Index('uq_contacts_user_email', 'user_id', text('lower(email)'), unique=True),
+        # 联系人列表和导出：按用户筛选、按创建时间倒序分页
+        Index('ix_contacts_user_created', 'user_id', 'created_at', 'id'),
+        # 标签重建任务按ID扫描仍有旧版标签JSON的联系人，转换完成后索引为空
+        Index('ix_contacts_legacy_tags', 'id', postgresql_where=text('tags IS NOT NULL')),
+        {'postgresql_partition_by': 'HASH (user_id)'} if CONTACTS_PARTITIONED else {},
+    )
     
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, primary_key=CONTACTS_PARTITIONED)  # 分区键
     name = Column(String(200), nullable=False, index=True)  # 联系人姓名
     first_name = Column(String(100), nullable=True, index=True)  # 名字
     last_name = Column(String(100), nullable=True, index=True)  # 姓氏
@@ -33,27 +85,43 @@ class Contact(Base):
     company = Column(String(200), nullable=False, index=True)  # 公司
     domain = Column(String(255), nullable=True)  # 公司域名
     position = Column(String(200), nullable=True)  # 职位
-    tags = Column(Text, nullable=True)  # 存储标签的JSON字符串，如["VIP", "重要客户"]
+    tags = Column(Text, nullable=True)  # 旧版按名称存储的标签JSON，如["VIP", "重要客户"]，由标签重建任务转换为关联后置空
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # 用户关联
     user = relationship("User", back_populates="contacts")
+    # 标签关联
+    tag_items = relationship("ContactTag", secondary=contact_tag_association, lazy="selectin",
+                             primaryjoin="Contact.id == contact_tag_associations.c.contact_id",
+                             secondaryjoin="ContactTag.id == contact_tag_associations.c.tag_id",
+                             order_by="ContactTag.id", passive_deletes=True)
+    
+    # 分区时表主键为(id, user_id)，ORM仍按id识别联系人
+    __mapper_args__ = {"primary_key": [id]}
+    
+    @property
+    def tag_names(self) -> List[str]:
+        """标签名称列表（关联标签在前，尚未转换的旧版JSON标签在后）"""
+        return merge_tag_names([tag.name for tag in self.tag_items], self.tags)
     
     @property
     def description(self):
         """获取描述信息"""
-        desc_parts = []
-        if self.position:
-            desc_parts.append(self.position)
-        if self.company:
-            desc_parts.append(f"at {self.company}")
-        return " ".join(desc_parts) if desc_parts else "No description"
+        return describe_contact(self.position, self.company)
+
+
+if CONTACTS_PARTITIONED:
+    for statement in contact_partition_ddl(settings.contact_partitions):
+        event.listen(Contact.__table__, "after_create", DDL(statement))
 
 
 class ContactTag(Base):
     """联系人标签表 - 简化版本"""
     __tablename__ = "contact_tags"
+    __table_args__ = (
+        UniqueConstraint('user_id', 'name', name='uq_contact_tags_user_name'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -142,5 +210,114 @@ class ContactListResponse(BaseModel):
     total_pages: int
 
 
+class ContactFilter(BaseModel):
+    """联系人筛选条件（与联系人列表接口相同）"""
+    search: Optional[str] = None  # 搜索关键词（姓名、邮箱、公司）
+    tag_names: Optional[List[str]] = None  # 包含任一标签
+    start_date: Optional[str] = None  # 创建开始时间（ISO格式）
+    end_date: Optional[str] = None  # 创建结束时间（ISO格式）
+
+
+class ContactBulkTagRequest(BaseModel):
+    """批量添加/移除标签请求模型，contact_ids和filter至少提供一个（同时提供时取交集）"""
+    contact_ids: Optional[List[int]] = None
+    filter: Optional[ContactFilter] = None
+
+
+class ContactBulkTagResponse(BaseModel):
+    """批量添加/移除标签响应模型"""
+    success: bool
+    tag_id: int
+    affected_count: int  # 实际发生变化的联系人数
+
+
+class TagReindexStatus(BaseModel):
+    """旧版标签JSON转换任务状态"""
+    status: str  # idle/running/completed/failed
+    processed_contacts: int = 0  # 已转换的联系人数
+    created_tags: int = 0  # 为旧版标签名新建的标签数
+    batches: int = 0
+    error_message: Optional[str] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class DuplicateContact(BaseModel):
+    """疑似重复的联系人"""
+    id: int
+    name: str
+    email: str
+    company: str
+    domain: Optional[str] = None
+    score: float  # 与保留联系人的相似度（0~1），保留联系人本身为1
+    reasons: List[str] = []  # 判定依据，如email、name、company、domain
+
+
+class DuplicateGroup(BaseModel):
+    """重复联系人分组"""
+    primary_id: int  # 建议保留的联系人（信息最完整、创建最早）
+    score: float  # 组内最低相似度
+    contacts: List[DuplicateContact]
+
+
+class DuplicateListResponse(BaseModel):
+    """重复联系人查询响应模型"""
+    success: bool
+    scanned_contacts: int  # 参与比较的联系人数
+    compared_pairs: int  # 实际比较的联系人对数
+    groups: List[DuplicateGroup]
+
+
+class ContactMergeGroup(BaseModel):
+    """合并分组：重复联系人合并到保留联系人"""
+    primary_id: int
+    duplicate_ids: List[int]
+
+
+class ContactMergeRequest(BaseModel):
+    """合并联系人请求模型，不提供groups时按min_score自动合并检测到的重复分组"""
+    groups: Optional[List[ContactMergeGroup]] = None
+    # 自动合并会删除联系人且不可恢复，不允许低于contact_dedup_auto_merge_min_score
+    min_score: Optional[float] = Field(None, ge=settings.contact_dedup_auto_merge_min_score, le=1)
+
+
+class ContactMergeResponse(BaseModel):
+    """合并联系人响应模型"""
+    success: bool
+    merged_groups: int
+    merged_contacts: int  # 被合并（删除）的联系人数
+
+
+class DuplicateStrategy(str, Enum):
+    """写入时遇到已存在邮箱的处理方式（联系人导入、联系人转换为客户）"""
+    SKIP = "skip"  # 跳过
+    UPDATE = "update"  # 用新数据更新
+
+
+class ContactImportRowError(BaseModel):
+    """导入行错误"""
+    row: int  # 文件中的行号（表头为第1行）
+    email: Optional[str] = None
+    errors: List[str]
+
+
+class ContactImportStatus(BaseModel):
+    """联系人导入任务状态"""
+    import_id: str
+    status: str  # pending/running/completed/failed
+    filename: Optional[str] = None
+    file_format: str
+    on_duplicate: DuplicateStrategy
+    processed_rows: int = 0  # 已处理行数
+    inserted_count: int = 0  # 新建联系人数
+    updated_count: int = 0  # 更新联系人数
+    skipped_count: int = 0  # 跳过的重复行数
+    failed_count: int = 0  # 校验或写入失败行数
+    errors: List[ContactImportRowError] = []  # 行错误（最多contact_import_max_errors条）
+    error_message: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+
 # 更新前向引用
 ContactResponse.model_rebuild()
@@ -2,15 +2,16 @@
 客户数据模型
 """
 
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from pydantic import BaseModel, EmailStr, validator
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from enum import Enum
 
 from ..core.database import Base
+from .contact import ContactFilter, DuplicateStrategy, contact_foreign_key
 
 
 class CommunicationProgress(str, Enum):
@@ -32,15 +33,25 @@ class InterestLevel(str, Enum):
 class Customer(Base):
     """客户数据表"""
     __tablename__ = "customers"
+    __table_args__ = (
+        # 同一用户下邮箱唯一（不区分大小写），创建和写入通过INSERT ... ON CONFLICT按该索引去重
+        Index('uq_customers_user_email', 'user_id', text('lower(email)'), unique=True),
+        # 客户列表和导出：按用户筛选、按创建时间倒序分页
+        Index('ix_customers_user_created', 'user_id', 'created_at', 'id'),
+        # 按沟通进度/感兴趣程度筛选和统计（都限定在当前用户内）
+        Index('ix_customers_user_progress', 'user_id', 'communication_progress'),
+        Index('ix_customers_user_interest', 'user_id', 'interest_level'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    contact_id = Column(Integer, *contact_foreign_key('SET NULL'), nullable=True, index=True)  # 由联系人转换而来时的来源联系人
     name = Column(String(200), nullable=False, index=True)  # 客户姓名
     email = Column(String(255), nullable=False, index=True)  # 邮件地址
     company = Column(String(200), nullable=False, index=True)  # 公司
     email_count = Column(Integer, default=0)  # 来往邮件次数
-    communication_progress = Column(String(20), default=CommunicationProgress.PENDING, index=True)  # 沟通进度
-    interest_level = Column(String(20), default=InterestLevel.NO_INTEREST, index=True)  # 客户感兴趣程度
+    communication_progress = Column(String(20), default=CommunicationProgress.PENDING)  # 沟通进度
+    interest_level = Column(String(20), default=InterestLevel.NO_INTEREST)  # 客户感兴趣程度
     last_communication_time = Column(DateTime(timezone=True), nullable=True)  # 最近沟通时间
     current_progress = Column(Text, nullable=True)  # 当前进度
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -84,6 +95,7 @@ class CustomerResponse(CustomerBase):
     """客户响应模型"""
     id: int
     user_id: int
+    contact_id: Optional[int] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
     
@@ -113,3 +125,19 @@ class CustomerEmailCountUpdate(BaseModel):
     """客户邮件计数更新模型"""
     email_count: int
     last_communication_time: Optional[datetime] = None
+
+
+class CustomerFromContactsRequest(BaseModel):
+    """联系人转换为客户请求模型，contact_ids和filter至少提供一个（同时提供时取交集）"""
+    contact_ids: Optional[List[int]] = None
+    filter: Optional[ContactFilter] = None
+    on_duplicate: DuplicateStrategy = DuplicateStrategy.SKIP  # 邮箱已是客户时跳过，或用联系人信息更新并关联
+
+
+class CustomerFromContactsResponse(BaseModel):
+    """联系人转换为客户响应模型"""
+    success: bool
+    matched_count: int  # 符合条件的联系人数
+    inserted_count: int  # 新建的客户数
+    updated_count: int  # 已存在并被更新的客户数
+    skipped_count: int  # 已存在而跳过的客户数
@@ -2,7 +2,7 @@
 邮箱账户数据模型
 """
 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from pydantic import BaseModel, EmailStr, validator
@@ -24,6 +24,11 @@ class ConnectionStatus(str, Enum):
 class EmailAccount(Base):
     """邮箱账户数据表"""
     __tablename__ = "email_accounts"
+    __table_args__ = (
+        UniqueConstraint('user_id', 'email_address', name='uq_email_accounts_user_email'),
+        # 邮箱账户列表按创建时间倒序
+        Index('ix_email_accounts_user_created', 'user_id', 'created_at'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -42,6 +47,10 @@ class EmailAccount(Base):
     
     # 用户关联
     user = relationship("User", back_populates="email_accounts")
+    # 同步状态关联
+    sync_states = relationship("EmailSyncState", back_populates="email_account", cascade="all, delete-orphan")
+    # 邮件往来记录关联
+    messages = relationship("EmailMessage", back_populates="email_account", cascade="all, delete-orphan", passive_deletes=True)
 
 
 # Pydantic模型用于API
@@ -147,4 +156,46 @@ class EmailSendResponse(BaseModel):
     failed_count: int
     message_ids: list[str]  # 发送成功的邮件ID
     error_message: Optional[str] = None
+    retry_after: Optional[float] = None  # 发送被限流延迟时，建议的重试等待秒数
+    sent_time: datetime
+
+
+class EmailBatchSendItem(BaseModel):
+    """批量发送中的单封邮件"""
+    to_emails: list[EmailStr]  # 收件人列表
+    cc_emails: Optional[list[EmailStr]] = None  # 抄送列表
+    bcc_emails: Optional[list[EmailStr]] = None  # 密送列表
+    subject: str  # 邮件主题
+    content: str  # 邮件内容
+    is_html: bool = False  # 是否为HTML格式
+
+
+class EmailBatchSendRequest(BaseModel):
+    """批量邮件发送请求模型"""
+    email_account_id: int
+    messages: list[EmailBatchSendItem]  # 邮件列表，在同一个SMTP会话中发送
+
+
+class EmailBatchSendResultItem(BaseModel):
+    """批量发送中单封邮件的结果"""
+    index: int  # 在请求messages中的位置
+    success: bool
+    to_emails: list[str]
+    message_id: Optional[str] = None  # 真实的Message-ID
+    sent_count: int = 0  # 成功投递的收件人数
+    refused_recipients: list[str] = []  # 被服务器拒绝的收件人
+    error_message: Optional[str] = None
+    retry_after: Optional[float] = None  # 被限流延迟时，建议的重试等待秒数
+
+
+class EmailBatchSendResponse(BaseModel):
+    """批量邮件发送响应模型"""
+    success: bool
+    email_account_id: int
+    email_address: str
+    total: int
+    sent_count: int  # 发送成功的邮件数
+    failed_count: int  # 发送失败或被延迟的邮件数
+    results: list[EmailBatchSendResultItem]
+    error_message: Optional[str] = None
     sent_time: datetime
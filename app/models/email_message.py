@@ -0,0 +1,133 @@
+"""
+邮件往来记录数据模型
+"""
+
+from sqlalchemy import Column, Integer, String, Text, BigInteger, Boolean, DateTime, ForeignKey, Index, UniqueConstraint, text
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from pydantic import BaseModel
+from typing import Optional, List
+from datetime import datetime
+from enum import Enum
+
+from ..core.database import Base
+
+
+class MessageDirection(str, Enum):
+    """邮件方向枚举"""
+    RECEIVED = "received"
+    SENT = "sent"
+
+
+class EmailMessage(Base):
+    """邮件往来记录表 - 保存同步到的邮件头，无需再访问IMAP即可查询往来历史"""
+    __tablename__ = "email_messages"
+    __table_args__ = (
+        # 同一文件夹同一UIDVALIDITY下UID唯一，重复同步不会产生重复记录
+        UniqueConstraint('email_account_id', 'folder', 'uid_validity', 'uid', name='uq_email_messages_account_folder_uid'),
+        # 往来历史查询：某账户与某联系人的邮件，按时间排序
+        Index('ix_email_messages_account_counterpart_date', 'email_account_id', 'counterpart_address', 'sent_at'),
+        Index('ix_email_messages_account_date', 'email_account_id', 'sent_at'),
+        Index('ix_email_messages_user_counterpart_date', 'user_id', 'counterpart_address', 'sent_at'),
+        # 邮件列表：按用户筛选，按时间倒序（无时间的排最后）
+        Index('ix_email_messages_user_date', 'user_id', text('sent_at DESC NULLS LAST'), text('id DESC')),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    email_account_id = Column(Integer, ForeignKey('email_accounts.id', ondelete='CASCADE'), nullable=False)
+    folder = Column(String(255), nullable=False)  # IMAP文件夹
+    uid_validity = Column(BigInteger, nullable=False, default=0)  # 同步时文件夹的UIDVALIDITY，服务器未返回时为0（唯一约束中的NULL互不相等，不能用NULL）
+    uid = Column(BigInteger, nullable=False)  # IMAP UID
+    message_id = Column(String(998), nullable=True, index=True)  # Message-ID邮件头
+    in_reply_to = Column(String(998), nullable=True, index=True)  # In-Reply-To邮件头
+    subject = Column(Text, nullable=True)  # 主题
+    from_name = Column(String(255), nullable=True)  # 发件人显示名
+    from_address = Column(String(255), nullable=True)  # 发件人地址（规范化）
+    to_addresses = Column(Text, nullable=True)  # 收件人地址，逗号分隔（规范化）
+    cc_addresses = Column(Text, nullable=True)  # 抄送地址，逗号分隔（规范化）
+    direction = Column(String(10), nullable=False, default=MessageDirection.RECEIVED)  # 邮件方向
+    counterpart_address = Column(String(255), nullable=True)  # 往来对方地址：收到的邮件为发件人，发出的邮件为第一个收件人
+    sent_at = Column(DateTime(timezone=True), nullable=True)  # Date邮件头
+    size = Column(Integer, nullable=True)  # 邮件大小（字节）
+    body_text = Column(Text, nullable=True)  # 纯文本正文（按需获取）
+    body_html = Column(Text, nullable=True)  # HTML正文（按需获取）
+    body_truncated = Column(Boolean, nullable=False, default=False)  # 正文是否超过长度限制被截断
+    body_fetched_at = Column(DateTime(timezone=True), nullable=True)  # 正文获取时间，为空表示尚未获取
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # 邮箱账户关联
+    email_account = relationship("EmailAccount", back_populates="messages")
+    # 附件关联
+    attachments = relationship("EmailAttachment", back_populates="message", cascade="all, delete-orphan",
+                               passive_deletes=True, order_by="EmailAttachment.id")
+
+
+class EmailAttachment(Base):
+    """邮件附件表 - 附件内容保存在对象存储中，这里只记录引用"""
+    __tablename__ = "email_attachments"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    email_message_id = Column(Integer, ForeignKey('email_messages.id', ondelete='CASCADE'), nullable=False, index=True)
+    filename = Column(String(255), nullable=False)  # 文件名
+    content_type = Column(String(255), nullable=True)  # MIME类型
+    content_id = Column(String(255), nullable=True)  # Content-ID（HTML正文内嵌图片引用）
+    size = Column(BigInteger, nullable=False, default=0)  # 解码后的大小（字节）
+    storage_bucket = Column(String(255), nullable=False)  # 对象存储bucket
+    storage_key = Column(String(1024), nullable=False)  # 对象存储key
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # 邮件关联
+    message = relationship("EmailMessage", back_populates="attachments")
+
+
+# Pydantic模型用于API
+class EmailMessageResponse(BaseModel):
+    """邮件往来记录响应模型"""
+    id: int
+    email_account_id: int
+    folder: str
+    uid: int
+    message_id: Optional[str] = None
+    in_reply_to: Optional[str] = None
+    subject: Optional[str] = None
+    from_name: Optional[str] = None
+    from_address: Optional[str] = None
+    to_addresses: List[str] = []
+    cc_addresses: List[str] = []
+    direction: MessageDirection
+    counterpart_address: Optional[str] = None
+    sent_at: Optional[datetime] = None
+    size: Optional[int] = None
+    
+    class Config:
+        from_attributes = True
+
+
+class EmailAttachmentResponse(BaseModel):
+    """邮件附件响应模型"""
+    id: int
+    filename: str
+    content_type: Optional[str] = None
+    content_id: Optional[str] = None
+    size: int
+    download_url: Optional[str] = None  # 临时下载链接
+
+
+class EmailMessageDetailResponse(EmailMessageResponse):
+    """邮件详情响应模型（含正文和附件）"""
+    body_text: Optional[str] = None
+    body_html: Optional[str] = None
+    body_truncated: bool = False
+    body_fetched_at: Optional[datetime] = None
+    attachments: List[EmailAttachmentResponse] = []
+
+
+class EmailMessageListResponse(BaseModel):
+    """邮件往来记录列表响应模型"""
+    success: bool
+    messages: List[EmailMessageResponse]
+    total: int
+    page: int
+    page_size: int
+    total_pages: int
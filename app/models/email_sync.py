@@ -0,0 +1,60 @@
+"""
+邮件同步状态数据模型
+"""
+
+from sqlalchemy import Column, Integer, String, BigInteger, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+
+from ..core.database import Base
+
+
+class EmailSyncState(Base):
+    """邮件同步状态表 - 记录每个邮箱账户每个文件夹的IMAP同步位置"""
+    __tablename__ = "email_sync_states"
+    __table_args__ = (
+        UniqueConstraint('email_account_id', 'folder', name='uq_email_sync_states_account_folder'),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    email_account_id = Column(Integer, ForeignKey('email_accounts.id'), nullable=False, index=True)
+    folder = Column(String(255), nullable=False, default="INBOX")  # IMAP文件夹
+    uid_validity = Column(BigInteger, nullable=True)  # 文件夹的UIDVALIDITY，变化时需要重新同步
+    last_uid = Column(BigInteger, nullable=False, default=0)  # 已同步的最大UID
+    last_synced_at = Column(DateTime(timezone=True), nullable=True)  # 最近同步时间
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    
+    # 邮箱账户关联
+    email_account = relationship("EmailAccount", back_populates="sync_states")
+
+
+# Pydantic模型用于API
+class EmailHeaderItem(BaseModel):
+    """同步到的邮件头"""
+    uid: int
+    message_id: Optional[str] = None
+    in_reply_to: Optional[str] = None
+    subject: str
+    from_address: str
+    to_address: str
+    date: Optional[datetime] = None
+    size: Optional[int] = None
+
+
+class EmailSyncResponse(BaseModel):
+    """邮件同步响应模型"""
+    success: bool
+    email_account_id: int
+    folder: str
+    uid_validity: Optional[int] = None
+    last_uid: int = 0
+    new_count: int = 0  # 本次同步的新邮件数
+    failed_uids: list[int] = []  # 邮件头获取或解析失败、已跳过的UID
+    uid_validity_reset: bool = False  # UIDVALIDITY是否发生变化（已从头重新同步）
+    messages: list[EmailHeaderItem] = []
+    error_message: Optional[str] = None
+    sync_time: datetime
@@ -2,7 +2,7 @@
 邮件模板数据模型
 """
 
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from pydantic import BaseModel
@@ -15,6 +15,10 @@ from ..core.database import Base
 class EmailTemplate(Base):
     """邮件模板数据表"""
     __tablename__ = "email_templates"
+    __table_args__ = (
+        # 模板列表按创建时间倒序
+        Index('ix_email_templates_user_created', 'user_id', 'created_at'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
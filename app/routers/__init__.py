@@ -5,5 +5,6 @@ from .contacts import router as contacts_router
 from .email_templates import router as email_templates_router
 from .customers import router as customers_router
 from .email_accounts import router as email_accounts_router
+from .email_messages import router as email_messages_router
 
-__all__ = ["get_current_user", "overseas_router", "hunter_router", "contacts_router", "email_templates_router", "customers_router", "email_accounts_router"]
+__all__ = ["get_current_user", "overseas_router", "hunter_router", "contacts_router", "email_templates_router", "customers_router", "email_accounts_router", "email_messages_router"]
@@ -2,20 +2,33 @@
 联系人管理API路由
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
-import json
 from datetime import datetime
 import math
+import tempfile
 
-from ..core.database import get_db
+from ..core.config import settings
+from ..core.database import get_db, change_version
+from ..core.responses import FastJSONResponse, response_rows, make_etag, cache_headers, not_modified
 from ..models.contact import (
     ContactCreate, ContactUpdate, ContactResponse, ContactListResponse,
-    ContactTagCreate, ContactTagUpdate, ContactTagResponse
+    ContactTagCreate, ContactTagUpdate, ContactTagResponse,
+    ContactImportStatus, DuplicateStrategy, ContactBulkTagRequest, ContactBulkTagResponse,
+    TagReindexStatus, DuplicateListResponse, ContactMergeRequest, ContactMergeResponse
 )
-from ..services.contact_service import ContactService
+from ..models.batch import BatchRequest, BatchResponse, UpsertResponse
+from ..services.contact_service import ContactService, EXPORT_COLUMNS, LIST_FIELDS
+from ..services.export_service import (
+    ExportFormat, EXPORT_MEDIA_TYPES, get_export_fields, get_export_filename, stream_export
+)
+from ..services.contact_dedup_service import ContactDedupService
+from ..services.contact_import_service import contact_import_manager, detect_file_format
 from ..services.tag_service import TagService
+from ..services.tag_reindex_service import tag_reindexer
 from ..routers.overseas import MockUser, get_current_user
 
 router = APIRouter(prefix="/contacts", tags=["contact-management"])
@@ -23,6 +36,7 @@ router = APIRouter(prefix="/contacts", tags=["contact-management"])
 
 @router.get("/", response_model=ContactListResponse)
 async def get_contacts(
+    request: Request,
     page: int = Query(1, ge=1, description="页码"),
     page_size: int = Query(20, ge=1, le=100, description="每页数量"),
     search: Optional[str] = Query(None, description="搜索关键词（姓名、邮箱、公司）"),
@@ -39,8 +53,17 @@ async def get_contacts(
     - 如果所有筛选条件都为空，则返回全量数据
     - 按创建时间倒序排序
     - 默认每页10条，页码从1开始
+    - 响应带ETag，联系人和标签未变化时带If-None-Match的请求返回304
     """
     try:
+        # ETag由当前用户联系人数据的变更计数和查询参数生成
+        etag = make_etag(
+            "contacts", current_user.id, change_version(db, current_user.id, "contacts"), request.url.query
+        )
+        unchanged = not_modified(request, etag, settings.cache_control_contacts)
+        if unchanged:
+            return unchanged
+        
         contact_service = ContactService(db)
         
         # 解析标签名称列表
@@ -59,45 +82,20 @@ async def get_contacts(
             end_date=end_date
         )
         
-        # 转换为响应模型
-        contact_responses = []
-        for contact in contacts:
-            # 解析标签
-            tag_names = []
-            if contact.tags:
-                try:
-                    tag_names = json.loads(contact.tags)
-                except json.JSONDecodeError:
-                    tag_names = []
-            
-            contact_responses.append(ContactResponse(
-                id=contact.id,
-                user_id=contact.user_id,
-                name=contact.name,
-                first_name=contact.first_name,
-                last_name=contact.last_name,
-                email=contact.email,
-                company=contact.company,
-                domain=contact.domain,
-                position=contact.position,
-                tag_names=tag_names,
-                created_at=contact.created_at,
-                updated_at=contact.updated_at,
-                description=contact.description,
-                tags=tag_names
-            ))
+        # 直接按响应字段构建数据，跳过Pydantic模型的逐个构建和二次校验
+        contact_rows = response_rows(ContactResponse, contacts, **LIST_FIELDS)
         
         # 计算总页数
         total_pages = math.ceil(total / page_size) if total > 0 else 1
         
-        return ContactListResponse(
-            success=True,
-            contacts=contact_responses,
-            total=total,
-            page=page,
-            page_size=page_size,
-            total_pages=total_pages
-        )
+        return FastJSONResponse({
+            "success": True,
+            "contacts": contact_rows,
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "total_pages": total_pages
+        }, headers=cache_headers(etag, settings.cache_control_contacts))
         
     except HTTPException:
         raise
@@ -123,13 +121,7 @@ async def create_contact(
         contact_service = ContactService(db)
         contact = contact_service.create_contact(contact_data, current_user.id)
         
-        # 解析标签
-        tag_names = []
-        if contact.tags:
-            try:
-                tag_names = json.loads(contact.tags)
-            except json.JSONDecodeError:
-                tag_names = []
+        tag_names = contact.tag_names
         
         return ContactResponse(
             id=contact.id,
@@ -148,6 +140,11 @@ async def create_contact(
             tags=tag_names
         )
         
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -155,6 +152,244 @@ async def create_contact(
         )
 
 
+@router.post("/batch", response_model=BatchResponse)
+async def batch_contacts(
+    batch_request: BatchRequest,
+    db: Session = Depends(get_db),
+    current_user: MockUser = Depends(get_current_user)
+):
+    """
+    批量创建/更新/删除联系人
+    
+    - create需要data（同创建联系人），update需要id和data（同更新联系人），delete需要id
+    - 所有操作在一个事务中用批量SQL执行
+    - 数据校验失败、记录不存在的项单独报告失败，不影响其他项
+    """
+    if len(batch_request.operations) > settings.batch_max_operations:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"单次批量操作最多{settings.batch_max_operations}项"
+        )
+    
+    try:
+        contact_service = ContactService(db)
+        return contact_service.batch_operations(batch_request.operations, current_user.id)
+    
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"批量操作联系人失败: {str(e)}"
+        )
+
+
+@router.post("/upsert", response_model=UpsertResponse)
+async def upsert_contacts(
+    contacts: List[ContactCreate],
+    update_existing: bool = Query(True, description="邮箱已存在时是否更新"),
+    db: Session = Depends(get_db),
+    current_user: MockUser = Depends(get_current_user)
+):
+    """
+    按邮箱批量新建或更新联系人
+    
+    用INSERT ... ON CONFLICT完成，重复提交结果相同，适合数据补全等需要幂等写入的场景；
+    已存在的记录只更新请求中提交的字段，未提交的字段保留原值
+    """
+    if len(contacts) > settings.batch_max_operations:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"单次最多写入{settings.batch_max_operations}个联系人"
+        )
+    
+    try:
+        contact_service = ContactService(db)
+        written = contact_service.upsert_contacts(current_user.id, contacts, update_existing)
+        db.commit()
+        inserted_count = sum(1 for _, inserted in written.values() if inserted)
+        return UpsertResponse(
+            success=True, inserted_count=inserted_count, updated_count=len(written) - inserted_count
+        )
+    
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"写入联系人失败: {str(e)}"
+        )
+
+
+@router.post("/import", response_model=ContactImportStatus)
+async def import_contacts(
+    request: Request,
+    file_format: Optional[str] = Query(None, pattern="^(csv|xlsx)$", description="文件格式（csv/xlsx），默认根据文件扩展名或Content-Type判断"),
+    filename: Optional[str] = Query(None, description="原始文件名"),
+    on_duplicate: DuplicateStrategy = Query(DuplicateStrategy.SKIP, description="邮箱已存在时跳过（skip）或更新（update）"),
+    wait: bool = Query(False, description="是否等待导入完成后返回"),
+    current_user: MockUser = Depends(get_current_user)
+):
+    """
+    批量导入联系人
+    
+    请求体为CSV或XLSX文件内容（非multipart），第一行为表头：
+    name/姓名、email/邮箱、company/公司、first_name、last_name、domain、position、tags（逗号或分号分隔）
+    - 上传内容边接收边写入临时文件，不整体读入内存
+    - 每批按ContactCreate规则校验，多行INSERT写入，每批提交一次
+    - 默认立即返回任务状态，通过GET /contacts/import/{import_id}查询进度和行错误
+    """
+    fileobj = tempfile.SpooledTemporaryFile(max_size=settings.contact_import_spool_size)
+    try:
+        size = 0
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > settings.contact_import_max_file_size:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail="导入文件过大"
+                )
+            fileobj.write(chunk)
+        if size == 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="导入文件为空"
+            )
+        fileobj.seek(0)
+        
+        job = contact_import_manager.create_job(
+            user_id=current_user.id,
+            filename=filename,
+            file_format=detect_file_format(file_format, request.headers.get("content-type"), filename),
+            on_duplicate=on_duplicate
+        )
+        if wait:
+            return await run_in_threadpool(contact_import_manager.run, job, fileobj, current_user.id)
+        contact_import_manager.submit(job, fileobj, current_user.id)
+        return job
+    
+    except HTTPException:
+        fileobj.close()
+        raise
+    except Exception as e:
+        fileobj.close()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"导入联系人失败: {str(e)}"
+        )
+
+
+@router.get("/import/{import_id}", response_model=ContactImportStatus)
+async def get_import_status(
+    import_id: str,
+    current_user: MockUser = Depends(get_current_user)
+):
+    """
+    查询联系人导入任务进度和行错误
+    """
+    job = contact_import_manager.get_job(import_id, current_user.id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="导入任务不存在"
+        )
+    return job
+
+
+@router.get("/export")
+async def export_contacts(
+    file_format: ExportFormat = Query(ExportFormat.CSV, alias="format", description="导出格式（csv/ndjson/parquet）"),
+    search: Optional[str] = Query(None, description="搜索关键词（姓名、邮箱、公司）"),
+    tags: Optional[str] = Query(None, description="标签名称列表，用逗号分隔（如：VIP,重要客户）"),
+    start_date: Optional[str] = Query(None, description="创建开始时间（ISO格式，如：2025-01-01T00:00:00Z）"),
+    end_date: Optional[str] = Query(None, description="创建结束时间（ISO格式，如：2025-12-31T23:59:59Z）"),
+    current_user: MockUser = Depends(get_current_user)
+):
+    """
+    导出联系人
+    
+    筛选条件与联系人列表相同，不分页；通过服务端游标边查询边输出，内存占用与导出数量无关
+    """
+    tag_names = None
+    if tags:
+        tag_names = [tag_name.strip() for tag_name in tags.split(",") if tag_name.strip()]
+    
+    def row_factory(db: Session):
+        return ContactService(db).iter_contacts_for_export(
+            user_id=current_user.id,
+            search_query=search,
+            tag_names=tag_names,
+            start_date=start_date,
+            end_date=end_date,
+            batch_size=settings.export_batch_size
+        )
+    
+    fields = get_export_fields(EXPORT_COLUMNS, overrides={"tags": list})
+    return StreamingResponse(
+        stream_export(row_factory, fields, file_format, settings.export_batch_size),
+        media_type=EXPORT_MEDIA_TYPES[file_format],
+        headers={"Content-Disposition": f'attachment; filename="{get_export_filename("contacts", file_format)}"'}
+    )
+
+
+@router.get("/duplicates", response_model=DuplicateListResponse)
+async def get_duplicate_contacts(
+    min_score: Optional[float] = Query(None, ge=0, le=1, description="最低相似度（默认contact_dedup_min_score）"),
+    limit: int = Query(100, ge=1, le=1000, description="最多返回的分组数"),
+    db: Session = Depends(get_db),
+    current_user: MockUser = Depends(get_current_user)
+):
+    """
+    查找重复联系人
+    
+    邮箱相同的联系人直接归为一组；其余按域名+姓名读音、公司+姓名读音分桶，只在桶内比较姓名、公司和域名的相似度
+    """
+    try:
+        dedup_service = ContactDedupService(db)
+        return await run_in_threadpool(dedup_service.find_duplicates, current_user.id, min_score, limit)
+    
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"查找重复联系人失败: {str(e)}"
+        )
+
+
+@router.post("/merge", response_model=ContactMergeResponse)
+async def merge_contacts(
+    merge_request: ContactMergeRequest,
+    db: Session = Depends(get_db),
+    current_user: MockUser = Depends(get_current_user)
+):
+    """
+    合并联系人
+    
+    指定groups时按分组合并；否则合并相似度不低于min_score的重复分组（默认只合并邮箱相同的联系人），
+    组内只合并与保留联系人的相似度不低于min_score的成员。
+    保留联系人的空字段用重复联系人补全，标签合并，重复联系人删除，全部在一个事务中完成
+    """
+    try:
+        dedup_service = ContactDedupService(db)
+        if merge_request.groups is not None:
+            merged_groups, merged_contacts = await run_in_threadpool(
+                dedup_service.merge_contacts, current_user.id, merge_request.groups
+            )
+        else:
+            merged_groups, merged_contacts = await run_in_threadpool(
+                dedup_service.merge_detected, current_user.id, merge_request.min_score
+            )
+        
+        return ContactMergeResponse(success=True, merged_groups=merged_groups, merged_contacts=merged_contacts)
+    
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"合并联系人失败: {str(e)}"
+        )
+
+
 @router.get("/{contact_id}", response_model=ContactResponse)
 async def get_contact(
     contact_id: int,
@@ -174,13 +409,7 @@ async def get_contact(
                 detail="联系人不存在"
             )
         
-        # 解析标签
-        tag_names = []
-        if contact.tags:
-            try:
-                tag_names = json.loads(contact.tags)
-            except json.JSONDecodeError:
-                tag_names = []
+        tag_names = contact.tag_names
         
         return ContactResponse(
             id=contact.id,
@@ -228,13 +457,7 @@ async def update_contact(
                 detail="联系人不存在"
             )
         
-        # 解析标签
-        tag_names = []
-        if contact.tags:
-            try:
-                tag_names = json.loads(contact.tags)
-            except json.JSONDecodeError:
-                tag_names = []
+        tag_names = contact.tag_names
         
         return ContactResponse(
             id=contact.id,
@@ -255,6 +478,11 @@ async def update_contact(
         
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -354,6 +582,90 @@ async def remove_tag_from_contact(
         )
 
 
+@router.post("/tags/{tag_id}/bulk-assign", response_model=ContactBulkTagResponse)
+async def bulk_assign_tag(
+    tag_id: int,
+    bulk_request: ContactBulkTagRequest,
+    db: Session = Depends(get_db),
+    current_user: MockUser = Depends(get_current_user)
+):
+    """
+    批量添加标签
+    
+    目标联系人由contact_ids或filter（筛选条件同联系人列表）指定，同时提供时取交集；
+    整批变更由一条INSERT ... SELECT语句完成
+    """
+    if bulk_request.contact_ids is None and bulk_request.filter is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="contact_ids和filter至少提供一个"
+        )
+    
+    try:
+        contact_service = ContactService(db)
+        affected_count = contact_service.bulk_add_tag(
+            tag_id, current_user.id, bulk_request.contact_ids, bulk_request.filter
+        )
+        
+        if affected_count is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="标签不存在"
+            )
+        
+        return ContactBulkTagResponse(success=True, tag_id=tag_id, affected_count=affected_count)
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"批量添加标签失败: {str(e)}"
+        )
+
+
+@router.post("/tags/{tag_id}/bulk-remove", response_model=ContactBulkTagResponse)
+async def bulk_remove_tag(
+    tag_id: int,
+    bulk_request: ContactBulkTagRequest,
+    db: Session = Depends(get_db),
+    current_user: MockUser = Depends(get_current_user)
+):
+    """
+    批量移除标签
+    
+    目标联系人由contact_ids或filter（筛选条件同联系人列表）指定，同时提供时取交集；
+    整批变更由一条UPDATE语句完成
+    """
+    if bulk_request.contact_ids is None and bulk_request.filter is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="contact_ids和filter至少提供一个"
+        )
+    
+    try:
+        contact_service = ContactService(db)
+        affected_count = contact_service.bulk_remove_tag(
+            tag_id, current_user.id, bulk_request.contact_ids, bulk_request.filter
+        )
+        
+        if affected_count is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="标签不存在"
+            )
+        
+        return ContactBulkTagResponse(success=True, tag_id=tag_id, affected_count=affected_count)
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"批量移除标签失败: {str(e)}"
+        )
+
+
 # 标签管理接口
 @router.get("/tags/", response_model=List[ContactTagResponse])
 async def get_tags(
@@ -419,6 +731,16 @@ async def update_tag(
     """
     try:
         tag_service = TagService(db)
+        
+        # 检查新名称是否与其他标签重复
+        if tag_data.name:
+            existing_tag = tag_service.get_tag_by_name(tag_data.name, current_user.id)
+            if existing_tag and existing_tag.id != tag_id:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="标签名称已存在"
+                )
+        
         tag = tag_service.update_tag(tag_id, tag_data, current_user.id)
         
         if not tag:
@@ -466,3 +788,45 @@ async def delete_tag(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"删除标签失败: {str(e)}"
         )
+
+
+def _require_admin(current_user: MockUser):
+    """旧版标签转换处理所有用户的联系人，只允许管理员操作和查看"""
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="只有管理员可以执行旧版标签转换"
+        )
+
+
+@router.post("/tags/reindex", response_model=TagReindexStatus)
+async def start_tag_reindex(
+    current_user: MockUser = Depends(get_current_user)
+):
+    """
+    启动旧版标签转换（管理员）
+    
+    在后台把所有用户联系人中按名称存储的旧版标签JSON分批转换为标签关联，每批一个短事务，不锁整表。
+    任务已在运行时直接返回当前状态。也可以用 python -m app.services.tag_reindex_service 在命令行执行。
+    """
+    _require_admin(current_user)
+    try:
+        tag_reindexer.start()
+        return tag_reindexer.status
+    
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"启动标签转换失败: {str(e)}"
+        )
+
+
+@router.get("/tags/reindex/status", response_model=TagReindexStatus)
+async def get_tag_reindex_status(
+    current_user: MockUser = Depends(get_current_user)
+):
+    """
+    查询旧版标签转换进度（管理员）
+    """
+    _require_admin(current_user)
+    return tag_reindexer.status
@@ -2,17 +2,25 @@
 客户管理API路由
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import math
 
-from ..core.database import get_db
+from ..core.config import settings
+from ..core.database import get_db, change_version
+from ..core.responses import FastJSONResponse, response_rows, make_etag, cache_headers, not_modified
 from ..models.customer import (
     CustomerCreate, CustomerUpdate, CustomerResponse, CustomerListResponse,
-    CustomerProgressUpdate, CustomerEmailCountUpdate, CommunicationProgress, InterestLevel
+    CustomerProgressUpdate, CustomerEmailCountUpdate, CommunicationProgress, InterestLevel,
+    CustomerFromContactsRequest, CustomerFromContactsResponse
+)
+from ..models.batch import BatchRequest, BatchResponse, UpsertResponse
+from ..services.customer_service import CustomerService, EXPORT_COLUMNS
+from ..services.export_service import (
+    ExportFormat, EXPORT_MEDIA_TYPES, get_export_fields, get_export_filename, stream_export
 )
-from ..services.customer_service import CustomerService
 from ..routers.overseas import MockUser, get_current_user
 
 router = APIRouter(prefix="/customers", tags=["customer-management"])
@@ -49,36 +57,20 @@ async def get_customers(
             interest_level=interest_level
         )
         
-        # 转换为响应模型
-        customer_responses = [
-            CustomerResponse(
-                id=customer.id,
-                user_id=customer.user_id,
-                name=customer.name,
-                email=customer.email,
-                company=customer.company,
-                email_count=customer.email_count,
-                communication_progress=customer.communication_progress,
-                interest_level=customer.interest_level,
-                last_communication_time=customer.last_communication_time,
-                current_progress=customer.current_progress,
-                created_at=customer.created_at,
-                updated_at=customer.updated_at
-            )
-            for customer in customers
-        ]
+        # 直接按响应字段构建数据，跳过Pydantic模型的逐个构建和二次校验
+        customer_rows = response_rows(CustomerResponse, customers)
         
         # 计算总页数
         total_pages = math.ceil(total / page_size) if total > 0 else 1
         
-        return CustomerListResponse(
-            success=True,
-            customers=customer_responses,
-            total=total,
-            page=page,
-            page_size=page_size,
-            total_pages=total_pages
-        )
+        return FastJSONResponse({
+            "success": True,
+            "customers": customer_rows,
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "total_pages": total_pages
+        })
         
     except Exception as e:
         raise HTTPException(
@@ -103,6 +95,7 @@ async def create_customer(
         return CustomerResponse(
             id=customer.id,
             user_id=customer.user_id,
+            contact_id=customer.contact_id,
             name=customer.name,
             email=customer.email,
             company=customer.company,
@@ -115,6 +108,11 @@ async def create_customer(
             updated_at=customer.updated_at
         )
         
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -122,6 +120,134 @@ async def create_customer(
         )
 
 
+@router.post("/batch", response_model=BatchResponse)
+async def batch_customers(
+    batch_request: BatchRequest,
+    db: Session = Depends(get_db),
+    current_user: MockUser = Depends(get_current_user)
+):
+    """
+    批量创建/更新/删除客户
+    
+    - create需要data（同创建客户），update需要id和data（同更新客户），delete需要id
+    - 所有操作在一个事务中用批量SQL执行
+    - 数据校验失败、记录不存在的项单独报告失败，不影响其他项
+    """
+    if len(batch_request.operations) > settings.batch_max_operations:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"单次批量操作最多{settings.batch_max_operations}项"
+        )
+    
+    try:
+        customer_service = CustomerService(db)
+        return customer_service.batch_operations(batch_request.operations, current_user.id)
+    
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"批量操作客户失败: {str(e)}"
+        )
+
+
+@router.post("/upsert", response_model=UpsertResponse)
+async def upsert_customers(
+    customers: List[CustomerCreate],
+    update_existing: bool = Query(True, description="邮箱已存在时是否更新"),
+    db: Session = Depends(get_db),
+    current_user: MockUser = Depends(get_current_user)
+):
+    """
+    按邮箱批量新建或更新客户
+    
+    用INSERT ... ON CONFLICT完成，重复提交结果相同，适合数据补全等需要幂等写入的场景；
+    已存在的记录只更新请求中提交的字段，未提交的字段保留原值
+    """
+    if len(customers) > settings.batch_max_operations:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"单次最多写入{settings.batch_max_operations}个客户"
+        )
+    
+    try:
+        customer_service = CustomerService(db)
+        written = customer_service.upsert_customers(current_user.id, customers, update_existing)
+        db.commit()
+        inserted_count = sum(1 for _, inserted in written.values() if inserted)
+        return UpsertResponse(
+            success=True, inserted_count=inserted_count, updated_count=len(written) - inserted_count
+        )
+    
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"写入客户失败: {str(e)}"
+        )
+
+
+@router.post("/from-contacts", response_model=CustomerFromContactsResponse)
+async def create_customers_from_contacts(
+    convert_request: CustomerFromContactsRequest,
+    db: Session = Depends(get_db),
+    current_user: MockUser = Depends(get_current_user)
+):
+    """
+    把联系人转换为客户
+    
+    目标联系人由contact_ids或filter（筛选条件同联系人列表，可按标签筛选）指定，同时提供时取交集；
+    由一条INSERT ... SELECT完成，新客户通过contact_id关联来源联系人。
+    邮箱已是客户时按on_duplicate跳过（skip）或更新并关联（update）
+    """
+    if convert_request.contact_ids is None and convert_request.filter is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="contact_ids和filter至少提供一个"
+        )
+    
+    try:
+        customer_service = CustomerService(db)
+        return customer_service.create_from_contacts(
+            current_user.id, convert_request.contact_ids, convert_request.filter, convert_request.on_duplicate
+        )
+    
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"联系人转换为客户失败: {str(e)}"
+        )
+
+
+@router.get("/export")
+async def export_customers(
+    file_format: ExportFormat = Query(ExportFormat.CSV, alias="format", description="导出格式（csv/ndjson/parquet）"),
+    search: Optional[str] = Query(None, description="搜索关键词（姓名、邮箱、公司）"),
+    communication_progress: Optional[CommunicationProgress] = Query(None, description="沟通进度筛选"),
+    interest_level: Optional[InterestLevel] = Query(None, description="感兴趣程度筛选"),
+    current_user: MockUser = Depends(get_current_user)
+):
+    """
+    导出客户
+    
+    筛选条件与客户列表相同，不分页；通过服务端游标边查询边输出，内存占用与导出数量无关
+    """
+    def row_factory(db: Session):
+        return CustomerService(db).iter_customers_for_export(
+            user_id=current_user.id,
+            search_query=search,
+            communication_progress=communication_progress,
+            interest_level=interest_level,
+            batch_size=settings.export_batch_size
+        )
+    
+    return StreamingResponse(
+        stream_export(row_factory, get_export_fields(EXPORT_COLUMNS), file_format, settings.export_batch_size),
+        media_type=EXPORT_MEDIA_TYPES[file_format],
+        headers={"Content-Disposition": f'attachment; filename="{get_export_filename("customers", file_format)}"'}
+    )
+
+
 @router.get("/{customer_id}", response_model=CustomerResponse)
 async def get_customer(
     customer_id: int,
@@ -144,6 +270,7 @@ async def get_customer(
         return CustomerResponse(
             id=customer.id,
             user_id=customer.user_id,
+            contact_id=customer.contact_id,
             name=customer.name,
             email=customer.email,
             company=customer.company,
@@ -188,6 +315,7 @@ async def update_customer(
         return CustomerResponse(
             id=customer.id,
             user_id=customer.user_id,
+            contact_id=customer.contact_id,
             name=customer.name,
             email=customer.email,
             company=customer.company,
@@ -202,6 +330,11 @@ async def update_customer(
         
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -232,6 +365,7 @@ async def update_customer_progress(
         return CustomerResponse(
             id=customer.id,
             user_id=customer.user_id,
+            contact_id=customer.contact_id,
             name=customer.name,
             email=customer.email,
             company=customer.company,
@@ -262,6 +396,8 @@ async def update_email_count(
 ):
     """
     更新客户邮件计数
+    
+    邮件同步时会根据往来邮件自动累加邮件计数和最近沟通时间，此接口用于手动校正
     """
     try:
         customer_service = CustomerService(db)
@@ -276,6 +412,7 @@ async def update_email_count(
         return CustomerResponse(
             id=customer.id,
             user_id=customer.user_id,
+            contact_id=customer.contact_id,
             name=customer.name,
             email=customer.email,
             company=customer.company,
@@ -329,16 +466,26 @@ async def delete_customer(
 
 @router.get("/statistics/overview")
 async def get_customer_statistics(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: MockUser = Depends(get_current_user)
 ):
     """
     获取客户统计信息
+    
+    响应带ETag，客户数据未变化时带If-None-Match的请求返回304
     """
     try:
+        etag = make_etag("customer-statistics", current_user.id, change_version(db, current_user.id, "customers"))
+        unchanged = not_modified(request, etag, settings.cache_control_customer_statistics)
+        if unchanged:
+            return unchanged
+        
         customer_service = CustomerService(db)
         statistics = customer_service.get_customer_statistics(current_user.id)
         
+        response.headers.update(cache_headers(etag, settings.cache_control_customer_statistics))
         return {
             "success": True,
             "statistics": statistics
@@ -3,16 +3,22 @@
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import math
 
 from ..core.database import get_db
+from ..core.hashing import HashingBusyError
+from ..core.responses import FastJSONResponse, response_rows
 from ..models.email_account import (
     EmailAccountCreate, EmailAccountUpdate, EmailAccountResponse, EmailAccountListResponse,
-    EmailAccountTestResponse, EmailSendRequest, EmailSendResponse, ConnectionStatus
+    EmailAccountTestResponse, EmailSendRequest, EmailSendResponse,
+    EmailBatchSendRequest, EmailBatchSendResponse, ConnectionStatus
 )
+from ..models.email_sync import EmailSyncResponse
 from ..services.email_account_service import EmailAccountService
+from ..services.email_sync_service import EmailSyncService
 from ..routers.overseas import MockUser, get_current_user
 
 router = APIRouter(prefix="/email-accounts", tags=["email-account-management"])
@@ -42,38 +48,21 @@ async def get_email_accounts(
             is_active=is_active
         )
         
-        # 转换为响应模型
-        account_responses = [
-            EmailAccountResponse(
-                id=account.id,
-                user_id=account.user_id,
-                email_address=account.email_address,
-                smtp_server=account.smtp_server,
-                smtp_port=account.smtp_port,
-                imap_server=account.imap_server,
-                imap_port=account.imap_port,
-                is_ssl=account.is_ssl,
-                is_active=account.is_active,
-                connection_status=account.connection_status,
-                last_connection_test=account.last_connection_test,
-                created_at=account.created_at,
-                updated_at=account.updated_at
-            )
-            for account in accounts
-        ]
+        # 直接按响应字段构建数据，跳过Pydantic模型的逐个构建和二次校验
+        account_rows = response_rows(EmailAccountResponse, accounts)
         
         # 计算总页数
         total_pages = math.ceil(total / page_size) if total > 0 else 1
         
-        return EmailAccountListResponse(
-            success=True,
-            email_accounts=account_responses,
-            total=total,
-            page=page,
-            page_size=page_size,
-            total_pages=total_pages
-        )
-        
+        return FastJSONResponse({
+            "success": True,
+            "email_accounts": account_rows,
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "total_pages": total_pages
+        })
+    
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -94,7 +83,9 @@ async def create_email_account(
     """
     try:
         email_account_service = EmailAccountService(db)
-        account = email_account_service.create_email_account(account_data, current_user.id)
+        # 密码在哈希线程池中加密，不阻塞事件循环
+        encrypted_password = await email_account_service.encrypt_password(account_data.email_password)
+        account = email_account_service.create_email_account(account_data, current_user.id, encrypted_password)
         
         return EmailAccountResponse(
             id=account.id,
@@ -112,6 +103,11 @@ async def create_email_account(
             updated_at=account.updated_at
         )
         
+    except HashingBusyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -180,7 +176,10 @@ async def update_email_account(
     """
     try:
         email_account_service = EmailAccountService(db)
-        account = email_account_service.update_email_account(account_id, account_data, current_user.id)
+        encrypted_password = None
+        if account_data.email_password is not None:
+            encrypted_password = await email_account_service.encrypt_password(account_data.email_password)
+        account = email_account_service.update_email_account(account_id, account_data, current_user.id, encrypted_password)
         
         if not account:
             raise HTTPException(
@@ -206,6 +205,11 @@ async def update_email_account(
         
     except HTTPException:
         raise
+    except HashingBusyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -284,7 +288,7 @@ async def send_email(
         send_request.email_account_id = account_id
         
         email_account_service = EmailAccountService(db)
-        result = email_account_service.send_email(send_request, current_user.id)
+        result = await email_account_service.send_email(send_request, current_user.id)
         
         return result
         
@@ -295,6 +299,62 @@ async def send_email(
         )
 
 
+@router.post("/{account_id}/send-batch", response_model=EmailBatchSendResponse)
+async def send_batch_emails(
+    account_id: int,
+    batch_request: EmailBatchSendRequest,
+    db: Session = Depends(get_db),
+    current_user: MockUser = Depends(get_current_user)
+):
+    """
+    批量发送邮件
+    
+    多封（如个性化）邮件复用同一个SMTP会话发送，服务器支持时使用PIPELINING，
+    返回每封邮件的发送结果和Message-ID
+    """
+    try:
+        # 确保account_id与请求中的一致
+        batch_request.email_account_id = account_id
+        
+        email_account_service = EmailAccountService(db)
+        # 批量发送期间会按限流等待，在线程池中执行，不阻塞事件循环
+        result = await run_in_threadpool(email_account_service.send_batch_emails, batch_request, current_user.id)
+        
+        return result
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"批量发送邮件失败: {str(e)}"
+        )
+
+
+@router.post("/{account_id}/sync", response_model=EmailSyncResponse)
+async def sync_emails(
+    account_id: int,
+    folder: str = Query("INBOX", description="IMAP文件夹"),
+    db: Session = Depends(get_db),
+    current_user: MockUser = Depends(get_current_user)
+):
+    """
+    增量同步邮件
+    
+    只获取上次同步之后的新邮件（按UID），文件夹UIDVALIDITY变化时自动从头重新同步
+    """
+    try:
+        email_sync_service = EmailSyncService(db)
+        # IMAP往返和逐批提交在线程池中执行，不阻塞事件循环
+        result = await run_in_threadpool(email_sync_service.sync_folder, account_id, current_user.id, folder)
+        
+        return result
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"同步邮件失败: {str(e)}"
+        )
+
+
 @router.get("/statistics/overview")
 async def get_email_account_statistics(
     db: Session = Depends(get_db),
@@ -319,6 +379,58 @@ async def get_email_account_statistics(
         )
 
 
+@router.get("/rate-limits/status")
+async def get_send_rate_limit_status(
+    db: Session = Depends(get_db),
+    current_user: MockUser = Depends(get_current_user)
+):
+    """
+    获取邮件发送限流状态
+    
+    返回每个邮箱账户和收件人域名的令牌桶状态，用于监控
+    """
+    try:
+        email_account_service = EmailAccountService(db)
+        rate_limits = email_account_service.get_rate_limit_status(current_user.id)
+        
+        return {
+            "success": True,
+            "rate_limits": rate_limits
+        }
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取发送限流状态失败: {str(e)}"
+        )
+
+
+@router.get("/idle-watchers/status")
+async def get_idle_watcher_status(
+    db: Session = Depends(get_db),
+    current_user: MockUser = Depends(get_current_user)
+):
+    """
+    获取IMAP IDLE推送监听状态
+    
+    返回每个邮箱账户的监听连接状态、最近新邮件事件时间和错误信息
+    """
+    try:
+        email_account_service = EmailAccountService(db)
+        idle_status = email_account_service.get_idle_status(current_user.id)
+        
+        return {
+            "success": True,
+            "idle_watchers": idle_status
+        }
+        
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取邮件监听状态失败: {str(e)}"
+        )
+
+
 @router.post("/263/create", response_model=EmailAccountResponse)
 async def create_263_email_account(
     email_address: str = Query(..., description="263邮箱地址"),
@@ -348,7 +460,9 @@ async def create_263_email_account(
             is_ssl=config["is_ssl"]
         )
         email_account_service = EmailAccountService(db)
-        account = email_account_service.create_email_account(account_data, current_user.id)
+        # 密码在哈希线程池中加密，不阻塞事件循环
+        encrypted_password = await email_account_service.encrypt_password(account_data.email_password)
+        account = email_account_service.create_email_account(account_data, current_user.id, encrypted_password)
         
         return EmailAccountResponse(
             id=account.id,
@@ -366,6 +480,11 @@ async def create_263_email_account(
             updated_at=account.updated_at
         )
         
+    except HashingBusyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
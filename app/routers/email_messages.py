@@ -0,0 +1,168 @@
+"""
+邮件往来记录API路由
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from typing import Optional
+import math
+
+from ..core.config import settings
+from ..core.database import get_db
+from ..core.storage import object_storage
+from ..models.email_message import (
+    EmailMessageResponse, EmailMessageListResponse, EmailMessageDetailResponse,
+    EmailAttachmentResponse, MessageDirection
+)
+from ..services.email_message_service import EmailMessageService
+from ..services.email_sync_service import EmailSyncService
+from ..routers.overseas import MockUser, get_current_user
+
+router = APIRouter(prefix="/email-messages", tags=["email-message-management"])
+
+
+@router.get("/", response_model=EmailMessageListResponse)
+async def get_email_messages(
+    page: int = Query(1, ge=1, description="页码"),
+    page_size: int = Query(20, ge=1, le=100, description="每页数量"),
+    email_account_id: Optional[int] = Query(None, description="邮箱账户ID筛选"),
+    counterpart: Optional[str] = Query(None, description="往来对方邮箱地址"),
+    direction: Optional[MessageDirection] = Query(None, description="邮件方向筛选（received/sent）"),
+    start_date: Optional[str] = Query(None, description="邮件开始时间（ISO格式，如：2025-01-01T00:00:00Z）"),
+    end_date: Optional[str] = Query(None, description="邮件结束时间（ISO格式，如：2025-12-31T23:59:59Z）"),
+    db: Session = Depends(get_db),
+    current_user: MockUser = Depends(get_current_user)
+):
+    """
+    获取邮件往来记录
+    
+    查询已同步保存的邮件头，无需访问IMAP服务器
+    - 支持按邮箱账户、往来对方、邮件方向和时间筛选
+    - 按邮件时间倒序排序
+    """
+    try:
+        email_message_service = EmailMessageService(db)
+        
+        messages, total = email_message_service.get_messages(
+            user_id=current_user.id,
+            page=page,
+            page_size=page_size,
+            email_account_id=email_account_id,
+            counterpart=counterpart,
+            direction=direction,
+            start_date=start_date,
+            end_date=end_date
+        )
+        
+        # 转换为响应模型
+        message_responses = [
+            EmailMessageResponse(
+                id=message.id,
+                email_account_id=message.email_account_id,
+                folder=message.folder,
+                uid=message.uid,
+                message_id=message.message_id,
+                in_reply_to=message.in_reply_to,
+                subject=message.subject,
+                from_name=message.from_name,
+                from_address=message.from_address,
+                to_addresses=message.to_addresses.split(",") if message.to_addresses else [],
+                cc_addresses=message.cc_addresses.split(",") if message.cc_addresses else [],
+                direction=message.direction,
+                counterpart_address=message.counterpart_address,
+                sent_at=message.sent_at,
+                size=message.size
+            )
+            for message in messages
+        ]
+        
+        # 计算总页数
+        total_pages = math.ceil(total / page_size) if total > 0 else 1
+        
+        return EmailMessageListResponse(
+            success=True,
+            messages=message_responses,
+            total=total,
+            page=page,
+            page_size=page_size,
+            total_pages=total_pages
+        )
+    
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取邮件往来记录失败: {str(e)}"
+        )
+
+
+@router.get("/{message_id}", response_model=EmailMessageDetailResponse)
+async def get_email_message(
+    message_id: int,
+    fetch_body: bool = Query(True, description="正文尚未获取时是否从IMAP服务器获取"),
+    db: Session = Depends(get_db),
+    current_user: MockUser = Depends(get_current_user)
+):
+    """
+    获取邮件详情（含正文和附件）
+    
+    - 正文首次访问时从IMAP服务器分段读取并流式解析，之后直接从数据库返回
+    - 附件保存在对象存储中，返回临时下载链接
+    """
+    try:
+        if fetch_body:
+            # 从IMAP读取正文、解析和上传附件在线程池中执行，不阻塞事件循环
+            message = await run_in_threadpool(EmailSyncService(db).fetch_message_body, message_id, current_user.id)
+        else:
+            message = EmailMessageService(db).get_message(message_id, current_user.id)
+        
+        if not message:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="邮件不存在"
+            )
+        
+        attachments = [
+            EmailAttachmentResponse(
+                id=attachment.id,
+                filename=attachment.filename,
+                content_type=attachment.content_type,
+                content_id=attachment.content_id,
+                size=attachment.size,
+                download_url=object_storage.get_download_url(
+                    attachment.storage_key, settings.email_attachment_url_expires
+                )
+            )
+            for attachment in message.attachments
+        ]
+        
+        return EmailMessageDetailResponse(
+            id=message.id,
+            email_account_id=message.email_account_id,
+            folder=message.folder,
+            uid=message.uid,
+            message_id=message.message_id,
+            in_reply_to=message.in_reply_to,
+            subject=message.subject,
+            from_name=message.from_name,
+            from_address=message.from_address,
+            to_addresses=message.to_addresses.split(",") if message.to_addresses else [],
+            cc_addresses=message.cc_addresses.split(",") if message.cc_addresses else [],
+            direction=message.direction,
+            counterpart_address=message.counterpart_address,
+            sent_at=message.sent_at,
+            size=message.size,
+            body_text=message.body_text,
+            body_html=message.body_html,
+            body_truncated=message.body_truncated or False,
+            body_fetched_at=message.body_fetched_at,
+            attachments=attachments
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取邮件详情失败: {str(e)}"
+        )
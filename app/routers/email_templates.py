@@ -2,12 +2,14 @@
 邮件模板管理API路由
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 import math
 
-from ..core.database import get_db
+from ..core.config import settings
+from ..core.database import get_db, change_version
+from ..core.responses import FastJSONResponse, response_rows, make_etag, cache_headers, not_modified
 from ..models.email_template import (
     EmailTemplateCreate, EmailTemplateUpdate, EmailTemplateResponse, 
     EmailTemplateListResponse, EmailTemplateRenderRequest, EmailTemplateRenderResponse,
@@ -45,31 +47,21 @@ async def get_email_templates(
             search_query=search
         )
         
-        # 转换为响应模型
-        template_responses = [
-            EmailTemplateResponse(
-                id=template.id,
-                user_id=template.user_id,
-                title=template.title,
-                content=template.content,
-                created_at=template.created_at,
-                updated_at=template.updated_at
-            )
-            for template in templates
-        ]
+        # 直接按响应字段构建数据，跳过Pydantic模型的逐个构建和二次校验
+        template_rows = response_rows(EmailTemplateResponse, templates)
         
         # 计算总页数
         total_pages = math.ceil(total / page_size) if total > 0 else 1
         
-        return EmailTemplateListResponse(
-            success=True,
-            templates=template_responses,
-            total=total,
-            page=page,
-            page_size=page_size,
-            total_pages=total_pages
-        )
-        
+        return FastJSONResponse({
+            "success": True,
+            "templates": template_rows,
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "total_pages": total_pages
+        })
+    
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -111,13 +103,25 @@ async def create_email_template(
 @router.get("/{template_id}", response_model=EmailTemplateResponse)
 async def get_email_template(
     template_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: MockUser = Depends(get_current_user)
 ):
     """
     获取单个邮件模板详情
+    
+    响应带ETag，模板未变化时带If-None-Match的请求返回304
     """
     try:
+        etag = make_etag(
+            "email-template", current_user.id, template_id,
+            change_version(db, current_user.id, "email_templates")
+        )
+        unchanged = not_modified(request, etag, settings.cache_control_email_template)
+        if unchanged:
+            return unchanged
+        
         template_service = EmailTemplateService(db)
         template = template_service.get_template(template_id, current_user.id)
         
@@ -127,6 +131,7 @@ async def get_email_template(
                 detail="邮件模板不存在"
             )
         
+        response.headers.update(cache_headers(etag, settings.cache_control_email_template))
         return EmailTemplateResponse(
             id=template.id,
             user_id=template.user_id,
@@ -3,9 +3,14 @@
 """
 
 from .contact_service import ContactService
+from .contact_import_service import ContactImportService
+from .contact_dedup_service import ContactDedupService
 from .tag_service import TagService
+from .tag_reindex_service import TagReindexer
 from .email_template_service import EmailTemplateService
 from .customer_service import CustomerService
 from .email_account_service import EmailAccountService
+from .email_sync_service import EmailSyncService
+from .email_message_service import EmailMessageService
 
-__all__ = ["ContactService", "TagService", "EmailTemplateService", "CustomerService", "EmailAccountService"]
+__all__ = ["ContactService", "ContactImportService", "ContactDedupService", "TagService", "TagReindexer", "EmailTemplateService", "CustomerService", "EmailAccountService", "EmailSyncService", "EmailMessageService"]
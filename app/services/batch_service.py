@@ -0,0 +1,227 @@
+"""
+批量操作服务层
+在一个事务内用批量SQL执行创建/更新/删除，逐项返回结果
+"""
+
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, delete, select, update, func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from pydantic import BaseModel, ValidationError
+from typing import List, Optional, Dict, Any, Callable, Iterable, Tuple, Type
+from datetime import datetime
+import logging
+
+from ..models.batch import BatchOperation, BatchOperationItem, BatchItemResult, BatchResponse
+
+logger = logging.getLogger(__name__)
+
+
+def format_validation_error(error: ValidationError) -> str:
+    """将校验错误转换为一行说明"""
+    return "; ".join(
+        f"{'.'.join(str(loc) for loc in item['loc']) or 'data'}: {item['msg']}" for item in error.errors()
+    )
+
+
+def upsert_by_email(
+    db: Session,
+    model,
+    user_id: int,
+    records: List[Dict[str, Any]],
+    update_existing: bool = True,
+    update_fields: Optional[List[Iterable[str]]] = None
+) -> Dict[str, Tuple[int, bool]]:
+    """
+    按(user_id, lower(email))批量新建或更新记录（不提交事务）
+    
+    依赖模型上(user_id, lower(email))的唯一索引，用INSERT ... ON CONFLICT完成，不需要先查询已有记录，
+    并发写入同一邮箱也不会产生重复记录。同一批中重复的邮箱只保留第一条。
+    
+    Args:
+        db: 数据库会话
+        model: ORM模型（需有id、user_id、email、updated_at列）
+        user_id: 用户ID
+        records: INSERT字段（不含user_id，各条字段相同）
+        update_existing: 已存在时是否用新数据更新，否则保持不变
+        update_fields: 与records一一对应，已存在时各条记录更新的字段（如请求中提交的字段），
+                       未提交的字段保留原值；为None时更新全部INSERT字段。更新字段相同的记录共用一条语句
+    
+    Returns:
+        {小写邮箱: (记录ID, 是否新建)}，不更新时已存在的记录不在结果中
+    """
+    if update_fields is None:
+        update_fields = [record.keys() for record in records]
+    unique_records: Dict[str, Tuple[Dict[str, Any], frozenset]] = {}
+    for record, fields in zip(records, update_fields):
+        unique_records.setdefault(
+            record["email"].lower(), (dict(record, user_id=user_id), frozenset(fields).intersection(record))
+        )
+    if not unique_records:
+        return {}
+    
+    groups: Dict[frozenset, List[Dict[str, Any]]] = {}
+    for record, fields in unique_records.values():
+        groups.setdefault(fields if update_existing else frozenset(), []).append(record)
+    
+    written = {}
+    conflict_target = [model.user_id, text("lower(email)")]
+    for fields, group in groups.items():
+        stmt = pg_insert(model)
+        if update_existing:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=conflict_target,
+                set_=dict({field: stmt.excluded[field] for field in sorted(fields)}, updated_at=func.now())
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=conflict_target)
+        
+        # 新插入的行updated_at为空，冲突后更新的行updated_at为now()
+        # （不用xmax判断：分区表的RETURNING不能读取系统列）
+        rows = db.execute(
+            stmt.returning(model.id, func.lower(model.email), model.updated_at.is_(None)),
+            group
+        ).all()
+        written.update((email, (record_id, inserted)) for record_id, email, inserted in rows)
+    return written
+
+
+def execute_batch(
+    db: Session,
+    model,
+    user_id: int,
+    operations: List[BatchOperationItem],
+    create_schema: Type[BaseModel],
+    update_schema: Type[BaseModel],
+    to_create_record: Callable[[BaseModel], Dict[str, Any]],
+    to_update_values: Callable[[BaseModel], Dict[str, Any]],
+    before_delete: Optional[Callable[[List[int]], None]] = None,
+    after_write: Optional[Callable[[List[Tuple[int, BaseModel]]], None]] = None
+) -> BatchResponse:
+    """
+    执行批量操作
+    
+    先逐项校验（数据格式、记录是否存在、同一记录是否重复操作），校验失败的项单独报告；
+    其余操作按类型合并为多行INSERT ... ON CONFLICT DO NOTHING（邮箱已存在的创建项单独报告失败）、
+    按主键的批量UPDATE和一条DELETE，在同一事务中执行。
+    批量SQL执行失败时整个事务回滚，所有项报告失败。
+    
+    Args:
+        db: 数据库会话
+        model: ORM模型（需有id、user_id、email、updated_at列，以及(user_id, lower(email))唯一索引）
+        user_id: 用户ID
+        operations: 操作列表
+        create_schema: 创建数据的Pydantic模型
+        update_schema: 更新数据的Pydantic模型
+        to_create_record: 将创建数据转换为INSERT字段（不含user_id）
+        to_update_values: 将更新数据转换为UPDATE字段
+        before_delete: 删除前的处理（如删除关联记录），在同一事务中执行
+        after_write: 创建/更新后的处理，参数为[(记录ID, 校验后的数据)]（如写入关联记录），在同一事务中执行
+    """
+    results: List[Optional[BatchItemResult]] = [None] * len(operations)
+    
+    def fail(index: int, message: str):
+        results[index] = BatchItemResult(
+            index=index, op=operations[index].op, success=False, id=operations[index].id, error_message=message
+        )
+    
+    # 逐项校验
+    creates, updates, deletes = [], [], []  # [(index, 数据或ID)]
+    validated: Dict[int, BaseModel] = {}  # index -> 校验后的创建/更新数据
+    seen_ids = set()
+    for index, item in enumerate(operations):
+        if item.op != BatchOperation.CREATE:
+            if item.id is None:
+                fail(index, "缺少记录ID")
+                continue
+            if item.id in seen_ids:
+                fail(index, "同一记录在批量操作中重复出现")
+                continue
+            seen_ids.add(item.id)
+        try:
+            if item.op == BatchOperation.CREATE:
+                validated[index] = create_schema(**(item.data or {}))
+                creates.append((index, to_create_record(validated[index])))
+            elif item.op == BatchOperation.UPDATE:
+                validated[index] = update_schema(**(item.data or {}))
+                updates.append((index, to_update_values(validated[index])))
+            else:
+                deletes.append((index, item.id))
+        except ValidationError as e:
+            fail(index, format_validation_error(e))
+    
+    # 一次查询确认更新/删除的记录存在且属于当前用户
+    target_ids = [operations[index].id for index, _ in updates] + [record_id for _, record_id in deletes]
+    existing_ids = set()
+    if target_ids:
+        existing_ids = set(db.execute(
+            select(model.id).where(and_(model.user_id == user_id, model.id.in_(target_ids)))
+        ).scalars())
+    for pending in (updates, deletes):
+        for index, _ in [entry for entry in pending if operations[entry[0]].id not in existing_ids]:
+            fail(index, "记录不存在")
+        pending[:] = [entry for entry in pending if operations[entry[0]].id in existing_ids]
+    
+    error_message = None
+    try:
+        # 邮箱已存在（或与同一批中前面的创建项重复）的创建项单独报告失败，不影响其他操作
+        written = upsert_by_email(db, model, user_id, [record for _, record in creates], update_existing=False)
+        created = []  # [(index, 记录ID)]
+        for index, record in creates:
+            entry = written.pop(record["email"].lower(), None)
+            if entry is None:
+                fail(index, "该邮箱已存在")
+            else:
+                created.append((index, entry[0]))
+        
+        now = datetime.now()
+        # 按主键批量更新，字段相同的行合并为一条executemany；WHERE带上user_id，
+        # 语句本身限定在当前用户范围内（变更计数也据此只记到该用户）
+        update_rows = [
+            dict(values, id=operations[index].id, updated_at=now) for index, values in updates if values
+        ]
+        if update_rows:
+            db.execute(
+                update(model).where(model.user_id == user_id), update_rows,
+                execution_options={"synchronize_session": None}
+            )
+        
+        if after_write and (created or updates):
+            after_write(
+                [(record_id, validated[index]) for index, record_id in created]
+                + [(operations[index].id, validated[index]) for index, _ in updates]
+            )
+        
+        delete_ids = [record_id for _, record_id in deletes]
+        if delete_ids:
+            if before_delete:
+                before_delete(delete_ids)
+            db.execute(
+                delete(model).where(and_(model.user_id == user_id, model.id.in_(delete_ids))),
+                execution_options={"synchronize_session": False}
+            )
+        
+        db.commit()
+        
+        for index, record_id in created:
+            results[index] = BatchItemResult(index=index, op=BatchOperation.CREATE, success=True, id=record_id)
+        for index, _ in updates + deletes:
+            results[index] = BatchItemResult(
+                index=index, op=operations[index].op, success=True, id=operations[index].id
+            )
+    
+    except Exception as e:
+        db.rollback()
+        error_message = f"批量操作执行失败，已全部回滚: {str(e)}"
+        logger.error(error_message)
+        for index, _ in creates + updates + deletes:
+            fail(index, error_message)
+    
+    succeeded = sum(1 for result in results if result.success)
+    return BatchResponse(
+        success=succeeded == len(operations),
+        total=len(operations),
+        succeeded=succeeded,
+        failed=len(operations) - succeeded,
+        results=results,
+        error_message=error_message
+    )
@@ -0,0 +1,380 @@
+"""
+联系人去重服务层
+按规范化的键分桶（邮箱、域名+姓名读音、公司+姓名读音）找出候选联系人对再打分，避免全量两两比较；
+合并用集合SQL在一个事务中完成
+"""
+
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, select, delete, update, func, bindparam, Integer, String
+from sqlalchemy.dialects.postgresql import ARRAY, aggregate_order_by, insert as pg_insert
+from typing import List, Optional, Dict, Tuple, Iterable
+from difflib import SequenceMatcher
+import unicodedata
+import logging
+import re
+
+from ..core.config import settings
+from ..core.database import primary_reads, replica_reads
+from ..models.contact import (
+    Contact, DuplicateContact, DuplicateGroup, DuplicateListResponse, ContactMergeGroup,
+    contact_tag_association, parse_legacy_tags
+)
+from ..models.customer import Customer
+from .contact_service import ContactService
+
+logger = logging.getLogger(__name__)
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+# 公司名末尾的组织形式后缀，比较前去掉
+COMPANY_SUFFIXES = {
+    "inc", "incorporated", "corp", "corporation", "co", "company", "ltd", "limited", "llc", "llp", "plc",
+    "gmbh", "ag", "sa", "sas", "srl", "spa", "bv", "nv", "oy", "ab", "as", "kk", "pte", "pty", "group",
+    "有限公司", "有限责任公司", "股份有限公司", "集团", "公司",
+}
+
+# 公共邮箱域名不代表公司，不用于分桶和打分
+FREE_EMAIL_DOMAINS = {
+    "gmail.com", "googlemail.com", "yahoo.com", "hotmail.com", "outlook.com", "live.com", "msn.com",
+    "icloud.com", "me.com", "aol.com", "protonmail.com", "gmx.com", "mail.ru", "yandex.ru",
+    "qq.com", "163.com", "126.com", "sina.com", "sohu.com", "foxmail.com",
+}
+
+# 合并时用重复联系人补全保留联系人的空字段
+MERGE_FILL_FIELDS = ("first_name", "last_name", "domain", "position")
+
+_SOUNDEX_CODES = {
+    **dict.fromkeys("BFPV", "1"), **dict.fromkeys("CGJKQSXZ", "2"), **dict.fromkeys("DT", "3"),
+    "L": "4", **dict.fromkeys("MN", "5"), "R": "6",
+}
+
+
+def normalize_text(value: Optional[str]) -> str:
+    """去掉重音符号和标点，转小写并合并空白"""
+    if not value:
+        return ""
+    value = "".join(ch for ch in unicodedata.normalize("NFKD", value) if not unicodedata.combining(ch))
+    return " ".join(_NON_WORD.sub(" ", value.lower()).split())
+
+
+def normalize_company(company: Optional[str]) -> str:
+    """规范化公司名（去掉末尾的组织形式后缀）"""
+    words = normalize_text(company).split()
+    while len(words) > 1 and words[-1] in COMPANY_SUFFIXES:
+        words.pop()
+    return " ".join(words)
+
+
+def normalize_domain(domain: Optional[str], email: Optional[str]) -> str:
+    """公司域名，未填写时取邮箱域名；公共邮箱域名返回空字符串"""
+    domain = (domain or "").strip().lower()
+    domain = re.sub(r"^(https?://)?(www\.)?", "", domain).split("/")[0]
+    if not domain and email and "@" in email:
+        domain = email.rsplit("@", 1)[1].strip().lower()
+    return "" if domain in FREE_EMAIL_DOMAINS else domain
+
+
+def soundex(word: str) -> str:
+    """英文单词的Soundex读音编码，非拉丁字母返回空字符串"""
+    word = "".join(ch for ch in word.upper() if "A" <= ch <= "Z")
+    if not word:
+        return ""
+    result, last = word[0], _SOUNDEX_CODES.get(word[0], "")
+    for ch in word[1:]:
+        code = _SOUNDEX_CODES.get(ch, "")
+        if code and code != last:
+            result += code
+        if ch not in "HW":
+            last = code
+    return (result + "000")[:4]
+
+
+def phonetic_key(name: str) -> str:
+    """姓名读音键：逐词取Soundex（非拉丁字母保留原词），排序后与姓名顺序无关"""
+    return " ".join(sorted(soundex(word) or word for word in name.split()))
+
+
+class _Candidate:
+    """参与去重比较的联系人（只保存规范化后的键）"""
+    
+    __slots__ = ("id", "name", "email", "company", "raw_domain", "name_key", "sorted_name",
+                 "company_key", "domain_key", "completeness")
+    
+    def __init__(self, row):
+        self.id = row.id
+        self.name = row.name
+        self.email = (row.email or "").strip().lower()
+        self.company = row.company
+        self.raw_domain = row.domain
+        self.name_key = normalize_text(row.name)
+        self.sorted_name = " ".join(sorted(self.name_key.split()))
+        self.company_key = normalize_company(row.company)
+        self.domain_key = normalize_domain(row.domain, row.email)
+        self.completeness = sum(1 for field in MERGE_FILL_FIELDS if getattr(row, field))
+    
+    def block_keys(self) -> Iterable[tuple]:
+        phonetic = phonetic_key(self.name_key)
+        if self.domain_key and phonetic:
+            yield ("domain", self.domain_key, phonetic)
+        if self.company_key and phonetic:
+            yield ("company", self.company_key, phonetic)
+
+
+def score_pair(a: _Candidate, b: _Candidate) -> Tuple[float, List[str]]:
+    """
+    两个联系人的相似度
+    
+    邮箱相同为1；否则按姓名（60%）、公司（30%）、域名（10%）加权，最高0.99
+    """
+    if a.email and a.email == b.email:
+        return 1.0, ["email"]
+    
+    name_score = max(
+        SequenceMatcher(None, a.name_key, b.name_key).ratio(),
+        SequenceMatcher(None, a.sorted_name, b.sorted_name).ratio()
+    )
+    company_score = 1.0 if a.company_key == b.company_key else SequenceMatcher(None, a.company_key, b.company_key).ratio()
+    domain_match = bool(a.domain_key) and a.domain_key == b.domain_key
+    
+    reasons = []
+    if name_score >= 0.85:
+        reasons.append("name")
+    if company_score >= 0.9:
+        reasons.append("company")
+    if domain_match:
+        reasons.append("domain")
+    score = 0.6 * name_score + 0.3 * company_score + (0.1 if domain_match else 0.0)
+    return round(min(score, 0.99), 3), reasons
+
+
+class ContactDedupService:
+    """联系人去重服务类"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def _load_candidates(self, user_id: int) -> List[_Candidate]:
+        stmt = select(
+            Contact.id, Contact.name, Contact.email, Contact.company, Contact.domain,
+            Contact.first_name, Contact.last_name, Contact.position
+        ).where(Contact.user_id == user_id).order_by(Contact.id).execution_options(yield_per=settings.export_batch_size)
+        return [_Candidate(row) for row in self.db.execute(stmt)]
+    
+    @replica_reads
+    def find_duplicates(self, user_id: int, min_score: Optional[float] = None,
+                        limit: Optional[int] = None) -> DuplicateListResponse:
+        """
+        查找重复联系人
+        
+        邮箱相同的联系人直接归为一组；其余只在同一分桶（域名+姓名读音、公司+姓名读音）内两两打分，
+        超过contact_dedup_max_block_size的分桶跳过。相似度不低于min_score的联系人对按连通关系分组。
+        """
+        min_score = settings.contact_dedup_min_score if min_score is None else min_score
+        candidates = self._load_candidates(user_id)
+        by_id = {candidate.id: candidate for candidate in candidates}
+        
+        parent: Dict[int, int] = {}
+        
+        def find(contact_id: int) -> int:
+            root = contact_id
+            while parent.get(root, root) != root:
+                root = parent[root]
+            while contact_id != root:
+                parent[contact_id], contact_id = root, parent.get(contact_id, contact_id)
+            return root
+        
+        def union(a: int, b: int):
+            root_a, root_b = find(a), find(b)
+            if root_a != root_b:
+                parent[max(root_a, root_b)] = min(root_a, root_b)
+        
+        # 邮箱相同：不需要逐对比较
+        first_by_email: Dict[str, int] = {}
+        for candidate in candidates:
+            if candidate.email:
+                union(first_by_email.setdefault(candidate.email, candidate.id), candidate.id)
+        
+        blocks: Dict[tuple, List[int]] = {}
+        for candidate in candidates:
+            for key in candidate.block_keys():
+                blocks.setdefault(key, []).append(candidate.id)
+        
+        compared = set()
+        for key, ids in blocks.items():
+            if len(ids) < 2:
+                continue
+            if len(ids) > settings.contact_dedup_max_block_size:
+                logger.info(f"去重分桶过大已跳过: {key[0]}={key[1]} ({len(ids)}个联系人)")
+                continue
+            for i, a in enumerate(ids):
+                for b in ids[i + 1:]:
+                    if (a, b) in compared or find(a) == find(b):
+                        continue
+                    compared.add((a, b))
+                    if score_pair(by_id[a], by_id[b])[0] >= min_score:
+                        union(a, b)
+        
+        members: Dict[int, List[_Candidate]] = {}
+        for candidate in candidates:
+            members.setdefault(find(candidate.id), []).append(candidate)
+        
+        groups = []
+        for group in members.values():
+            if len(group) < 2:
+                continue
+            # 信息最完整的保留，相同时保留最早创建的
+            primary = min(group, key=lambda candidate: (-candidate.completeness, candidate.id))
+            contacts = []
+            for candidate in sorted(group, key=lambda candidate: (candidate.id != primary.id, candidate.id)):
+                score, reasons = (1.0, []) if candidate is primary else score_pair(primary, candidate)
+                contacts.append(DuplicateContact(
+                    id=candidate.id, name=candidate.name, email=candidate.email, company=candidate.company,
+                    domain=candidate.raw_domain, score=score, reasons=reasons
+                ))
+            groups.append(DuplicateGroup(
+                primary_id=primary.id,
+                score=min(contact.score for contact in contacts[1:]),
+                contacts=contacts
+            ))
+        
+        groups.sort(key=lambda group: (-group.score, -len(group.contacts), group.primary_id))
+        return DuplicateListResponse(
+            success=True,
+            scanned_contacts=len(candidates),
+            compared_pairs=len(compared),
+            groups=groups[:limit] if limit else groups
+        )
+    
+    def merge_contacts(self, user_id: int, groups: List[ContactMergeGroup]) -> Tuple[int, int]:
+        """
+        合并联系人
+        
+        在一个事务中用集合SQL完成：补全保留联系人的空字段、把重复联系人的标签和转换来的客户转移到保留联系人、删除重复联系人
+        
+        Returns:
+            (合并的分组数, 删除的联系人数)
+        
+        Raises:
+            ValueError: 分组有误或联系人不存在
+        """
+        pairs = [(duplicate_id, group.primary_id) for group in groups for duplicate_id in group.duplicate_ids]
+        if not pairs:
+            return 0, 0
+        
+        duplicate_ids = [duplicate_id for duplicate_id, _ in pairs]
+        primary_ids = {group.primary_id for group in groups}
+        all_ids = set(duplicate_ids) | primary_ids
+        if len(set(duplicate_ids)) != len(duplicate_ids) or primary_ids & set(duplicate_ids):
+            raise ValueError("同一联系人不能出现在多个合并分组中，也不能同时作为保留联系人和重复联系人")
+        
+        existing = set(self.db.execute(
+            select(Contact.id).where(and_(Contact.user_id == user_id, Contact.id.in_(all_ids)))
+        ).scalars())
+        missing = sorted(all_ids - existing)
+        if missing:
+            raise ValueError(f"联系人不存在: {', '.join(str(contact_id) for contact_id in missing[:20])}")
+        
+        try:
+            # 先把涉及的旧版标签JSON转换为标签关联，之后只需要处理关联表
+            legacy_rows = self.db.execute(
+                select(Contact.id, Contact.tags).where(
+                    Contact.user_id == user_id, Contact.id.in_(all_ids), Contact.tags.isnot(None)
+                )
+            ).all()
+            if legacy_rows:
+                ContactService(self.db).set_contact_tags(
+                    user_id, [(contact_id, parse_legacy_tags(tags)) for contact_id, tags in legacy_rows]
+                )
+                self.db.execute(
+                    update(Contact)
+                    .where(Contact.user_id == user_id, Contact.id.in_([row.id for row in legacy_rows]))
+                    .values(tags=None),
+                    execution_options={"synchronize_session": False}
+                )
+            
+            mapping = func.unnest(
+                bindparam("duplicate_ids", duplicate_ids, type_=ARRAY(Integer)),
+                bindparam("primary_ids", [primary_id for _, primary_id in pairs], type_=ARRAY(Integer))
+            ).table_valued("duplicate_id", "primary_id").render_derived()
+            
+            # 每个字段取重复联系人中按ID排序的第一个非空值
+            fill_values = select(
+                mapping.c.primary_id,
+                *[
+                    func.array_remove(
+                        func.array_agg(aggregate_order_by(func.nullif(getattr(Contact, field), ""), Contact.id)),
+                        None, type_=ARRAY(String)
+                    )[1].label(field)
+                    for field in MERGE_FILL_FIELDS
+                ]
+            ).select_from(mapping.join(Contact, Contact.id == mapping.c.duplicate_id)).where(
+                Contact.user_id == user_id
+            ).group_by(
+                mapping.c.primary_id
+            ).subquery()
+            self.db.execute(
+                update(Contact)
+                .where(Contact.user_id == user_id, Contact.id == fill_values.c.primary_id)
+                .values(
+                    **{
+                        field: func.coalesce(func.nullif(getattr(Contact, field), ""), fill_values.c[field])
+                        for field in MERGE_FILL_FIELDS
+                    },
+                    updated_at=func.now()
+                )
+                .execution_options(synchronize_session=False)
+            )
+            
+            self.db.execute(
+                pg_insert(contact_tag_association)
+                .from_select(
+                    ["contact_id", "tag_id"],
+                    select(mapping.c.primary_id, contact_tag_association.c.tag_id).select_from(
+                        contact_tag_association.join(mapping, contact_tag_association.c.contact_id == mapping.c.duplicate_id)
+                    )
+                )
+                .on_conflict_do_nothing()
+            )
+            self.db.execute(
+                delete(contact_tag_association).where(contact_tag_association.c.contact_id.in_(duplicate_ids))
+            )
+            # 由重复联系人转换来的客户改为关联保留联系人
+            self.db.execute(
+                update(Customer)
+                .where(Customer.user_id == user_id, Customer.contact_id == mapping.c.duplicate_id)
+                .values(contact_id=mapping.c.primary_id)
+                .execution_options(synchronize_session=False)
+            )
+            deleted = self.db.execute(
+                delete(Contact).where(and_(Contact.user_id == user_id, Contact.id.in_(duplicate_ids))),
+                execution_options={"synchronize_session": False}
+            ).rowcount
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        
+        self.db.expire_all()
+        return len(groups), deleted
+    
+    def merge_detected(self, user_id: int, min_score: Optional[float] = None) -> Tuple[int, int]:
+        """
+        合并自动检测到的重复分组（默认只合并邮箱相同的联系人）
+        
+        分组按连通关系形成，组内成员不一定都与保留联系人相似（A~B、B~C不代表A~C），
+        只合并与保留联系人的相似度不低于min_score的成员，其余成员保留
+        """
+        min_score = settings.contact_dedup_auto_merge_score if min_score is None else min_score
+        # 检测结果直接决定要删除的联系人，必须读主库
+        with primary_reads(self.db):
+            detected = self.find_duplicates(user_id, min_score)
+        groups = []
+        for group in detected.groups:
+            # find_duplicates中成员的score即score_pair(保留联系人, 成员)
+            duplicate_ids = [
+                contact.id for contact in group.contacts
+                if contact.id != group.primary_id and contact.score >= min_score
+            ]
+            if duplicate_ids:
+                groups.append(ContactMergeGroup(primary_id=group.primary_id, duplicate_ids=duplicate_ids))
+        return self.merge_contacts(user_id, groups)
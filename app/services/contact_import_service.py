@@ -0,0 +1,274 @@
+"""
+联系人批量导入服务层
+流式读取CSV/XLSX文件，按批校验（ContactCreate规则）并用多行INSERT ... ON CONFLICT写入，
+导入在后台线程中执行，进度和行错误可随时查询
+"""
+
+from sqlalchemy.orm import Session
+from pydantic import ValidationError
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Dict, Any, Iterator, Tuple, BinaryIO
+from datetime import datetime
+import codecs
+import csv
+import re
+import threading
+import uuid
+import logging
+import os
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..models.contact import (
+    ContactCreate, ContactImportRowError, ContactImportStatus, DuplicateStrategy
+)
+from .contact_service import ContactService
+
+logger = logging.getLogger(__name__)
+
+# 表头别名 -> ContactCreate字段
+COLUMN_ALIASES = {
+    "name": "name", "姓名": "name", "联系人": "name",
+    "first_name": "first_name", "firstname": "first_name", "名字": "first_name",
+    "last_name": "last_name", "lastname": "last_name", "姓氏": "last_name",
+    "email": "email", "e-mail": "email", "邮箱": "email", "电子邮箱": "email",
+    "company": "company", "公司": "company",
+    "domain": "domain", "域名": "domain", "公司域名": "domain",
+    "position": "position", "title": "position", "职位": "position",
+    "tags": "tag_names", "tag_names": "tag_names", "标签": "tag_names",
+}
+
+_TAG_SEPARATORS = re.compile(r"[,;|，；]")
+
+XLSX_CONTENT_TYPES = (
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+)
+XLSX_EXTENSIONS = (".xlsx", ".xlsm")
+
+
+def detect_file_format(file_format: Optional[str], content_type: Optional[str],
+                       filename: Optional[str]) -> str:
+    """
+    根据参数、文件扩展名或Content-Type判断文件格式（csv/xlsx）
+    
+    扩展名优先于Content-Type：Windows浏览器上传.csv时常发送application/vnd.ms-excel
+    （旧版.xls的类型，openpyxl也无法读取），因此该类型不作为xlsx的依据。
+    """
+    if file_format:
+        return file_format.lower()
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in XLSX_EXTENSIONS:
+        return "xlsx"
+    if content_type and content_type.split(";")[0].strip().lower() in XLSX_CONTENT_TYPES:
+        return "xlsx"
+    return "csv"
+
+
+def _normalize_header(value) -> Optional[str]:
+    key = str(value or "").strip().lower().replace(" ", "_")
+    return COLUMN_ALIASES.get(key)
+
+
+def check_csv_encoding(fileobj: BinaryIO, chunk_size: int = 1024 * 1024):
+    """
+    导入前按UTF-8严格解码整个CSV文件，读完后回到文件开头
+    
+    GBK等编码（如Excel默认另存的CSV）按UTF-8解码会变成乱码，整个文件拒绝导入，不写入任何行
+    
+    Raises:
+        ValueError: 文件不是UTF-8编码
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    line = 1
+    while True:
+        chunk = fileobj.read(chunk_size)
+        try:
+            line += decoder.decode(chunk, final=not chunk).count("\n")
+        except UnicodeDecodeError as e:
+            line += chunk[:max(e.start, 0)].count(b"\n")
+            raise ValueError(f"文件不是UTF-8编码（第{line}行无法解码），请另存为UTF-8编码的CSV后重新导入")
+        if not chunk:
+            break
+    fileobj.seek(0)
+
+
+def iter_csv_rows(fileobj: BinaryIO) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """逐行读取UTF-8编码的CSV（支持BOM，编码错误时抛出UnicodeDecodeError），返回(行号, 字段字典)"""
+    reader = csv.reader(codecs.getreader("utf-8-sig")(fileobj))
+    header = next(reader, None)
+    if header is None:
+        return
+    fields = [_normalize_header(name) for name in header]
+    for row_number, values in enumerate(reader, start=2):
+        if not any(value.strip() for value in values):
+            continue
+        yield row_number, {field: value for field, value in zip(fields, values) if field}
+
+
+def iter_xlsx_rows(fileobj: BinaryIO) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """以只读模式逐行读取XLSX第一个工作表，返回(行号, 字段字典)"""
+    from openpyxl import load_workbook
+    
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        fields = [_normalize_header(name) for name in header]
+        for row_number, values in enumerate(rows, start=2):
+            if not any(value not in (None, "") for value in values):
+                continue
+            yield row_number, {
+                field: "" if value is None else str(value)
+                for field, value in zip(fields, values) if field
+            }
+    finally:
+        workbook.close()
+
+
+class ContactImportService:
+    """联系人批量导入服务类"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    @staticmethod
+    def validate_row(row: Dict[str, Any]) -> ContactCreate:
+        """按ContactCreate规则校验一行（与新建联系人接口相同的EmailStr校验），空字符串视为未填写"""
+        data = {}
+        for field, value in row.items():
+            value = value.strip() if isinstance(value, str) else value
+            if value in (None, ""):
+                continue
+            if field == "tag_names":
+                value = [tag.strip() for tag in _TAG_SEPARATORS.split(value) if tag.strip()]
+            data[field] = value
+        return ContactCreate.model_validate(data)
+    
+    def load_chunk(self, user_id: int, contacts: List[ContactCreate],
+                   on_duplicate: DuplicateStrategy) -> Tuple[int, int, int]:
+        """
+        写入一批已校验的联系人（不提交事务）
+        
+        文件内重复的邮箱只保留第一行；已存在的邮箱按on_duplicate跳过或更新，
+        由一条INSERT ... ON CONFLICT完成，不需要先查询已有联系人
+        
+        Returns:
+            (新建数, 更新数, 跳过数)
+        """
+        written = ContactService(self.db).upsert_contacts(
+            user_id, contacts, update_existing=on_duplicate == DuplicateStrategy.UPDATE
+        )
+        inserted = sum(1 for _, is_new in written.values() if is_new)
+        return inserted, len(written) - inserted, len(contacts) - len(written)
+    
+    def import_rows(self, rows: Iterator[Tuple[int, Dict[str, Any]]], user_id: int,
+                    job: ContactImportStatus):
+        """按批校验并写入，每批提交一次并更新任务进度"""
+        chunk_size = settings.contact_import_chunk_size
+        
+        def add_error(row_number: int, email: Optional[str], errors: List[str]):
+            job.failed_count += 1
+            if len(job.errors) < settings.contact_import_max_errors:
+                job.errors.append(ContactImportRowError(row=row_number, email=email, errors=errors))
+        
+        def flush(batch: List[Tuple[int, ContactCreate]]):
+            try:
+                inserted, updated, skipped = self.load_chunk(
+                    user_id, [contact for _, contact in batch], job.on_duplicate
+                )
+                self.db.commit()
+                job.inserted_count += inserted
+                job.updated_count += updated
+                job.skipped_count += skipped
+            except Exception as e:
+                self.db.rollback()
+                logger.error(f"联系人导入写入失败: {str(e)}")
+                for row_number, contact in batch:
+                    add_error(row_number, contact.email, [f"写入失败: {str(e)}"])
+        
+        batch: List[Tuple[int, ContactCreate]] = []
+        for row_number, row in rows:
+            job.processed_rows += 1
+            try:
+                batch.append((row_number, self.validate_row(row)))
+            except ValidationError as e:
+                add_error(row_number, row.get("email") or None, [
+                    f"{'.'.join(str(loc) for loc in error['loc']) or 'row'}: {error['msg']}"
+                    for error in e.errors()
+                ])
+            if len(batch) >= chunk_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+
+
+class ContactImportManager:
+    """联系人导入任务管理器：在线程池中执行导入，保留最近的任务状态供查询"""
+    
+    MAX_JOBS = 200  # 保留的任务状态数量
+    
+    def __init__(self, max_workers: int):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="contact-import")
+        self._jobs: Dict[str, Tuple[int, ContactImportStatus]] = {}
+        self._lock = threading.Lock()
+    
+    def create_job(self, user_id: int, filename: Optional[str], file_format: str,
+                   on_duplicate: DuplicateStrategy) -> ContactImportStatus:
+        """登记导入任务"""
+        job = ContactImportStatus(
+            import_id=uuid.uuid4().hex,
+            status="pending",
+            filename=filename,
+            file_format=file_format,
+            on_duplicate=on_duplicate,
+            created_at=datetime.now()
+        )
+        with self._lock:
+            if len(self._jobs) >= self.MAX_JOBS:
+                finished = [key for key, (_, item) in self._jobs.items() if item.finished_at is not None]
+                for key in finished[:len(self._jobs) - self.MAX_JOBS + 1]:
+                    del self._jobs[key]
+            self._jobs[job.import_id] = (user_id, job)
+        return job
+    
+    def get_job(self, import_id: str, user_id: int) -> Optional[ContactImportStatus]:
+        """获取任务状态"""
+        with self._lock:
+            owner, job = self._jobs.get(import_id, (None, None))
+        return job if owner == user_id else None
+    
+    @staticmethod
+    def run(job: ContactImportStatus, fileobj: BinaryIO, user_id: int) -> ContactImportStatus:
+        """执行导入任务（使用独立的数据库会话）"""
+        job.status = "running"
+        db = SessionLocal()
+        try:
+            if job.file_format == "xlsx":
+                rows = iter_xlsx_rows(fileobj)
+            else:
+                check_csv_encoding(fileobj)
+                rows = iter_csv_rows(fileobj)
+            ContactImportService(db).import_rows(rows, user_id, job)
+            job.status = "completed"
+        except Exception as e:
+            logger.error(f"联系人导入失败: {str(e)}")
+            job.status = "failed"
+            job.error_message = str(e)
+        finally:
+            db.close()
+            fileobj.close()
+            job.finished_at = datetime.now()
+        return job
+    
+    def submit(self, job: ContactImportStatus, fileobj: BinaryIO, user_id: int):
+        """在后台线程池中执行导入"""
+        self._executor.submit(self.run, job, fileobj, user_id)
+
+
+# 全局导入任务管理器
+contact_import_manager = ContactImportManager(max_workers=settings.contact_import_workers)
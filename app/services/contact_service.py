@@ -3,13 +3,52 @@
 """
 
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
-from typing import List, Optional, Tuple
+from sqlalchemy import and_, or_, select, delete, update, func, literal, bindparam, Integer, Row
+from sqlalchemy.dialects.postgresql import ARRAY, aggregate_order_by, insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from typing import List, Optional, Tuple, Iterator, Dict, Any, Iterable
 import math
-import json
 
-from ..models.contact import Contact, ContactTag, ContactCreate, ContactUpdate, ContactResponse
+from ..core.database import replica_reads
+from ..core.result_cache import cached_page
+from ..models.contact import (
+    Contact, ContactTag, ContactCreate, ContactUpdate, ContactResponse, ContactFilter,
+    contact_tag_association, merge_tag_names, describe_contact
+)
 from ..models.user import User
+from ..models.batch import BatchOperationItem, BatchResponse
+from .batch_service import execute_batch, upsert_by_email
+from .tag_service import TagService
+
+# 联系人的关联标签名数组（相关子查询，与Contact.tag_items同样按标签ID排序）
+CONTACT_TAG_NAMES = (
+    select(func.array_agg(aggregate_order_by(ContactTag.name, ContactTag.id)).filter(ContactTag.name.isnot(None)))
+    .select_from(contact_tag_association.join(ContactTag, ContactTag.id == contact_tag_association.c.tag_id))
+    .where(contact_tag_association.c.contact_id == Contact.id)
+    .correlate(Contact)
+    .scalar_subquery()
+)
+
+# 导出列
+EXPORT_COLUMNS = (
+    Contact.id, Contact.name, Contact.first_name, Contact.last_name, Contact.email,
+    Contact.company, Contact.domain, Contact.position, CONTACT_TAG_NAMES.label("tags"),
+    Contact.created_at, Contact.updated_at
+)
+
+# 列表列（ContactResponse的字段，description和合并后的标签由LIST_FIELDS计算）
+LIST_COLUMNS = (
+    Contact.id, Contact.user_id, Contact.name, Contact.first_name, Contact.last_name, Contact.email,
+    Contact.company, Contact.domain, Contact.position, CONTACT_TAG_NAMES.label("tag_names"),
+    Contact.tags.label("legacy_tags"), Contact.created_at, Contact.updated_at
+)
+
+# 列表计算字段（response_rows整列计算）
+LIST_FIELDS = {
+    "tag_names": lambda columns: list(map(merge_tag_names, columns["tag_names"], columns["legacy_tags"])),
+    "tags": lambda columns: columns["tag_names"],
+    "description": lambda columns: list(map(describe_contact, columns["position"], columns["company"])),
+}
 
 
 class ContactService:
@@ -18,28 +57,115 @@ class ContactService:
     def __init__(self, db: Session):
         self.db = db
     
-    def create_contact(self, contact_data: ContactCreate, user_id: int) -> Contact:
-        """创建联系人"""
-        # 处理标签
-        tags_json = None
-        if contact_data.tag_names:
-            tags_json = json.dumps(contact_data.tag_names, ensure_ascii=False)
-        
-        db_contact = Contact(
-            name=contact_data.name,
-            first_name=contact_data.first_name,
-            last_name=contact_data.last_name,
-            email=contact_data.email,
-            company=contact_data.company,
-            domain=contact_data.domain,
-            position=contact_data.position,
-            tags=tags_json,
-            user_id=user_id
+    @staticmethod
+    def to_record(contact_data: ContactCreate) -> Dict[str, Any]:
+        """将创建数据转换为contacts表字段（不含user_id，标签通过set_contact_tags写入关联表）"""
+        return {
+            "name": contact_data.name,
+            "first_name": contact_data.first_name,
+            "last_name": contact_data.last_name,
+            "email": contact_data.email,
+            "company": contact_data.company,
+            "domain": contact_data.domain,
+            "position": contact_data.position
+        }
+    
+    @staticmethod
+    def to_update_values(contact_data: ContactUpdate) -> Dict[str, Any]:
+        """将更新数据转换为contacts表字段（只包含提交的字段，标签通过set_contact_tags写入关联表）"""
+        return contact_data.model_dump(exclude_unset=True, exclude={"tag_names"})
+    
+    def set_contact_tags(self, user_id: int, contact_tags: Iterable[Tuple[int, List[str]]],
+                         replace: bool = False) -> int:
+        """
+        按标签名设置联系人标签（不提交事务）
+        
+        标签名统一解析为标签ID（不存在的自动创建），再批量写入关联表
+        
+        Args:
+            user_id: 用户ID
+            contact_tags: [(联系人ID, 标签名列表)]
+            replace: 是否替换联系人原有标签（同时清空旧版标签JSON），否则只追加
+        
+        Returns:
+            新建的标签数
+        """
+        contact_tags = [(contact_id, TagService.normalize_names(names or [])) for contact_id, names in contact_tags]
+        if not contact_tags:
+            return 0
+        
+        tag_ids, created_count = TagService(self.db).resolve_tag_ids(
+            user_id, (name for _, names in contact_tags for name in names)
         )
-        self.db.add(db_contact)
+        
+        if replace:
+            contact_ids = [contact_id for contact_id, _ in contact_tags]
+            self.db.execute(
+                delete(contact_tag_association).where(contact_tag_association.c.contact_id.in_(contact_ids))
+            )
+            self.db.execute(
+                update(Contact)
+                .where(Contact.user_id == user_id, Contact.id.in_(contact_ids), Contact.tags.isnot(None))
+                .values(tags=None),
+                execution_options={"synchronize_session": False}
+            )
+        
+        pairs = [(contact_id, tag_ids[name]) for contact_id, names in contact_tags for name in names if name in tag_ids]
+        if pairs:
+            # 两个数组参数经unnest展开为行，一条INSERT ... SELECT写入，语句大小与行数无关
+            contact_ids, tag_id_list = zip(*pairs)
+            rows = func.unnest(
+                bindparam("contact_ids", list(contact_ids), type_=ARRAY(Integer)),
+                bindparam("tag_ids", list(tag_id_list), type_=ARRAY(Integer))
+            ).table_valued("contact_id", "tag_id").render_derived()
+            self.db.execute(
+                pg_insert(contact_tag_association)
+                .from_select(["contact_id", "tag_id"], select(rows.c.contact_id, rows.c.tag_id))
+                .on_conflict_do_nothing()
+            )
+        return created_count
+    
+    def upsert_contacts(self, user_id: int, contacts: List[ContactCreate],
+                        update_existing: bool = True) -> Dict[str, Tuple[int, bool]]:
+        """
+        按邮箱批量新建或更新联系人（不提交事务）
+        
+        新建的联系人追加提交的标签；更新的联系人只更新提交的字段，只有提交了标签时才替换原有标签
+        
+        Returns:
+            {小写邮箱: (联系人ID, 是否新建)}，不更新时已存在的联系人不在结果中
+        """
+        first_rows: Dict[str, ContactCreate] = {}
+        for contact in contacts:
+            first_rows.setdefault(contact.email.lower(), contact)
+        
+        written = upsert_by_email(
+            self.db, Contact, user_id, [self.to_record(contact) for contact in first_rows.values()], update_existing,
+            update_fields=[contact.model_fields_set for contact in first_rows.values()]
+        )
+        tagged = [(email, contact_id, inserted) for email, (contact_id, inserted) in written.items()
+                  if first_rows[email].tag_names]
+        self.set_contact_tags(user_id, [
+            (contact_id, first_rows[email].tag_names) for email, contact_id, inserted in tagged if inserted
+        ])
+        self.set_contact_tags(user_id, [
+            (contact_id, first_rows[email].tag_names) for email, contact_id, inserted in tagged if not inserted
+        ], replace=True)
+        return written
+    
+    def create_contact(self, contact_data: ContactCreate, user_id: int) -> Contact:
+        """
+        创建联系人
+        
+        Raises:
+            ValueError: 该邮箱的联系人已存在
+        """
+        written = self.upsert_contacts(user_id, [contact_data], update_existing=False)
+        if not written:
+            self.db.rollback()
+            raise ValueError("该邮箱的联系人已存在")
         self.db.commit()
-        self.db.refresh(db_contact)
-        return db_contact
+        return self.get_contact(next(iter(written.values()))[0], user_id)
     
     def get_contact(self, contact_id: int, user_id: int) -> Optional[Contact]:
         """获取单个联系人"""
@@ -47,86 +173,138 @@ class ContactService:
             and_(Contact.id == contact_id, Contact.user_id == user_id)
         ).first()
     
-    def get_contacts(
-        self, 
-        user_id: int, 
-        page: int = 1, 
-        page_size: int = 20,
+    @staticmethod
+    def build_filters(
+        user_id: int,
         search_query: Optional[str] = None,
         tag_names: Optional[List[str]] = None,
         start_date: Optional[str] = None,
         end_date: Optional[str] = None
-    ) -> Tuple[List[Contact], int]:
-        """获取联系人列表"""
+    ) -> list:
+        """构建联系人列表的筛选条件（列表查询和导出共用）"""
         from datetime import datetime
         
-        query = self.db.query(Contact).filter(Contact.user_id == user_id)
+        filters = [Contact.user_id == user_id]
         
         # 搜索功能
         if search_query:
-            search_filter = or_(
+            filters.append(or_(
                 Contact.name.ilike(f"%{search_query}%"),
                 Contact.first_name.ilike(f"%{search_query}%"),
                 Contact.last_name.ilike(f"%{search_query}%"),
                 Contact.email.ilike(f"%{search_query}%"),
                 Contact.company.ilike(f"%{search_query}%")
-            )
-            query = query.filter(search_filter)
+            ))
         
-        # 标签筛选 - 使用JSON查询（大小写不敏感）
+        # 标签筛选（大小写不敏感）- 按关联表查询，兼容尚未转换的旧版标签JSON
         if tag_names:
-            # 使用JSON查询筛选包含指定标签的联系人
-            tag_conditions = []
-            for tag_name in tag_names:
-                # 支持大小写不敏感的搜索
-                tag_conditions.append(Contact.tags.ilike(f'%"{tag_name}"%'))
-            if tag_conditions:
-                query = query.filter(or_(*tag_conditions))
+            tagged_contact_ids = (
+                select(contact_tag_association.c.contact_id)
+                .join(ContactTag, ContactTag.id == contact_tag_association.c.tag_id)
+                .where(ContactTag.user_id == user_id, func.lower(ContactTag.name).in_([
+                    tag_name.lower() for tag_name in tag_names
+                ]))
+            )
+            filters.append(or_(
+                Contact.id.in_(tagged_contact_ids),
+                *[Contact.tags.ilike(f'%"{tag_name}"%') for tag_name in tag_names]
+            ))
         
         # 创建时间筛选
         if start_date:
             try:
                 start_datetime = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-                query = query.filter(Contact.created_at >= start_datetime)
+                filters.append(Contact.created_at >= start_datetime)
             except ValueError:
                 pass  # 忽略无效的日期格式
         
         if end_date:
             try:
                 end_datetime = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-                query = query.filter(Contact.created_at <= end_datetime)
+                filters.append(Contact.created_at <= end_datetime)
             except ValueError:
                 pass  # 忽略无效的日期格式
         
-        # 按创建时间倒序排序
-        query = query.order_by(Contact.created_at.desc())
+        return filters
+    
+    @cached_page("contacts")
+    @replica_reads
+    def get_contacts(
+        self, 
+        user_id: int, 
+        page: int = 1, 
+        page_size: int = 20,
+        search_query: Optional[str] = None,
+        tag_names: Optional[List[str]] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> Tuple[List[Row], int]:
+        """
+        获取联系人列表
+        
+        只查询列表列（LIST_COLUMNS），返回结果行而不是ORM对象，由response_rows转换为响应数据
+        """
+        filters = self.build_filters(user_id, search_query, tag_names, start_date, end_date)
         
         # 计算总数
-        total = query.count()
+        total = self.db.execute(select(func.count()).select_from(Contact).where(*filters)).scalar()
         
-        # 分页
+        # 按创建时间倒序排序并分页
         offset = (page - 1) * page_size
-        contacts = query.offset(offset).limit(page_size).all()
+        contacts = self.db.execute(
+            select(*LIST_COLUMNS).where(*filters)
+            .order_by(Contact.created_at.desc())
+            .offset(offset).limit(page_size)
+        ).all()
         
         return contacts, total
     
+    @replica_reads
+    def iter_contacts_for_export(
+        self,
+        user_id: int,
+        search_query: Optional[str] = None,
+        tag_names: Optional[List[str]] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        batch_size: int = 1000
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        按列表筛选条件逐行导出联系人
+        
+        只查询导出列，使用服务端游标（yield_per）分批读取，内存占用与联系人数量无关
+        """
+        stmt = select(*EXPORT_COLUMNS, Contact.tags.label("legacy_tags")).where(
+            *self.build_filters(user_id, search_query, tag_names, start_date, end_date)
+        ).order_by(Contact.created_at.desc(), Contact.id.desc()).execution_options(yield_per=batch_size)
+        
+        for row in self.db.execute(stmt):
+            item = row._asdict()
+            item["tags"] = merge_tag_names(item["tags"], item.pop("legacy_tags"))
+            yield item
+    
     def update_contact(self, contact_id: int, contact_data: ContactUpdate, user_id: int) -> Optional[Contact]:
-        """更新联系人"""
+        """
+        更新联系人
+        
+        Raises:
+            ValueError: 修改后的邮箱与其他联系人重复
+        """
         db_contact = self.get_contact(contact_id, user_id)
         if not db_contact:
             return None
         
-        update_data = contact_data.model_dump(exclude_unset=True, exclude={"tag_names"})
-        
-        # 处理标签更新
-        if contact_data.tag_names is not None:
-            tags_json = json.dumps(contact_data.tag_names, ensure_ascii=False) if contact_data.tag_names else None
-            update_data["tags"] = tags_json
-        
-        for field, value in update_data.items():
+        for field, value in self.to_update_values(contact_data).items():
             setattr(db_contact, field, value)
+        if contact_data.tag_names is not None:
+            self.set_contact_tags(user_id, [(contact_id, contact_data.tag_names)], replace=True)
+            self.db.expire(db_contact, ["tag_items", "tags"])
         
-        self.db.commit()
+        try:
+            self.db.commit()
+        except IntegrityError:
+            self.db.rollback()
+            raise ValueError("该邮箱的联系人已存在")
         self.db.refresh(db_contact)
         return db_contact
     
@@ -140,63 +318,114 @@ class ContactService:
         self.db.commit()
         return True
     
+    def batch_operations(self, operations: List[BatchOperationItem], user_id: int) -> BatchResponse:
+        """批量创建/更新/删除联系人（同一事务）"""
+        def delete_tag_associations(contact_ids: List[int]):
+            self.db.execute(
+                delete(contact_tag_association).where(contact_tag_association.c.contact_id.in_(contact_ids))
+            )
+        
+        def write_tags(written: List[Tuple[int, Any]]):
+            # 创建时追加标签；更新时只有提交了tag_names才替换标签
+            self.set_contact_tags(user_id, [
+                (contact_id, data.tag_names) for contact_id, data in written
+                if isinstance(data, ContactCreate) and data.tag_names
+            ])
+            self.set_contact_tags(user_id, [
+                (contact_id, data.tag_names) for contact_id, data in written
+                if isinstance(data, ContactUpdate) and data.tag_names is not None
+            ], replace=True)
+        
+        return execute_batch(
+            self.db, Contact, user_id, operations,
+            create_schema=ContactCreate,
+            update_schema=ContactUpdate,
+            to_create_record=self.to_record,
+            to_update_values=self.to_update_values,
+            before_delete=delete_tag_associations,
+            after_write=write_tags
+        )
+    
     def add_tag_to_contact(self, contact_id: int, tag_id: int, user_id: int) -> bool:
         """给联系人添加标签"""
-        contact = self.get_contact(contact_id, user_id)
-        if not contact:
+        if not self.get_contact(contact_id, user_id):
             return False
+        return self.bulk_add_tag(tag_id, user_id, contact_ids=[contact_id]) is not None
+    
+    def remove_tag_from_contact(self, contact_id: int, tag_id: int, user_id: int) -> bool:
+        """从联系人移除标签"""
+        if not self.get_contact(contact_id, user_id):
+            return False
+        return self.bulk_remove_tag(tag_id, user_id, contact_ids=[contact_id]) is not None
+    
+    @staticmethod
+    def build_target_filters(user_id: int, contact_ids: Optional[List[int]],
+                             contact_filter: Optional[ContactFilter]) -> list:
+        """批量操作（标签、转换为客户）的目标联系人条件，ID列表和筛选条件同时提供时取交集"""
+        contact_filter = contact_filter or ContactFilter()
+        filters = ContactService.build_filters(
+            user_id, contact_filter.search, contact_filter.tag_names, contact_filter.start_date, contact_filter.end_date
+        )
+        if contact_ids is not None:
+            filters.append(Contact.id.in_(contact_ids))
+        return filters
+    
+    def bulk_add_tag(self, tag_id: int, user_id: int, contact_ids: Optional[List[int]] = None,
+                     contact_filter: Optional[ContactFilter] = None) -> Optional[int]:
+        """
+        给一批联系人添加标签
+        
+        用一条INSERT ... SELECT写入关联表，已有该标签的联系人不受影响
         
+        Returns:
+            实际添加的联系人数，标签不存在时返回None
+        """
         tag = self.db.query(ContactTag).filter(
             and_(ContactTag.id == tag_id, ContactTag.user_id == user_id)
         ).first()
-        
         if not tag:
-            return False
-        
-        # 解析现有标签
-        current_tags = []
-        if contact.tags:
-            try:
-                current_tags = json.loads(contact.tags)
-            except json.JSONDecodeError:
-                current_tags = []
-        
-        # 添加新标签（如果不存在）
-        if tag.name not in current_tags:
-            current_tags.append(tag.name)
-            contact.tags = json.dumps(current_tags, ensure_ascii=False)
-            self.db.commit()
+            return None
         
-        return True
+        result = self.db.execute(
+            pg_insert(contact_tag_association)
+            .from_select(
+                ["contact_id", "tag_id"],
+                select(Contact.id, literal(tag_id)).where(*self.build_target_filters(user_id, contact_ids, contact_filter))
+            )
+            .on_conflict_do_nothing()
+        )
+        self.db.commit()
+        return result.rowcount
     
-    def remove_tag_from_contact(self, contact_id: int, tag_id: int, user_id: int) -> bool:
-        """从联系人移除标签"""
-        contact = self.get_contact(contact_id, user_id)
-        if not contact:
-            return False
+    def bulk_remove_tag(self, tag_id: int, user_id: int, contact_ids: Optional[List[int]] = None,
+                        contact_filter: Optional[ContactFilter] = None) -> Optional[int]:
+        """
+        从一批联系人移除标签
         
+        删除关联记录，并从尚未转换的旧版标签JSON中删除同名标签（不区分大小写，数组为空时置为NULL）
+        
+        Returns:
+            实际移除的联系人数，标签不存在时返回None
+        """
         tag = self.db.query(ContactTag).filter(
             and_(ContactTag.id == tag_id, ContactTag.user_id == user_id)
         ).first()
-        
         if not tag:
-            return False
+            return None
         
-        # 解析现有标签
-        current_tags = []
-        if contact.tags:
-            try:
-                current_tags = json.loads(contact.tags)
-            except json.JSONDecodeError:
-                current_tags = []
-        
-        # 移除标签
-        if tag.name in current_tags:
-            current_tags.remove(tag.name)
-            contact.tags = json.dumps(current_tags, ensure_ascii=False) if current_tags else None
-            self.db.commit()
+        target_ids = select(Contact.id).where(*self.build_target_filters(user_id, contact_ids, contact_filter))
+        removed_ids = set(self.db.execute(
+            delete(contact_tag_association)
+            .where(contact_tag_association.c.tag_id == tag_id, contact_tag_association.c.contact_id.in_(target_ids))
+            .returning(contact_tag_association.c.contact_id)
+        ).scalars())
         
-        return True
+        # 旧版JSON按名称匹配不区分大小写，与标签筛选一致
+        removed_ids.update(TagService(self.db).rewrite_legacy_tags(
+            user_id, tag.name, filters=self.build_target_filters(user_id, contact_ids, contact_filter)
+        ))
+        self.db.commit()
+        return len(removed_ids)
     
     def get_contact_with_tags(self, contact_id: int, user_id: int) -> Optional[Contact]:
         """获取带标签的联系人"""
@@ -204,6 +433,7 @@ class ContactService:
             and_(Contact.id == contact_id, Contact.user_id == user_id)
         ).first()
     
+    @replica_reads
     def search_contacts(
         self, 
         user_id: int, 
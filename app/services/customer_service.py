@@ -3,15 +3,35 @@
 """
 
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
-from typing import List, Optional, Tuple
+from sqlalchemy import and_, or_, func, select, update, values, column, cast, literal, text, distinct, String, Integer, DateTime, Row
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from typing import List, Optional, Tuple, Dict, Any, Iterator
 import math
 from datetime import datetime
 
+from ..core.database import replica_reads
+from ..core.result_cache import cached_page
 from ..models.customer import (
     Customer, CustomerCreate, CustomerUpdate, CustomerProgressUpdate, CustomerEmailCountUpdate,
-    CommunicationProgress, InterestLevel
+    CommunicationProgress, InterestLevel, CustomerFromContactsResponse
 )
+from ..models.contact import Contact, ContactFilter, DuplicateStrategy
+from ..models.email_account import EmailAccount
+from ..models.email_message import EmailMessage
+from ..models.batch import BatchOperationItem, BatchResponse
+from .batch_service import execute_batch, upsert_by_email
+from .contact_service import ContactService
+
+# 导出列
+EXPORT_COLUMNS = (
+    Customer.id, Customer.contact_id, Customer.name, Customer.email, Customer.company, Customer.email_count,
+    Customer.communication_progress, Customer.interest_level, Customer.last_communication_time,
+    Customer.current_progress, Customer.created_at, Customer.updated_at
+)
+
+# 列表列（CustomerResponse的字段）
+LIST_COLUMNS = EXPORT_COLUMNS + (Customer.user_id,)
 
 
 class CustomerService:
@@ -20,23 +40,104 @@ class CustomerService:
     def __init__(self, db: Session):
         self.db = db
     
+    def upsert_customers(self, user_id: int, customers: List[CustomerCreate],
+                         update_existing: bool = True) -> Dict[str, Tuple[int, bool]]:
+        """
+        按邮箱批量新建或更新客户（不提交事务）
+        
+        已存在的客户只更新请求中提交的字段，邮件统计（email_count、last_communication_time）
+        和沟通进度等未提交的字段保留原值；新建的客户从已同步的邮件补算邮件统计
+        
+        Returns:
+            {小写邮箱: (客户ID, 是否新建)}，不更新时已存在的客户不在结果中
+        """
+        written = upsert_by_email(
+            self.db, Customer, user_id, [customer.model_dump() for customer in customers], update_existing,
+            update_fields=[customer.model_fields_set for customer in customers]
+        )
+        self.backfill_email_activity(user_id, [customer_id for customer_id, created in written.values() if created])
+        return written
+    
     def create_customer(self, customer_data: CustomerCreate, user_id: int) -> Customer:
-        """创建客户"""
-        db_customer = Customer(
-            user_id=user_id,
-            name=customer_data.name,
-            email=customer_data.email,
-            company=customer_data.company,
-            email_count=customer_data.email_count,
-            communication_progress=customer_data.communication_progress,
-            interest_level=customer_data.interest_level,
-            last_communication_time=customer_data.last_communication_time,
-            current_progress=customer_data.current_progress
+        """
+        创建客户
+        
+        Raises:
+            ValueError: 该邮箱的客户已存在
+        """
+        written = self.upsert_customers(user_id, [customer_data], update_existing=False)
+        if not written:
+            self.db.rollback()
+            raise ValueError("该邮箱的客户已存在")
+        self.db.commit()
+        return self.get_customer(next(iter(written.values()))[0], user_id)
+    
+    def create_from_contacts(self, user_id: int, contact_ids: Optional[List[int]] = None,
+                             contact_filter: Optional[ContactFilter] = None,
+                             on_duplicate: DuplicateStrategy = DuplicateStrategy.SKIP) -> CustomerFromContactsResponse:
+        """
+        把一批联系人转换为客户
+        
+        用一条INSERT ... SELECT从contacts表写入customers表，新客户记录来源联系人（contact_id）；
+        邮箱已是客户时按on_duplicate跳过，或用联系人的姓名、公司更新并关联到该联系人
+        """
+        source = (
+            select(
+                Contact.user_id, Contact.id, Contact.name, Contact.email, Contact.company,
+                literal(0), literal(CommunicationProgress.PENDING.value), literal(InterestLevel.NO_INTEREST.value)
+            )
+            .where(*ContactService.build_target_filters(user_id, contact_ids, contact_filter))
+            # 同一邮箱的多个联系人只取最早的一个，避免一条语句内重复冲突
+            .distinct(func.lower(Contact.email))
+            .order_by(func.lower(Contact.email), Contact.id)
+        )
+        matched_count = self.db.execute(select(func.count()).select_from(source.subquery())).scalar()
+        
+        stmt = pg_insert(Customer).from_select(
+            ["user_id", "contact_id", "name", "email", "company", "email_count", "communication_progress", "interest_level"],
+            source
         )
-        self.db.add(db_customer)
+        conflict_target = [Customer.user_id, text("lower(email)")]
+        if on_duplicate == DuplicateStrategy.UPDATE:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=conflict_target,
+                set_={
+                    "contact_id": stmt.excluded.contact_id,
+                    "name": stmt.excluded.name,
+                    "company": stmt.excluded.company,
+                    "updated_at": func.now()
+                }
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=conflict_target)
+        
+        # 新插入的行updated_at为空，冲突后更新的行updated_at为now()
+        written = self.db.execute(stmt.returning(Customer.id, Customer.updated_at.is_(None))).all()
+        inserted_ids = [customer_id for customer_id, inserted in written if inserted]
+        self.backfill_email_activity(user_id, inserted_ids)
         self.db.commit()
-        self.db.refresh(db_customer)
-        return db_customer
+        
+        inserted_count = len(inserted_ids)
+        return CustomerFromContactsResponse(
+            success=True,
+            matched_count=matched_count,
+            inserted_count=inserted_count,
+            updated_count=len(written) - inserted_count,
+            skipped_count=matched_count - len(written)
+        )
+    
+    def batch_operations(self, operations: List[BatchOperationItem], user_id: int) -> BatchResponse:
+        """批量创建/更新/删除客户（同一事务）"""
+        return execute_batch(
+            self.db, Customer, user_id, operations,
+            create_schema=CustomerCreate,
+            update_schema=CustomerUpdate,
+            to_create_record=lambda customer_data: customer_data.model_dump(),
+            to_update_values=lambda customer_data: customer_data.model_dump(exclude_unset=True),
+            after_write=lambda written: self.backfill_email_activity(user_id, [
+                customer_id for customer_id, customer_data in written if isinstance(customer_data, CustomerCreate)
+            ])
+        )
     
     def get_customer(self, customer_id: int, user_id: int) -> Optional[Customer]:
         """获取单个客户"""
@@ -44,49 +145,89 @@ class CustomerService:
             and_(Customer.id == customer_id, Customer.user_id == user_id)
         ).first()
     
-    def get_customers(
-        self, 
-        user_id: int, 
-        page: int = 1, 
-        page_size: int = 20,
+    @staticmethod
+    def build_filters(
+        user_id: int,
         search_query: Optional[str] = None,
         communication_progress: Optional[CommunicationProgress] = None,
         interest_level: Optional[InterestLevel] = None
-    ) -> Tuple[List[Customer], int]:
-        """获取客户列表"""
-        query = self.db.query(Customer).filter(Customer.user_id == user_id)
+    ) -> list:
+        """构建客户列表的筛选条件（列表查询和导出共用）"""
+        filters = [Customer.user_id == user_id]
         
         # 搜索功能
         if search_query:
-            search_filter = or_(
+            filters.append(or_(
                 Customer.name.ilike(f"%{search_query}%"),
                 Customer.email.ilike(f"%{search_query}%"),
                 Customer.company.ilike(f"%{search_query}%")
-            )
-            query = query.filter(search_filter)
+            ))
         
         # 沟通进度筛选
         if communication_progress:
-            query = query.filter(Customer.communication_progress == communication_progress)
+            filters.append(Customer.communication_progress == communication_progress)
         
         # 感兴趣程度筛选
         if interest_level:
-            query = query.filter(Customer.interest_level == interest_level)
+            filters.append(Customer.interest_level == interest_level)
         
-        # 按创建时间倒序排序
-        query = query.order_by(Customer.created_at.desc())
+        return filters
+    
+    @cached_page("customers")
+    @replica_reads
+    def get_customers(
+        self, 
+        user_id: int, 
+        page: int = 1, 
+        page_size: int = 20,
+        search_query: Optional[str] = None,
+        communication_progress: Optional[CommunicationProgress] = None,
+        interest_level: Optional[InterestLevel] = None
+    ) -> Tuple[List[Row], int]:
+        """获取客户列表（只查询列表列，返回结果行）"""
+        filters = self.build_filters(user_id, search_query, communication_progress, interest_level)
         
         # 计算总数
-        total = query.count()
+        total = self.db.execute(select(func.count()).select_from(Customer).where(*filters)).scalar()
         
-        # 分页
+        # 按创建时间倒序排序并分页
         offset = (page - 1) * page_size
-        customers = query.offset(offset).limit(page_size).all()
+        customers = self.db.execute(
+            select(*LIST_COLUMNS).where(*filters)
+            .order_by(Customer.created_at.desc())
+            .offset(offset).limit(page_size)
+        ).all()
         
         return customers, total
     
+    @replica_reads
+    def iter_customers_for_export(
+        self,
+        user_id: int,
+        search_query: Optional[str] = None,
+        communication_progress: Optional[CommunicationProgress] = None,
+        interest_level: Optional[InterestLevel] = None,
+        batch_size: int = 1000
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        按列表筛选条件逐行导出客户
+        
+        只查询导出列，使用服务端游标（yield_per）分批读取，内存占用与客户数量无关
+        """
+        stmt = select(*EXPORT_COLUMNS).where(
+            *self.build_filters(user_id, search_query, communication_progress, interest_level)
+        ).order_by(Customer.created_at.desc(), Customer.id.desc()).execution_options(yield_per=batch_size)
+        
+        for row in self.db.execute(stmt):
+            yield row._asdict()
+    
     def update_customer(self, customer_id: int, customer_data: CustomerUpdate, user_id: int) -> Optional[Customer]:
-        """更新客户信息"""
+        """
+        更新客户信息
+        
+        Raises:
+            ValueError: 修改后的邮箱与其他客户重复
+        """
         db_customer = self.get_customer(customer_id, user_id)
         if not db_customer:
             return None
@@ -95,7 +236,11 @@ class CustomerService:
         for field, value in update_data.items():
             setattr(db_customer, field, value)
         
-        self.db.commit()
+        try:
+            self.db.commit()
+        except IntegrityError:
+            self.db.rollback()
+            raise ValueError("该邮箱的客户已存在")
         self.db.refresh(db_customer)
         return db_customer
     
@@ -129,6 +274,105 @@ class CustomerService:
         self.db.refresh(db_customer)
         return db_customer
     
+    def apply_email_activity(self, user_id: int, activity: List[Dict[str, Any]]) -> int:
+        """
+        根据同步到的邮件批量更新客户邮件计数和最近沟通时间
+        
+        activity为按往来地址汇总的增量（见EmailMessageService.summarize_activity），
+        用一条UPDATE ... FROM (VALUES ...)语句匹配Customer.email并累加，不做全量重算。
+        不提交事务，由调用方与邮件记录一起提交。
+        
+        Returns:
+            更新的客户数
+        """
+        if not activity:
+            return 0
+        
+        activity_values = values(
+            column("address", String),
+            column("delta", Integer),
+            column("last_time", DateTime(timezone=True)),
+            name="activity"
+        ).data([(item["address"], item["count"], item["last_time"]) for item in activity])
+        
+        stmt = (
+            update(Customer)
+            .where(and_(
+                Customer.user_id == user_id,
+                func.lower(Customer.email) == activity_values.c.address
+            ))
+            .values(
+                email_count=func.greatest(func.coalesce(Customer.email_count, 0) + activity_values.c.delta, 0),
+                # GREATEST忽略NULL，删除邮件时last_time为NULL，不会改变最近沟通时间
+                last_communication_time=func.greatest(
+                    Customer.last_communication_time, cast(activity_values.c.last_time, DateTime(timezone=True))
+                )
+            )
+            .execution_options(synchronize_session=False)
+        )
+        return self.db.execute(stmt).rowcount
+    
+    def backfill_email_activity(self, user_id: int, customer_ids: List[int]) -> int:
+        """
+        从已同步的邮件补算新建客户的邮件计数和最近沟通时间
+        
+        apply_email_activity只累加到同步时已存在的客户，之后新建的客户在这里从email_messages汇总，
+        计数规则与summarize_activity相同：每封邮件的发件人、收件人和抄送人（本账户地址除外）各计一次。
+        不提交事务，由调用方与新建的客户一起提交。
+        
+        Returns:
+            更新的客户数
+        """
+        if not customer_ids:
+            return 0
+        
+        participants = (
+            select(
+                EmailMessage.id,
+                EmailMessage.sent_at,
+                func.lower(EmailAccount.email_address).label("account_address"),
+                func.unnest(func.string_to_array(
+                    func.concat_ws(",", EmailMessage.from_address, EmailMessage.to_addresses, EmailMessage.cc_addresses),
+                    ","
+                )).label("address")
+            )
+            .join(EmailAccount, EmailAccount.id == EmailMessage.email_account_id)
+            .where(EmailMessage.user_id == user_id)
+            .subquery()
+        )
+        new_addresses = select(func.lower(Customer.email)).where(
+            and_(Customer.user_id == user_id, Customer.id.in_(customer_ids))
+        )
+        activity = (
+            select(
+                participants.c.address,
+                # 同一地址可能同时出现在收件人和抄送中，按邮件去重
+                func.count(distinct(participants.c.id)).label("count"),
+                func.max(participants.c.sent_at).label("last_time")
+            )
+            .where(and_(
+                participants.c.address != participants.c.account_address,
+                participants.c.address.in_(new_addresses)
+            ))
+            .group_by(participants.c.address)
+            .subquery()
+        )
+        
+        stmt = (
+            update(Customer)
+            .where(and_(
+                Customer.user_id == user_id,
+                Customer.id.in_(customer_ids),
+                func.lower(Customer.email) == activity.c.address
+            ))
+            .values(
+                email_count=func.coalesce(Customer.email_count, 0) + activity.c.count,
+                last_communication_time=func.greatest(Customer.last_communication_time, activity.c.last_time)
+            )
+            .execution_options(synchronize_session=False)
+        )
+        return self.db.execute(stmt).rowcount
+    
     def delete_customer(self, customer_id: int, user_id: int) -> bool:
         """删除客户"""
         db_customer = self.get_customer(customer_id, user_id)
@@ -139,18 +383,21 @@ class CustomerService:
         self.db.commit()
         return True
     
+    @replica_reads
     def get_customers_by_progress(self, user_id: int, progress: CommunicationProgress) -> List[Customer]:
         """根据沟通进度获取客户列表"""
         return self.db.query(Customer).filter(
             and_(Customer.user_id == user_id, Customer.communication_progress == progress)
         ).all()
     
+    @replica_reads
     def get_customers_by_interest(self, user_id: int, interest: InterestLevel) -> List[Customer]:
         """根据感兴趣程度获取客户列表"""
         return self.db.query(Customer).filter(
             and_(Customer.user_id == user_id, Customer.interest_level == interest)
         ).all()
     
+    @replica_reads
     def get_customer_statistics(self, user_id: int) -> dict:
         """获取客户统计信息"""
         total_customers = self.db.query(Customer).filter(Customer.user_id == user_id).count()
@@ -2,20 +2,36 @@
 邮箱账户服务层
 """
 
+import asyncio
 import hashlib
 import secrets
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import and_, select, func, Row
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from typing import List, Optional, Tuple
 import math
 from datetime import datetime
 
+from ..core.config import settings
+from ..core.database import replica_reads
+from ..core.hashing import hashing_pool
 from ..models.email_account import (
     EmailAccount, EmailAccountCreate, EmailAccountUpdate, 
     EmailAccountTestResponse, EmailSendRequest, EmailSendResponse,
+    EmailBatchSendRequest, EmailBatchSendResponse, EmailBatchSendResultItem,
     ConnectionStatus
 )
 from ..email.email_263_sdk import Email263SDK, Email263Config
+from ..email.rate_limiter import send_rate_limiter
+from ..email.idle_listener import get_idle_supervisor
+
+# 列表列（EmailAccountResponse的字段）
+LIST_COLUMNS = (
+    EmailAccount.id, EmailAccount.user_id, EmailAccount.email_address, EmailAccount.smtp_server,
+    EmailAccount.smtp_port, EmailAccount.imap_server, EmailAccount.imap_port, EmailAccount.is_ssl,
+    EmailAccount.is_active, EmailAccount.connection_status, EmailAccount.last_connection_test,
+    EmailAccount.created_at, EmailAccount.updated_at
+)
 
 
 class EmailAccountService:
@@ -31,42 +47,72 @@ class EmailAccountService:
         password_hash = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), 100000)
         return f"{salt}:{password_hash.hex()}"
     
+    async def encrypt_password(self, password: str) -> str:
+        """
+        在哈希线程池中加密密码（async路由使用，不阻塞事件循环）
+        
+        Raises:
+            HashingBusyError: 哈希线程池排队任务已满
+        """
+        return await hashing_pool.run("pbkdf2", self._encrypt_password, password)
+    
     def _decrypt_password(self, encrypted_password: str) -> str:
         """解密密码"""
         # 这里简化处理，实际项目中需要实现解密逻辑
         # 为了演示，我们假设密码是明文存储的（实际项目中不应该这样做）
         return encrypted_password
     
-    def create_email_account(self, account_data: EmailAccountCreate, user_id: int) -> EmailAccount:
-        """创建邮箱账户"""
-        # 检查是否已存在相同的邮箱地址
-        existing_account = self.db.query(EmailAccount).filter(
-            and_(EmailAccount.user_id == user_id, EmailAccount.email_address == account_data.email_address)
-        ).first()
+    def create_sdk(self, db_account: EmailAccount) -> Email263SDK:
+        """根据邮箱账户创建SDK实例"""
+        return Email263SDK(
+            email_address=db_account.email_address,
+            password=self._decrypt_password(db_account.email_password),
+            smtp_server=db_account.smtp_server,
+            smtp_port=db_account.smtp_port,
+            imap_server=db_account.imap_server,
+            imap_port=db_account.imap_port,
+            is_ssl=db_account.is_ssl
+        )
+    
+    def create_email_account(self, account_data: EmailAccountCreate, user_id: int,
+                             encrypted_password: Optional[str] = None) -> EmailAccount:
+        """
+        创建邮箱账户
         
-        if existing_account:
-            raise ValueError("该邮箱地址已存在")
+        依赖(user_id, email_address)唯一约束，用INSERT ... ON CONFLICT DO NOTHING判断是否已存在，
+        并发创建同一邮箱时只有一个成功
         
+        Args:
+            encrypted_password: 已由encrypt_password加密的密码，为空时在当前线程加密
+        """
         # 加密密码
-        encrypted_password = self._encrypt_password(account_data.email_password)
+        if encrypted_password is None:
+            encrypted_password = self._encrypt_password(account_data.email_password)
         
-        db_account = EmailAccount(
-            user_id=user_id,
-            email_address=account_data.email_address,
-            email_password=encrypted_password,
-            smtp_server=account_data.smtp_server,
-            smtp_port=account_data.smtp_port,
-            imap_server=account_data.imap_server,
-            imap_port=account_data.imap_port,
-            is_ssl=account_data.is_ssl,
-            is_active=account_data.is_active,
-            connection_status=ConnectionStatus.UNKNOWN
-        )
+        account_id = self.db.execute(
+            pg_insert(EmailAccount)
+            .values(
+                user_id=user_id,
+                email_address=account_data.email_address,
+                email_password=encrypted_password,
+                smtp_server=account_data.smtp_server,
+                smtp_port=account_data.smtp_port,
+                imap_server=account_data.imap_server,
+                imap_port=account_data.imap_port,
+                is_ssl=account_data.is_ssl,
+                is_active=account_data.is_active,
+                connection_status=ConnectionStatus.UNKNOWN
+            )
+            .on_conflict_do_nothing(constraint='uq_email_accounts_user_email')
+            .returning(EmailAccount.id)
+        ).scalar()
+        
+        if account_id is None:
+            self.db.rollback()
+            raise ValueError("该邮箱地址已存在")
         
-        self.db.add(db_account)
         self.db.commit()
-        self.db.refresh(db_account)
-        return db_account
+        return self.get_email_account(account_id, user_id)
     
     def get_email_account(self, account_id: int, user_id: int) -> Optional[EmailAccount]:
         """获取单个邮箱账户"""
@@ -74,34 +120,42 @@ class EmailAccountService:
             and_(EmailAccount.id == account_id, EmailAccount.user_id == user_id)
         ).first()
     
+    @replica_reads
     def get_email_accounts(
         self, 
         user_id: int, 
         page: int = 1, 
         page_size: int = 20,
         is_active: Optional[bool] = None
-    ) -> Tuple[List[EmailAccount], int]:
-        """获取邮箱账户列表"""
-        query = self.db.query(EmailAccount).filter(EmailAccount.user_id == user_id)
+    ) -> Tuple[List[Row], int]:
+        """获取邮箱账户列表（只查询列表列，不读取邮箱密码，返回结果行）"""
+        filters = [EmailAccount.user_id == user_id]
         
         # 激活状态筛选
         if is_active is not None:
-            query = query.filter(EmailAccount.is_active == is_active)
-        
-        # 按创建时间倒序排序
-        query = query.order_by(EmailAccount.created_at.desc())
+            filters.append(EmailAccount.is_active == is_active)
         
         # 计算总数
-        total = query.count()
+        total = self.db.execute(select(func.count()).select_from(EmailAccount).where(*filters)).scalar()
         
-        # 分页
+        # 按创建时间倒序排序并分页
         offset = (page - 1) * page_size
-        accounts = query.offset(offset).limit(page_size).all()
+        accounts = self.db.execute(
+            select(*LIST_COLUMNS).where(*filters)
+            .order_by(EmailAccount.created_at.desc())
+            .offset(offset).limit(page_size)
+        ).all()
         
         return accounts, total
     
-    def update_email_account(self, account_id: int, account_data: EmailAccountUpdate, user_id: int) -> Optional[EmailAccount]:
-        """更新邮箱账户"""
+    def update_email_account(self, account_id: int, account_data: EmailAccountUpdate, user_id: int,
+                             encrypted_password: Optional[str] = None) -> Optional[EmailAccount]:
+        """
+        更新邮箱账户
+        
+        Args:
+            encrypted_password: 已由encrypt_password加密的新密码，为空时在当前线程加密
+        """
         db_account = self.get_email_account(account_id, user_id)
         if not db_account:
             return None
@@ -110,7 +164,7 @@ class EmailAccountService:
         
         # 如果更新密码，需要加密
         if 'email_password' in update_data:
-            update_data['email_password'] = self._encrypt_password(update_data['email_password'])
+            update_data['email_password'] = encrypted_password or self._encrypt_password(update_data['email_password'])
         
         for field, value in update_data.items():
             setattr(db_account, field, value)
@@ -199,8 +253,12 @@ class EmailAccountService:
                 test_time=datetime.now()
             )
     
-    def send_email(self, send_request: EmailSendRequest, user_id: int) -> EmailSendResponse:
-        """发送邮件"""
+    async def send_email(self, send_request: EmailSendRequest, user_id: int) -> EmailSendResponse:
+        """
+        发送邮件
+        
+        限流排队用asyncio.sleep等待，SMTP发送在线程中执行，都不阻塞事件循环
+        """
         db_account = self.get_email_account(send_request.email_account_id, user_id)
         if not db_account:
             return EmailSendResponse(
@@ -214,6 +272,24 @@ class EmailAccountService:
                 sent_time=datetime.now()
             )
         
+        # 按账户和收件人域名限流，令牌不足时排队，排队过久则延迟发送
+        all_recipients = list(send_request.to_emails)
+        all_recipients.extend(send_request.cc_emails or [])
+        all_recipients.extend(send_request.bcc_emails or [])
+        acquired, wait = await send_rate_limiter.acquire(db_account.id, all_recipients)
+        if not acquired:
+            return EmailSendResponse(
+                success=False,
+                email_account_id=send_request.email_account_id,
+                email_address=db_account.email_address,
+                sent_count=0,
+                failed_count=len(send_request.to_emails),
+                message_ids=[],
+                error_message=f"发送频率受限，邮件已延迟，请在{wait:.0f}秒后重试",
+                retry_after=round(wait, 3),
+                sent_time=datetime.now()
+            )
+        
         try:
             # 解密密码
             password = self._decrypt_password(db_account.email_password)
@@ -230,7 +306,8 @@ class EmailAccountService:
             )
             
             # 发送邮件
-            send_result = sdk.send_email(
+            send_result = await asyncio.to_thread(
+                sdk.send_email,
                 to_emails=send_request.to_emails,
                 subject=send_request.subject,
                 content=send_request.content,
@@ -262,6 +339,95 @@ class EmailAccountService:
                 sent_time=datetime.now()
             )
     
+    def send_batch_emails(self, batch_request: EmailBatchSendRequest, user_id: int) -> EmailBatchSendResponse:
+        """
+        批量发送邮件，所有邮件复用同一个SMTP会话
+        
+        限流等待和SMTP发送都是阻塞的，async路由应在线程池中调用
+        """
+        total = len(batch_request.messages)
+        db_account = self.get_email_account(batch_request.email_account_id, user_id)
+        if not db_account:
+            return EmailBatchSendResponse(
+                success=False,
+                email_account_id=batch_request.email_account_id,
+                email_address="",
+                total=total,
+                sent_count=0,
+                failed_count=total,
+                results=[],
+                error_message="邮箱账户不存在",
+                sent_time=datetime.now()
+            )
+        
+        # 每封邮件发送前按账户和收件人域名预占令牌，需要等待时由SDK等待（等待较久时先断开SMTP会话）
+        deferred = {}
+        
+        def throttle(index: int, message: dict) -> Tuple[Optional[str], float]:
+            recipients = list(message["to_emails"])
+            recipients.extend(message.get("cc_emails") or [])
+            recipients.extend(message.get("bcc_emails") or [])
+            acquired, wait = send_rate_limiter.reserve(db_account.id, recipients)
+            if acquired:
+                return None, wait
+            deferred[index] = round(wait, 3)
+            return f"发送频率受限，邮件已延迟，请在{wait:.0f}秒后重试", 0.0
+        
+        try:
+            sdk = self.create_sdk(db_account)
+            
+            send_result = sdk.send_batch(
+                [message.model_dump() for message in batch_request.messages],
+                before_send=throttle,
+                reconnect_after=settings.email_smtp_idle_reconnect
+            )
+            
+            results = [
+                EmailBatchSendResultItem(**result, retry_after=deferred.get(result["index"]))
+                for result in send_result["results"]
+            ]
+            
+            return EmailBatchSendResponse(
+                success=send_result["success"],
+                email_account_id=batch_request.email_account_id,
+                email_address=db_account.email_address,
+                total=total,
+                sent_count=send_result["sent_count"],
+                failed_count=send_result["failed_count"],
+                results=results,
+                error_message=send_result["error_message"],
+                sent_time=send_result["sent_time"]
+            )
+            
+        except Exception as e:
+            return EmailBatchSendResponse(
+                success=False,
+                email_account_id=batch_request.email_account_id,
+                email_address=db_account.email_address,
+                total=total,
+                sent_count=0,
+                failed_count=total,
+                results=[],
+                error_message=f"批量发送邮件失败: {str(e)}",
+                sent_time=datetime.now()
+            )
+    
+    def get_rate_limit_status(self, user_id: int) -> dict:
+        """获取当前用户邮箱账户及收件人域名的发送限流状态"""
+        account_ids = [
+            account_id for (account_id,) in
+            self.db.query(EmailAccount.id).filter(EmailAccount.user_id == user_id).all()
+        ]
+        return send_rate_limiter.get_status(account_ids)
+    
+    def get_idle_status(self, user_id: int) -> dict:
+        """获取当前用户邮箱账户的IDLE推送监听状态"""
+        account_ids = [
+            account_id for (account_id,) in
+            self.db.query(EmailAccount.id).filter(EmailAccount.user_id == user_id).all()
+        ]
+        return get_idle_supervisor().get_status(account_ids)
+    
     def get_connection_statistics(self, user_id: int) -> dict:
         """获取连接统计信息"""
         total_accounts = self.db.query(EmailAccount).filter(EmailAccount.user_id == user_id).count()
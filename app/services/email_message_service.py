@@ -0,0 +1,224 @@
+"""
+邮件往来记录服务层
+"""
+
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, delete
+from sqlalchemy.dialects.postgresql import insert
+from typing import List, Optional, Set, Tuple, Dict, Any, Iterable
+
+from ..core.database import replica_reads
+from ..models.email_account import EmailAccount
+from ..models.email_message import EmailMessage, EmailAttachment, MessageDirection
+from ..email.header_parser import normalize_address
+
+
+class EmailMessageService:
+    """邮件往来记录服务类"""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    @staticmethod
+    def build_record(db_account: EmailAccount, folder: str, uid_validity: Optional[int],
+                     header: Dict[str, Any]) -> Dict[str, Any]:
+        """将解析后的邮件头转换为email_messages记录"""
+        account_address = normalize_address(db_account.email_address)
+        to_addresses = header.get("to_addresses") or []
+        cc_addresses = header.get("cc_addresses") or []
+        
+        if header.get("from_address") == account_address:
+            direction = MessageDirection.SENT
+            counterpart = next((address for address in to_addresses + cc_addresses if address != account_address), None)
+        else:
+            direction = MessageDirection.RECEIVED
+            counterpart = header.get("from_address")
+        
+        return {
+            "user_id": db_account.user_id,
+            "email_account_id": db_account.id,
+            "folder": folder,
+            "uid_validity": uid_validity or 0,
+            "uid": header["uid"],
+            "message_id": (header.get("message_id") or "")[:998] or None,
+            "in_reply_to": (header.get("in_reply_to") or "")[:998] or None,
+            "subject": header.get("subject"),
+            "from_name": (header.get("from_name") or "")[:255] or None,
+            "from_address": (header.get("from_address") or "")[:255] or None,
+            "to_addresses": ",".join(to_addresses) or None,
+            "cc_addresses": ",".join(cc_addresses) or None,
+            "direction": direction.value,
+            "counterpart_address": (counterpart or "")[:255] or None,
+            "sent_at": header.get("date"),
+            "size": header.get("size")
+        }
+    
+    @staticmethod
+    def participant_addresses(row, account_address: Optional[str]) -> Set[str]:
+        """邮件的全部往来地址：发件人、所有收件人和抄送人，不含本账户地址"""
+        addresses = {row.from_address} if row.from_address else set()
+        for field in (row.to_addresses, row.cc_addresses):
+            if field:
+                addresses.update(field.split(","))
+        addresses.discard(account_address)
+        return addresses
+    
+    @classmethod
+    def summarize_activity(cls, rows: Iterable, account_address: Optional[str],
+                           delta: int = 1) -> List[Dict[str, Any]]:
+        """
+        按往来地址汇总邮件数和最近邮件时间
+        
+        每封邮件对发件人、每个收件人和抄送人（本账户地址除外）各计一次，
+        抄送的客户和第一个以外的收件人也会累计。
+        
+        Args:
+            rows: 包含from_address、to_addresses、cc_addresses、sent_at的记录
+            account_address: 本账户的规范化地址
+            delta: 每封邮件计数的增量，删除邮件时为-1（此时不汇总最近邮件时间）
+        """
+        activity = {}
+        for row in rows:
+            for address in cls.participant_addresses(row, account_address):
+                item = activity.setdefault(address, {"address": address, "count": 0, "last_time": None})
+                item["count"] += delta
+                if delta > 0 and row.sent_at and (item["last_time"] is None or row.sent_at > item["last_time"]):
+                    item["last_time"] = row.sent_at
+        return list(activity.values())
+    
+    def store_headers(self, db_account: EmailAccount, folder: str, uid_validity: Optional[int],
+                      headers: List[Dict[str, Any]]) -> list:
+        """
+        批量保存一批邮件头
+        
+        使用一条多行INSERT ... ON CONFLICT DO NOTHING，重复同步的邮件会被跳过。
+        不提交事务，由调用方与同步位置一起提交。
+        
+        Returns:
+            新插入记录的(id, from_address, to_addresses, cc_addresses, sent_at)
+        """
+        if not headers:
+            return []
+        records = [self.build_record(db_account, folder, uid_validity, header) for header in headers]
+        stmt = insert(EmailMessage).values(records).on_conflict_do_nothing(
+            constraint='uq_email_messages_account_folder_uid'
+        ).returning(
+            EmailMessage.id, EmailMessage.from_address, EmailMessage.to_addresses, EmailMessage.cc_addresses,
+            EmailMessage.sent_at
+        )
+        return self.db.execute(stmt).fetchall()
+    
+    def delete_folder_attachments(self, account_id: int, folder: str) -> List[str]:
+        """
+        删除某文件夹邮件的附件记录
+        
+        Returns:
+            被删除附件的对象存储key，由调用方在提交后删除对象
+        """
+        stmt = delete(EmailAttachment).where(
+            and_(
+                EmailAttachment.email_message_id == EmailMessage.id,
+                EmailMessage.email_account_id == account_id,
+                EmailMessage.folder == folder
+            )
+        ).returning(EmailAttachment.storage_key)
+        return [row.storage_key for row in self.db.execute(stmt)]
+    
+    def delete_folder_messages(self, account_id: int, folder: str) -> list:
+        """
+        删除某文件夹已保存的邮件（UIDVALIDITY变化时原UID全部失效）
+        
+        Returns:
+            被删除记录的(from_address, to_addresses, cc_addresses, sent_at)
+        """
+        stmt = delete(EmailMessage).where(
+            and_(EmailMessage.email_account_id == account_id, EmailMessage.folder == folder)
+        ).returning(
+            EmailMessage.from_address, EmailMessage.to_addresses, EmailMessage.cc_addresses, EmailMessage.sent_at
+        )
+        return self.db.execute(stmt).fetchall()
+    
+    def get_message(self, message_id: int, user_id: int) -> Optional[EmailMessage]:
+        """获取单封邮件"""
+        return self.db.query(EmailMessage).filter(
+            and_(EmailMessage.id == message_id, EmailMessage.user_id == user_id)
+        ).first()
+    
+    def save_body(self, message: EmailMessage, parsed: Dict[str, Any], bucket: str) -> EmailMessage:
+        """保存流式解析得到的正文和附件引用"""
+        from datetime import datetime
+        
+        message.body_text = parsed.get("text")
+        message.body_html = parsed.get("html")
+        message.body_truncated = bool(parsed.get("truncated"))
+        message.body_fetched_at = datetime.now()
+        message.attachments = [
+            EmailAttachment(
+                filename=attachment["filename"][:255],
+                content_type=(attachment.get("content_type") or "")[:255] or None,
+                content_id=(attachment.get("content_id") or "")[:255] or None,
+                size=attachment["size"],
+                storage_bucket=bucket,
+                storage_key=attachment["storage_key"]
+            )
+            for attachment in parsed.get("attachments", [])
+        ]
+        self.db.commit()
+        self.db.refresh(message)
+        return message
+    
+    @replica_reads
+    def get_messages(
+        self,
+        user_id: int,
+        page: int = 1,
+        page_size: int = 20,
+        email_account_id: Optional[int] = None,
+        counterpart: Optional[str] = None,
+        direction: Optional[MessageDirection] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> Tuple[List[EmailMessage], int]:
+        """获取邮件往来记录"""
+        from datetime import datetime
+        
+        query = self.db.query(EmailMessage).filter(EmailMessage.user_id == user_id)
+        
+        # 邮箱账户筛选
+        if email_account_id is not None:
+            query = query.filter(EmailMessage.email_account_id == email_account_id)
+        
+        # 往来对方筛选
+        if counterpart:
+            query = query.filter(EmailMessage.counterpart_address == normalize_address(counterpart))
+        
+        # 邮件方向筛选
+        if direction:
+            query = query.filter(EmailMessage.direction == direction)
+        
+        # 邮件时间筛选
+        if start_date:
+            try:
+                start_datetime = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
+                query = query.filter(EmailMessage.sent_at >= start_datetime)
+            except ValueError:
+                pass  # 忽略无效的日期格式
+        
+        if end_date:
+            try:
+                end_datetime = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
+                query = query.filter(EmailMessage.sent_at <= end_datetime)
+            except ValueError:
+                pass  # 忽略无效的日期格式
+        
+        # 按邮件时间倒序排序
+        query = query.order_by(EmailMessage.sent_at.desc().nullslast(), EmailMessage.id.desc())
+        
+        # 计算总数
+        total = query.count()
+        
+        # 分页
+        offset = (page - 1) * page_size
+        messages = query.offset(offset).limit(page_size).all()
+        
+        return messages, total
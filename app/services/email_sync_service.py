@@ -0,0 +1,241 @@
+"""
+邮件同步服务层
+"""
+
+from sqlalchemy.orm import Session
+from sqlalchemy import and_
+from sqlalchemy.dialects.postgresql import insert
+from typing import Optional, Dict, Any
+from datetime import datetime
+import logging
+import re
+
+from ..core.config import settings
+from ..core.storage import object_storage
+from ..email.header_parser import normalize_address
+from ..email.mime_stream import SpooledAttachment
+from ..models.email_account import EmailAccount
+from ..models.email_message import EmailMessage
+from ..models.email_sync import EmailSyncState, EmailHeaderItem, EmailSyncResponse
+from .email_account_service import EmailAccountService
+from .email_message_service import EmailMessageService
+from .customer_service import CustomerService
+
+logger = logging.getLogger(__name__)
+
+
+class EmailSyncService:
+    """邮件同步服务类
+    
+    基于UID的增量同步：每个账户每个文件夹记录UIDVALIDITY和已同步的最大UID，
+    每次只获取新UID的邮件头并保存到email_messages，同时增量更新客户邮件计数；
+    UIDVALIDITY变化时从头重新同步。
+    """
+    
+    def __init__(self, db: Session):
+        self.db = db
+        self.message_service = EmailMessageService(db)
+        self.customer_service = CustomerService(db)
+    
+    def get_sync_state(self, account_id: int, folder: str) -> Optional[EmailSyncState]:
+        """获取同步状态"""
+        return self.db.query(EmailSyncState).filter(
+            and_(EmailSyncState.email_account_id == account_id, EmailSyncState.folder == folder)
+        ).first()
+    
+    def _get_or_create_sync_state(self, account_id: int, folder: str) -> EmailSyncState:
+        """获取同步状态，不存在时创建（与并发的同步同时创建时以先提交的为准）"""
+        state = self.get_sync_state(account_id, folder)
+        if state is None:
+            self.db.execute(
+                insert(EmailSyncState)
+                .values(email_account_id=account_id, folder=folder, last_uid=0)
+                .on_conflict_do_nothing(constraint='uq_email_sync_states_account_folder')
+            )
+            # 立即提交，同步失败回滚时保留同步状态
+            self.db.commit()
+            state = self.get_sync_state(account_id, folder)
+        return state
+    
+    def _reset_folder(self, db_account: EmailAccount, state: EmailSyncState, uid_validity: Optional[int]):
+        """UIDVALIDITY变化，原有UID全部失效，从头重新同步"""
+        logger.info(
+            f"邮箱 {db_account.email_address} 文件夹 {state.folder} UIDVALIDITY变化: "
+            f"{state.uid_validity} -> {uid_validity}，重新同步"
+        )
+        attachment_keys = self.message_service.delete_folder_attachments(db_account.id, state.folder)
+        deleted = self.message_service.delete_folder_messages(db_account.id, state.folder)
+        # 扣除已删除邮件的客户计数，重新同步时会再次累加
+        self.customer_service.apply_email_activity(
+            db_account.user_id, self.message_service.summarize_activity(
+                deleted, normalize_address(db_account.email_address), delta=-1
+            )
+        )
+        state.uid_validity = uid_validity
+        state.last_uid = 0
+        self.db.commit()
+        self._delete_attachment_objects(attachment_keys)
+    
+    @staticmethod
+    def _delete_attachment_objects(keys: list):
+        """删除对象存储中的附件，失败只记录日志"""
+        if not keys:
+            return
+        try:
+            object_storage.delete_objects(keys)
+        except Exception as e:
+            logger.warning(f"删除附件对象失败（{len(keys)}个）: {str(e)}")
+    
+    def sync_folder(self, account_id: int, user_id: int, folder: str = "INBOX",
+                    return_messages: bool = True) -> EmailSyncResponse:
+        """增量同步邮箱文件夹"""
+        account_service = EmailAccountService(self.db)
+        db_account = account_service.get_email_account(account_id, user_id)
+        if not db_account:
+            return EmailSyncResponse(
+                success=False,
+                email_account_id=account_id,
+                folder=folder,
+                error_message="邮箱账户不存在",
+                sync_time=datetime.now()
+            )
+        
+        state = self._get_or_create_sync_state(account_id, folder)
+        messages = []
+        new_count = 0
+        failed_uids = []
+        uid_validity_reset = False
+        server = None
+        
+        try:
+            sdk = account_service.create_sdk(db_account)
+            server = sdk.create_imap_connection()
+            mailbox = sdk.select_folder(server, folder)
+            
+            if state.uid_validity != mailbox["uid_validity"]:
+                uid_validity_reset = state.uid_validity is not None
+                self._reset_folder(db_account, state, mailbox["uid_validity"])
+            
+            # 逐批获取并在每批后提交同步位置，中断后可从断点继续
+            for uids, headers in sdk.iter_new_headers(server, state.last_uid, settings.email_sync_batch_size):
+                # 获取或解析失败的UID记录后跳过，同步位置仍推进到本批请求的最大UID，不会反复重试
+                failed = sorted(set(uids) - {header["uid"] for header in headers})
+                if failed:
+                    logger.warning(
+                        f"邮箱 {db_account.email_address} 文件夹 {folder} 有{len(failed)}封邮件头获取失败，"
+                        f"已跳过: UID {', '.join(map(str, failed[:20]))}"
+                    )
+                    failed_uids.extend(failed)
+                inserted = self.message_service.store_headers(db_account, folder, state.uid_validity, headers)
+                # 新邮件增量更新客户邮件计数和最近沟通时间
+                self.customer_service.apply_email_activity(
+                    db_account.user_id, self.message_service.summarize_activity(
+                        inserted, normalize_address(db_account.email_address)
+                    )
+                )
+                state.last_uid = max(state.last_uid, uids[-1])
+                state.last_synced_at = datetime.now()
+                self.db.commit()
+                
+                new_count += len(headers)
+                if return_messages:
+                    messages.extend(
+                        EmailHeaderItem(
+                            uid=header["uid"],
+                            message_id=header["message_id"],
+                            in_reply_to=header["in_reply_to"],
+                            subject=header["subject"],
+                            from_address=header["from"],
+                            to_address=header["to"],
+                            date=header["date"],
+                            size=header["size"]
+                        )
+                        for header in headers
+                    )
+            
+            state.last_synced_at = datetime.now()
+            self.db.commit()
+            server.logout()
+            
+            return EmailSyncResponse(
+                success=True,
+                email_account_id=account_id,
+                folder=folder,
+                uid_validity=state.uid_validity,
+                last_uid=state.last_uid,
+                new_count=new_count,
+                failed_uids=failed_uids,
+                uid_validity_reset=uid_validity_reset,
+                messages=messages,
+                sync_time=datetime.now()
+            )
+        
+        except Exception as e:
+            error_msg = f"同步邮件失败: {str(e)}"
+            logger.error(error_msg)
+            self.db.rollback()
+            if server is not None:
+                try:
+                    server.logout()
+                except Exception:
+                    pass
+            return EmailSyncResponse(
+                success=False,
+                email_account_id=account_id,
+                folder=folder,
+                uid_validity=state.uid_validity,
+                last_uid=state.last_uid or 0,
+                new_count=new_count,
+                failed_uids=failed_uids,
+                uid_validity_reset=uid_validity_reset,
+                messages=messages,
+                error_message=error_msg,
+                sync_time=datetime.now()
+            )
+    
+    def fetch_message_body(self, message_id: int, user_id: int) -> Optional[EmailMessage]:
+        """
+        按需获取邮件正文
+        
+        从IMAP分段读取完整邮件并流式解析：正文保存到email_messages，
+        附件解码后直接上传到对象存储，数据库只保存附件引用。已获取过的邮件直接返回。
+        """
+        message = self.message_service.get_message(message_id, user_id)
+        if not message or message.body_fetched_at is not None:
+            return message
+        
+        account_service = EmailAccountService(self.db)
+        db_account = account_service.get_email_account(message.email_account_id, user_id)
+        if not db_account:
+            return None
+        
+        key_prefix = f"email-attachments/{user_id}/{db_account.id}/{message.id}/"
+        uploaded_keys = []
+        
+        def upload(fileobj, info: Dict[str, Any]) -> str:
+            filename = re.sub(r'[\\/\x00-\x1f]+', '_', info["filename"])[-200:]
+            key = object_storage.upload_fileobj(
+                fileobj, f"{key_prefix}{info['index']}-{filename}", info.get("content_type")
+            )
+            uploaded_keys.append(key)
+            return key
+        
+        def attachment_sink(info: Dict[str, Any]) -> SpooledAttachment:
+            return SpooledAttachment(info, upload, settings.email_attachment_spool_size)
+        
+        try:
+            sdk = account_service.create_sdk(db_account)
+            parsed = sdk.fetch_message(
+                message.uid,
+                attachment_sink,
+                folder=message.folder,
+                uid_validity=message.uid_validity or None,
+                chunk_size=settings.email_body_fetch_chunk_size,
+                max_text_size=settings.email_body_max_text_size
+            )
+            return self.message_service.save_body(message, parsed, object_storage.bucket_name)
+        except Exception:
+            # 解析或保存失败时清理已上传的附件，避免对象存储中留下无引用的文件
+            self.db.rollback()
+            self._delete_attachment_objects(uploaded_keys)
+            raise
@@ -4,10 +4,11 @@
 
 import re
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, select, func, Row
 from typing import List, Optional, Tuple, Dict, Any
 import math
 
+from ..core.database import replica_reads
 from ..models.email_template import (
     EmailTemplate, EmailTemplateCreate, EmailTemplateUpdate,
     EmailTemplateRenderRequest, EmailTemplateRenderResponse,
@@ -15,6 +16,12 @@ from ..models.email_template import (
 )
 from ..models.contact import Contact
 
+# 列表列（EmailTemplateResponse的字段）
+LIST_COLUMNS = (
+    EmailTemplate.id, EmailTemplate.user_id, EmailTemplate.title, EmailTemplate.content,
+    EmailTemplate.created_at, EmailTemplate.updated_at
+)
+
 
 class EmailTemplateService:
     """邮件模板服务类"""
@@ -40,33 +47,34 @@ class EmailTemplateService:
             and_(EmailTemplate.id == template_id, EmailTemplate.user_id == user_id)
         ).first()
     
+    @replica_reads
     def get_templates(
         self, 
         user_id: int, 
         page: int = 1, 
         page_size: int = 20,
         search_query: Optional[str] = None
-    ) -> Tuple[List[EmailTemplate], int]:
-        """获取邮件模板列表"""
-        query = self.db.query(EmailTemplate).filter(EmailTemplate.user_id == user_id)
+    ) -> Tuple[List[Row], int]:
+        """获取邮件模板列表（只查询列表列，返回结果行）"""
+        filters = [EmailTemplate.user_id == user_id]
         
         # 搜索功能
         if search_query:
-            search_filter = or_(
+            filters.append(or_(
                 EmailTemplate.title.ilike(f"%{search_query}%"),
                 EmailTemplate.content.ilike(f"%{search_query}%")
-            )
-            query = query.filter(search_filter)
-        
-        # 按创建时间倒序排序
-        query = query.order_by(EmailTemplate.created_at.desc())
+            ))
         
         # 计算总数
-        total = query.count()
+        total = self.db.execute(select(func.count()).select_from(EmailTemplate).where(*filters)).scalar()
         
-        # 分页
+        # 按创建时间倒序排序并分页
         offset = (page - 1) * page_size
-        templates = query.offset(offset).limit(page_size).all()
+        templates = self.db.execute(
+            select(*LIST_COLUMNS).where(*filters)
+            .order_by(EmailTemplate.created_at.desc())
+            .offset(offset).limit(page_size)
+        ).all()
         
         return templates, total
     
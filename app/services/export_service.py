@@ -0,0 +1,160 @@
+"""
+数据导出服务层
+将逐行读取的查询结果编码为CSV、NDJSON或Parquet数据块，配合StreamingResponse边查边传
+"""
+
+from sqlalchemy.orm import Session
+from typing import List, Optional, Tuple, Dict, Any, Iterator, Callable
+from datetime import datetime
+from enum import Enum
+import csv
+import io
+import json
+import logging
+
+from ..core.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class ExportFormat(str, Enum):
+    """导出格式枚举"""
+    CSV = "csv"
+    NDJSON = "ndjson"
+    PARQUET = "parquet"
+
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.CSV: "text/csv; charset=utf-8",
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.PARQUET: "application/vnd.apache.parquet",
+}
+
+
+def get_export_fields(columns, overrides: Optional[Dict[str, type]] = None) -> List[Tuple[str, type]]:
+    """根据查询列生成导出字段[(字段名, Python类型)]，overrides用于覆盖读取后被转换的字段"""
+    overrides = overrides or {}
+    return [(col.key, overrides.get(col.key, col.type.python_type)) for col in columns]
+
+
+def get_export_filename(prefix: str, file_format: ExportFormat) -> str:
+    """导出文件名，如contacts-20250101-120000.csv"""
+    return f"{prefix}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{file_format.value}"
+
+
+def _iter_csv(rows: Iterator[Dict[str, Any]], fields: List[Tuple[str, type]], flush_rows: int) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # 带BOM，Excel可以直接识别UTF-8
+    buffer.write("\ufeff")
+    writer.writerow([name for name, _ in fields])
+    for count, row in enumerate(rows, start=1):
+        writer.writerow([
+            ",".join(value) if isinstance(value, list)
+            else value.isoformat() if isinstance(value, datetime)
+            else "" if value is None else value
+            for value in (row[name] for name, _ in fields)
+        ])
+        if count % flush_rows == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def _iter_ndjson(rows: Iterator[Dict[str, Any]], fields: List[Tuple[str, type]], flush_rows: int) -> Iterator[bytes]:
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(
+            {name: row[name].isoformat() if isinstance(row[name], datetime) else row[name] for name, _ in fields},
+            ensure_ascii=False
+        ))
+        if len(lines) >= flush_rows:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class _ChunkSink:
+    """Parquet写入目标：只记录写入位置，已写入的数据随时取走，不保留整个文件"""
+    
+    def __init__(self):
+        self.position = 0
+        self.closed = False
+        self._chunks = []
+    
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self.position += len(data)
+        return len(data)
+    
+    def tell(self) -> int:
+        return self.position
+    
+    def flush(self):
+        pass
+    
+    def close(self):
+        self.closed = True
+    
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _iter_parquet(rows: Iterator[Dict[str, Any]], fields: List[Tuple[str, type]], flush_rows: int) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    arrow_types = {
+        int: pa.int64(), float: pa.float64(), bool: pa.bool_(), str: pa.string(),
+        datetime: pa.timestamp("us", tz="UTC"), list: pa.list_(pa.string()),
+    }
+    schema = pa.schema([(name, arrow_types.get(python_type, pa.string())) for name, python_type in fields])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    
+    def write_batch(batch: List[Dict[str, Any]]) -> bytes:
+        # 每批写成一个row group，写完即可把数据发送出去
+        writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+        return sink.drain()
+    
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= flush_rows:
+            yield write_batch(batch)
+            batch = []
+    if batch:
+        yield write_batch(batch)
+    writer.close()
+    yield sink.drain()
+
+
+def stream_export(row_factory: Callable[[Session], Iterator[Dict[str, Any]]], fields: List[Tuple[str, type]],
+                  file_format: ExportFormat, flush_rows: int = 1000) -> Iterator[bytes]:
+    """
+    流式导出
+    
+    响应发送期间使用独立的数据库会话（请求依赖的会话此时可能已经关闭），
+    row_factory在该会话上返回逐行读取的数据
+    
+    Args:
+        row_factory: 根据数据库会话返回行迭代器
+        fields: 导出字段[(字段名, Python类型)]
+        file_format: 导出格式
+        flush_rows: 每多少行输出一个数据块（Parquet为每个row group的行数）
+    """
+    encoders = {ExportFormat.CSV: _iter_csv, ExportFormat.NDJSON: _iter_ndjson, ExportFormat.PARQUET: _iter_parquet}
+    db = SessionLocal()
+    try:
+        yield from encoders[file_format](row_factory(db), fields, flush_rows)
+    except Exception as e:
+        # 响应头已经发出，只能中断输出
+        logger.error(f"导出失败: {str(e)}")
+        raise
+    finally:
+        db.close()
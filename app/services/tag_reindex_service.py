@@ -0,0 +1,131 @@
+"""
+旧版标签转换服务
+把联系人tags列中按名称存储的旧版标签JSON分批转换为标签关联
+
+命令行执行（处理所有用户，完成后退出）：python -m app.services.tag_reindex_service
+"""
+
+from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime
+import threading
+import time
+import logging
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..models.contact import Contact, TagReindexStatus, parse_legacy_tags
+from .contact_service import ContactService
+
+logger = logging.getLogger(__name__)
+
+
+def reindex_batch(db: Session, last_id: int, batch_size: int) -> Tuple[int, Optional[int], int]:
+    """
+    转换一批联系人的旧版标签（提交事务）
+    
+    按主键顺序取id大于last_id的一批联系人，只锁定本批行；
+    已被其他事务锁定的行跳过（SKIP LOCKED），由下一轮转换处理
+    
+    Returns:
+        (转换的联系人数, 本批最大联系人ID（没有更多数据时为None）, 新建的标签数)
+    """
+    rows = db.execute(
+        select(Contact.id, Contact.user_id, Contact.tags)
+        .where(Contact.tags.isnot(None), Contact.id > last_id)
+        .order_by(Contact.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not rows:
+        db.rollback()
+        return 0, None, 0
+    
+    by_user: Dict[int, List[Tuple[int, List[str]]]] = {}
+    for contact_id, user_id, tags in rows:
+        by_user.setdefault(user_id, []).append((contact_id, parse_legacy_tags(tags)))
+    
+    contact_service = ContactService(db)
+    created_count = 0
+    for user_id, contact_tags in by_user.items():
+        created_count += contact_service.set_contact_tags(user_id, contact_tags)
+    
+    # 只是存储方式的转换，保留联系人原有的更新时间
+    db.execute(
+        update(Contact)
+        .where(Contact.user_id.in_(list(by_user)), Contact.id.in_([row.id for row in rows]))
+        .values(tags=None, updated_at=Contact.updated_at),
+        execution_options={"synchronize_session": False}
+    )
+    db.commit()
+    return len(rows), rows[-1].id, created_count
+
+
+class TagReindexer:
+    """旧版标签转换任务：在后台线程中按主键分批转换，同一时间只运行一个"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.status = TagReindexStatus(status="idle")
+    
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+    
+    def start(self) -> bool:
+        """启动转换任务，已在运行时返回False"""
+        with self._lock:
+            if self.is_running():
+                return False
+            self.status = TagReindexStatus(status="running", started_at=datetime.now())
+            self._thread = threading.Thread(target=self.run, name="tag-reindex", daemon=True)
+            self._thread.start()
+        return True
+    
+    def run(self):
+        """
+        执行转换
+        
+        每一轮从头按主键扫描一遍；被跳过的锁定行和扫描期间新写入的旧版数据留给下一轮，
+        直到某一轮没有转换任何联系人
+        """
+        status = self.status
+        db = SessionLocal()
+        try:
+            while True:
+                converted_in_pass = 0
+                last_id = 0
+                while True:
+                    converted, last_id, created = reindex_batch(db, last_id, settings.tag_reindex_batch_size)
+                    if last_id is None:
+                        break
+                    converted_in_pass += converted
+                    status.processed_contacts += converted
+                    status.created_tags += created
+                    status.batches += 1
+                    time.sleep(settings.tag_reindex_pause)
+                if converted_in_pass == 0:
+                    break
+            status.status = "completed"
+            logger.info(f"旧版标签转换完成，共转换{status.processed_contacts}个联系人")
+        except Exception as e:
+            db.rollback()
+            logger.error(f"旧版标签转换失败: {str(e)}")
+            status.status = "failed"
+            status.error_message = str(e)
+        finally:
+            db.close()
+            status.finished_at = datetime.now()
+
+
+# 全局旧版标签转换任务
+tag_reindexer = TagReindexer()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    tag_reindexer.status = TagReindexStatus(status="running", started_at=datetime.now())
+    tag_reindexer.run()
+    print(tag_reindexer.status.model_dump_json())
+    raise SystemExit(0 if tag_reindexer.status.status == "completed" else 1)
@@ -3,14 +3,21 @@
 """
 
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from typing import List, Optional
+from sqlalchemy import and_, case, cast, delete, exists, func, select, update, Text
+from sqlalchemy.dialects.postgresql import JSONB, aggregate_order_by, insert
+from typing import List, Optional, Dict, Iterable, Tuple
 
-from ..models.contact import ContactTag, ContactTagCreate, ContactTagUpdate
+from ..core.database import replica_reads
+from ..models.contact import Contact, ContactTag, ContactTagCreate, ContactTagUpdate, contact_tag_association
 
 
 class TagService:
-    """标签服务类"""
+    """标签服务类
+    
+    联系人通过contact_tag_associations按标签ID引用标签，
+    重命名和删除标签修改标签本身（删除时一并删除关联），
+    并用一条UPDATE改写该用户尚未转换的旧版标签JSON中的同名标签，避免旧名称继续显示或被标签转换重新创建。
+    """
     
     def __init__(self, db: Session):
         self.db = db
@@ -19,8 +26,6 @@ class TagService:
         """创建标签"""
         db_tag = ContactTag(
             name=tag_data.name,
-            color=tag_data.color,
-            description=tag_data.description,
             user_id=user_id
         )
         self.db.add(db_tag)
@@ -34,17 +39,20 @@ class TagService:
             and_(ContactTag.id == tag_id, ContactTag.user_id == user_id)
         ).first()
     
+    @replica_reads
     def get_tags(self, user_id: int) -> List[ContactTag]:
         """获取用户的所有标签"""
         return self.db.query(ContactTag).filter(ContactTag.user_id == user_id).all()
     
     def update_tag(self, tag_id: int, tag_data: ContactTagUpdate, user_id: int) -> Optional[ContactTag]:
-        """更新标签"""
+        """更新标签（联系人通过ID引用自动生效，旧版标签JSON中的旧名称一并改写）"""
         db_tag = self.get_tag(tag_id, user_id)
         if not db_tag:
             return None
         
-        update_data = tag_data.dict(exclude_unset=True)
+        update_data = tag_data.model_dump(exclude_unset=True)
+        if update_data.get("name") and update_data["name"] != db_tag.name:
+            self.rewrite_legacy_tags(user_id, db_tag.name, update_data["name"])
         for field, value in update_data.items():
             setattr(db_tag, field, value)
         
@@ -53,17 +61,96 @@ class TagService:
         return db_tag
     
     def delete_tag(self, tag_id: int, user_id: int) -> bool:
-        """删除标签"""
+        """删除标签及其联系人关联"""
         db_tag = self.get_tag(tag_id, user_id)
         if not db_tag:
             return False
         
+        self.db.execute(delete(contact_tag_association).where(contact_tag_association.c.tag_id == tag_id))
+        self.rewrite_legacy_tags(user_id, db_tag.name)
         self.db.delete(db_tag)
         self.db.commit()
         return True
     
+    def rewrite_legacy_tags(self, user_id: int, name: str, new_name: Optional[str] = None,
+                            filters: Iterable = ()) -> List[int]:
+        """
+        在尚未转换的旧版标签JSON中删除或重命名标签（不提交事务）
+        
+        按名称匹配不区分大小写（与标签筛选一致），用一条UPDATE按集合改写，保持其余标签的顺序；
+        删除后数组为空时置为NULL
+        
+        Args:
+            name: 要删除或重命名的标签名
+            new_name: 新名称，为空时删除
+            filters: 额外的联系人筛选条件（如批量移除标签的目标联系人）
+        
+        Returns:
+            被改写的联系人ID
+        """
+        legacy_tags = cast(Contact.tags, JSONB)
+        
+        def elements():
+            return func.jsonb_array_elements_text(legacy_tags).table_valued(
+                "value", with_ordinality="ordinality"
+            ).render_derived()
+        
+        matched = elements()
+        remaining = elements()
+        is_match = func.lower(remaining.c.value) == name.lower()
+        value = remaining.c.value if new_name is None else case((is_match, new_name), else_=remaining.c.value)
+        rewritten = select(
+            func.jsonb_agg(aggregate_order_by(value, remaining.c.ordinality))
+        ).select_from(remaining)
+        if new_name is None:
+            rewritten = rewritten.where(~is_match)
+        rewritten = func.coalesce(rewritten.scalar_subquery(), func.jsonb_build_array())
+        
+        return list(self.db.execute(
+            update(Contact)
+            .where(
+                Contact.user_id == user_id,
+                Contact.tags.isnot(None),
+                *filters,
+                exists(select(1).select_from(matched).where(func.lower(matched.c.value) == name.lower()))
+            )
+            .values(tags=func.nullif(cast(rewritten, Text), '[]'))
+            .returning(Contact.id)
+            .execution_options(synchronize_session=False)
+        ).scalars())
+    
     def get_tag_by_name(self, name: str, user_id: int) -> Optional[ContactTag]:
         """根据名称获取标签"""
         return self.db.query(ContactTag).filter(
             and_(ContactTag.name == name, ContactTag.user_id == user_id)
         ).first()
+    
+    @staticmethod
+    def normalize_names(names: Iterable[str]) -> List[str]:
+        """去除空白和重复的标签名，保持原有顺序"""
+        return list(dict.fromkeys(name.strip() for name in names if name and name.strip()))
+    
+    def resolve_tag_ids(self, user_id: int, names: Iterable[str]) -> Tuple[Dict[str, int], int]:
+        """
+        按名称获取标签ID，不存在的标签自动创建（不提交事务）
+        
+        Returns:
+            ({标签名: 标签ID}, 新建的标签数)
+        """
+        names = self.normalize_names(names)
+        if not names:
+            return {}, 0
+        
+        created = self.db.execute(
+            insert(ContactTag)
+            .values([{"user_id": user_id, "name": name} for name in names])
+            .on_conflict_do_nothing(constraint='uq_contact_tags_user_name')
+            .returning(ContactTag.id)
+        ).fetchall()
+        
+        tag_ids = dict(self.db.execute(
+            select(ContactTag.name, ContactTag.id).where(
+                and_(ContactTag.user_id == user_id, ContactTag.name.in_(names))
+            )
+        ).all())
+        return tag_ids, len(created)
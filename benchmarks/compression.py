@@ -0,0 +1,94 @@
+"""
+响应压缩基准测试：联系人列表和批量预览接口在不同编码、压缩档位下的传输字节数和耗时
+
+用法（在项目根目录执行，使用DATABASE_URL指向的数据库）：
+    python benchmarks/compression.py --requests 50 --bandwidth 10
+
+联系人数据可先用 benchmarks/contacts_list.py --seed 1000 生成；批量预览使用当前用户的前100个联系人
+和名为bench-compression的模板（不存在时创建）。
+服务端耗时为进程内调用的平均耗时（含压缩），传输耗时按--bandwidth（Mbit/s）估算。
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 由本脚本按不同档位包装压缩中间件
+os.environ["COMPRESSION_ENABLED"] = "false"
+
+from fastapi.testclient import TestClient
+
+from app.core.compression import COMPRESSION_PROFILES, CompressionMiddleware, brotli
+from app.main import app
+
+TEMPLATE_TITLE = "bench-compression"
+TEMPLATE_CONTENT = (
+    "Dear {{first_name}} {{last_name}},\n\n"
+    "I'm reaching out from our sweetener team regarding {{company}} ({{domain}}). "
+    "As {{position}}, you may be interested in our stevia and erythritol blends for beverages and bakery. "
+    "We would be glad to send samples and a quotation.\n\nBest regards"
+)
+
+
+def prepare_batch_preview(client: TestClient) -> dict:
+    """批量预览请求：当前用户的前100个联系人和基准测试模板"""
+    contacts = client.get("/contacts/?page_size=100").json()["contacts"]
+    if not contacts:
+        sys.exit("没有联系人，请先执行 python benchmarks/contacts_list.py --seed 1000")
+    templates = client.get(f"/email-templates/?search={TEMPLATE_TITLE}").json()["templates"]
+    if templates:
+        template_id = templates[0]["id"]
+    else:
+        template_id = client.post("/email-templates/", json={"title": TEMPLATE_TITLE, "content": TEMPLATE_CONTENT}).json()["id"]
+    return {"template_id": template_id, "contact_ids": [contact["id"] for contact in contacts]}
+
+
+def measure(client: TestClient, method: str, url: str, body, accept_encoding: str, requests: int):
+    """平均服务端耗时、传输字节数和解压后字节数"""
+    headers = {"Accept-Encoding": accept_encoding}
+    response = client.request(method, url, json=body, headers=headers)
+    response.raise_for_status()
+    
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.request(method, url, json=body, headers=headers)
+    elapsed = (time.perf_counter() - started) / requests
+    return elapsed, response.num_bytes_downloaded, len(response.content), response.headers.get("content-encoding", "identity")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="响应压缩基准测试")
+    parser.add_argument("--requests", type=int, default=50, help="每种组合的请求次数")
+    parser.add_argument("--bandwidth", type=float, default=10, help="估算传输耗时使用的带宽（Mbit/s）")
+    parser.add_argument("--minimum-size", type=int, default=1024, help="压缩的最小响应字节数")
+    args = parser.parse_args()
+    
+    preview = prepare_batch_preview(TestClient(app))
+    endpoints = [
+        ("GET /contacts/?page_size=100", "GET", "/contacts/?page_size=100", None),
+        (f"POST /email-templates/batch-preview（{len(preview['contact_ids'])}个联系人）",
+         "POST", "/email-templates/batch-preview", preview),
+    ]
+    encodings = ["gzip"] + (["br"] if brotli is not None else [])
+    if brotli is None:
+        print("未安装brotli，只测试gzip")
+    
+    for label, method, url, body in endpoints:
+        print(label)
+        print(f"  {'编码':<10}{'档位':<10}{'传输字节':>10}{'压缩率':>8}{'服务端ms':>10}{'估算总耗时ms':>14}")
+        cases = [("identity", None)] + [(encoding, profile) for encoding in encodings for profile in COMPRESSION_PROFILES]
+        raw_size = None
+        for encoding, profile in cases:
+            wrapped = CompressionMiddleware(app, minimum_size=args.minimum_size, profile=profile or "balanced")
+            client = TestClient(wrapped)
+            elapsed, wire, size, used = measure(client, method, url, body, encoding, args.requests)
+            raw_size = raw_size or size
+            transfer = wire * 8 / (args.bandwidth * 1_000_000)
+            print(f"  {used:<10}{profile or '-':<10}{wire:>10}{wire / raw_size:>8.1%}"
+                  f"{elapsed * 1000:>10.2f}{(elapsed + transfer) * 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+联系人列表接口基准测试：GET /contacts/?page_size=100
+
+用法（在项目根目录执行，使用DATABASE_URL指向的数据库）：
+    python benchmarks/contacts_list.py --seed 1000 --requests 200
+
+--seed 为当前用户（id=1）补足指定数量的测试联系人（邮箱为bench-*@example.com，每个联系人带两个标签），
+可重复执行；--cleanup 删除这些测试数据。
+除接口吞吐量外，还对同一页数据分别测量查询ORM对象、逐个构建Pydantic模型再序列化（旧路径）
+与列投影查询、按响应字段整列构建并用orjson序列化（当前路径）的耗时和内存分配。
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app.core.database import SessionLocal
+from app.core.responses import dumps, response_rows
+from app.main import app
+from app.models.contact import Contact, ContactListResponse, ContactResponse
+from app.services.contact_service import ContactService, LIST_FIELDS
+
+USER_ID = 1
+PAGE_SIZE = 100
+BENCH_TAGS = ["bench-vip", "bench-lead"]
+
+
+def seed(count: int):
+    """补足测试联系人并关联标签"""
+    db = SessionLocal()
+    try:
+        db.execute(text(
+            "INSERT INTO users (id, username, email, hashed_password, is_active, is_admin) "
+            "VALUES (:id, 'demo_user', 'demo@example.com', '', true, false) ON CONFLICT DO NOTHING"
+        ), {"id": USER_ID})
+        db.execute(text(
+            "INSERT INTO contacts (user_id, name, first_name, last_name, email, company, domain, position, created_at) "
+            "SELECT :user_id, 'Bench ' || n, 'Bench', 'User ' || n, 'bench-' || n || '@example.com', "
+            "'Bench Company ' || (n % 50), 'bench' || (n % 50) || '.example.com', 'Buyer', now() "
+            "FROM generate_series(1, :count) AS n ON CONFLICT DO NOTHING"
+        ), {"user_id": USER_ID, "count": count})
+        for name in BENCH_TAGS:
+            db.execute(text(
+                "INSERT INTO contact_tags (user_id, name) VALUES (:user_id, :name) ON CONFLICT DO NOTHING"
+            ), {"user_id": USER_ID, "name": name})
+        db.execute(text(
+            "INSERT INTO contact_tag_associations (contact_id, tag_id) "
+            "SELECT c.id, t.id FROM contacts c JOIN contact_tags t ON t.user_id = c.user_id "
+            "WHERE c.user_id = :user_id AND c.email LIKE 'bench-%' AND t.name = ANY(:tags) "
+            "ON CONFLICT DO NOTHING"
+        ), {"user_id": USER_ID, "tags": BENCH_TAGS})
+        db.commit()
+    finally:
+        db.close()
+
+
+def cleanup():
+    """删除测试联系人和标签"""
+    db = SessionLocal()
+    try:
+        db.execute(text("DELETE FROM contacts WHERE user_id = :user_id AND email LIKE 'bench-%'"), {"user_id": USER_ID})
+        db.execute(text("DELETE FROM contact_tags WHERE user_id = :user_id AND name = ANY(:tags)"),
+                   {"user_id": USER_ID, "tags": BENCH_TAGS})
+        db.commit()
+    finally:
+        db.close()
+
+
+def bench_endpoint(requests: int):
+    """接口吞吐量（进程内调用，包含查询、序列化和ASGI开销）"""
+    client = TestClient(app)
+    url = f"/contacts/?page_size={PAGE_SIZE}"
+    response = client.get(url)
+    response.raise_for_status()
+    
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.get(url)
+    elapsed = time.perf_counter() - started
+    
+    print(f"GET {url}: {len(response.json()['contacts'])}条/页, {len(response.content)}字节")
+    print(f"  {requests}次请求 {elapsed:.2f}s, {requests / elapsed:.1f} req/s, 平均{elapsed / requests * 1000:.2f}ms")
+
+
+def bench_page_build(rounds: int):
+    """同一页数据两种方式（含查询）的耗时和内存分配"""
+    db = SessionLocal()
+    service = ContactService(db)
+    try:
+        def orm_path():
+            # 旧路径：查询ORM对象，逐个构建Pydantic模型，response_model再次校验后序列化
+            contacts = (db.query(Contact).filter(Contact.user_id == USER_ID)
+                        .order_by(Contact.created_at.desc()).limit(PAGE_SIZE).all())
+            items = []
+            for contact in contacts:
+                tag_names = contact.tag_names
+                items.append(ContactResponse(
+                    id=contact.id, user_id=contact.user_id, name=contact.name,
+                    first_name=contact.first_name, last_name=contact.last_name, email=contact.email,
+                    company=contact.company, domain=contact.domain, position=contact.position,
+                    tag_names=tag_names, created_at=contact.created_at, updated_at=contact.updated_at,
+                    description=contact.description, tags=tag_names
+                ))
+            result = ContactListResponse(success=True, contacts=items, total=len(items), page=1,
+                                         page_size=PAGE_SIZE, total_pages=1)
+            body = ContactListResponse.model_validate(result.model_dump()).model_dump_json().encode()
+            db.expunge_all()
+            return body
+        
+        def projection_path():
+            # 当前路径：列投影查询结果行，整列映射后用orjson序列化
+            contacts, total = service.get_contacts(user_id=USER_ID, page=1, page_size=PAGE_SIZE)
+            rows = response_rows(ContactResponse, contacts, **LIST_FIELDS)
+            return dumps({"success": True, "contacts": rows, "total": total, "page": 1,
+                          "page_size": PAGE_SIZE, "total_pages": 1})
+        
+        for label, build in (("ORM对象+Pydantic模型+response_model", orm_path), ("列投影+response_rows+orjson", projection_path)):
+            build()
+            started = time.perf_counter()
+            for _ in range(rounds):
+                build()
+            elapsed = time.perf_counter() - started
+            
+            tracemalloc.start()
+            build()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"  {label}: 每页{elapsed / rounds * 1000:.3f}ms, 峰值内存{peak / 1024:.0f}KB")
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="联系人列表接口基准测试")
+    parser.add_argument("--seed", type=int, default=0, help="补足的测试联系人数量")
+    parser.add_argument("--requests", type=int, default=200, help="接口请求次数")
+    parser.add_argument("--rounds", type=int, default=200, help="响应构建对比的循环次数")
+    parser.add_argument("--cleanup", action="store_true", help="删除测试数据后退出")
+    args = parser.parse_args()
+    
+    if args.cleanup:
+        cleanup()
+        return
+    if args.seed:
+        seed(args.seed)
+    
+    bench_endpoint(args.requests)
+    print(f"查询{PAGE_SIZE}条联系人、构建响应数据并序列化：")
+    bench_page_build(args.rounds)
+
+
+if __name__ == "__main__":
+    main()
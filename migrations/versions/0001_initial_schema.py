@@ -0,0 +1,133 @@
+"""初始表结构（引入迁移前的基线）
+
+与引入迁移前的表结构完全一致，已有数据库不要执行本迁移，先 alembic stamp 0001 再升级；
+之后新增的表和列由0001a等后续迁移添加。
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _timestamps():
+    return [
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    ]
+
+
+def upgrade():
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(50), nullable=False),
+        sa.Column('email', sa.String(100), nullable=False),
+        sa.Column('hashed_password', sa.String(255), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('is_admin', sa.Boolean(), nullable=True),
+        *_timestamps(),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_users_id', 'users', ['id'])
+    op.create_index('ix_users_username', 'users', ['username'], unique=True)
+    op.create_index('ix_users_email', 'users', ['email'], unique=True)
+    
+    op.create_table(
+        'contact_tags',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('name', sa.String(50), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_contact_tags_id', 'contact_tags', ['id'])
+    
+    op.create_table(
+        'contacts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('name', sa.String(200), nullable=False),
+        sa.Column('first_name', sa.String(100), nullable=True),
+        sa.Column('last_name', sa.String(100), nullable=True),
+        sa.Column('email', sa.String(255), nullable=False),
+        sa.Column('company', sa.String(200), nullable=False),
+        sa.Column('domain', sa.String(255), nullable=True),
+        sa.Column('position', sa.String(200), nullable=True),
+        sa.Column('tags', sa.Text(), nullable=True),
+        *_timestamps(),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    for column in ('id', 'name', 'first_name', 'last_name', 'email', 'company'):
+        op.create_index(f'ix_contacts_{column}', 'contacts', [column])
+    
+    op.create_table(
+        'contact_tag_associations',
+        sa.Column('contact_id', sa.Integer(), sa.ForeignKey('contacts.id'), nullable=False),
+        sa.Column('tag_id', sa.Integer(), sa.ForeignKey('contact_tags.id'), nullable=False),
+        sa.PrimaryKeyConstraint('contact_id', 'tag_id'),
+    )
+    
+    op.create_table(
+        'email_accounts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('email_address', sa.String(255), nullable=False),
+        sa.Column('email_password', sa.String(255), nullable=False),
+        sa.Column('smtp_server', sa.String(255), nullable=False),
+        sa.Column('smtp_port', sa.Integer(), nullable=False),
+        sa.Column('imap_server', sa.String(255), nullable=False),
+        sa.Column('imap_port', sa.Integer(), nullable=False),
+        sa.Column('is_ssl', sa.Boolean(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('connection_status', sa.String(20), nullable=True),
+        sa.Column('last_connection_test', sa.DateTime(timezone=True), nullable=True),
+        *_timestamps(),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    for column in ('id', 'email_address', 'connection_status'):
+        op.create_index(f'ix_email_accounts_{column}', 'email_accounts', [column])
+    
+    op.create_table(
+        'email_templates',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('title', sa.String(200), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        *_timestamps(),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_email_templates_id', 'email_templates', ['id'])
+    op.create_index('ix_email_templates_title', 'email_templates', ['title'])
+    
+    op.create_table(
+        'customers',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('name', sa.String(200), nullable=False),
+        sa.Column('email', sa.String(255), nullable=False),
+        sa.Column('company', sa.String(200), nullable=False),
+        sa.Column('email_count', sa.Integer(), nullable=True),
+        sa.Column('communication_progress', sa.String(20), nullable=True),
+        sa.Column('interest_level', sa.String(20), nullable=True),
+        sa.Column('last_communication_time', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('current_progress', sa.Text(), nullable=True),
+        *_timestamps(),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    for column in ('id', 'name', 'email', 'company', 'communication_progress', 'interest_level'):
+        op.create_index(f'ix_customers_{column}', 'customers', [column])
+
+
+def downgrade():
+    for table in ('customers', 'email_templates', 'email_accounts', 'contact_tag_associations', 'contacts',
+                  'contact_tags', 'users'):
+        op.drop_table(table)
@@ -0,0 +1,123 @@
+"""邮件同步表、客户来源联系人和标签关联级联删除
+
+在基线（0001）之上添加：邮件头/正文（email_messages）、增量同步状态（email_sync_states）、
+附件（email_attachments）、客户的来源联系人（customers.contact_id），
+并把标签关联的外键改为随联系人/标签级联删除、补充按标签查联系人的索引。
+
+Revision ID: 0001a
+Revises: 0001
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0001a'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+# (外键名, 列名, 引用表)
+TAG_ASSOCIATION_FOREIGN_KEYS = [
+    ('contact_tag_associations_contact_id_fkey', 'contact_id', 'contacts'),
+    ('contact_tag_associations_tag_id_fkey', 'tag_id', 'contact_tags'),
+]
+
+
+def _timestamps():
+    return [
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    ]
+
+
+def _replace_tag_association_foreign_keys(ondelete):
+    for name, column, table in TAG_ASSOCIATION_FOREIGN_KEYS:
+        op.drop_constraint(name, 'contact_tag_associations', type_='foreignkey')
+        op.create_foreign_key(name, 'contact_tag_associations', table, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    _replace_tag_association_foreign_keys('CASCADE')
+    op.create_index('ix_contact_tag_associations_tag_id', 'contact_tag_associations', ['tag_id'])
+    
+    op.add_column('customers', sa.Column('contact_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('customers_contact_id_fkey', 'customers', 'contacts', ['contact_id'], ['id'],
+                          ondelete='SET NULL')
+    op.create_index('ix_customers_contact_id', 'customers', ['contact_id'])
+    
+    op.create_table(
+        'email_messages',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('email_account_id', sa.Integer(), sa.ForeignKey('email_accounts.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('folder', sa.String(255), nullable=False),
+        sa.Column('uid_validity', sa.BigInteger(), nullable=True),
+        sa.Column('uid', sa.BigInteger(), nullable=False),
+        sa.Column('message_id', sa.String(998), nullable=True),
+        sa.Column('in_reply_to', sa.String(998), nullable=True),
+        sa.Column('subject', sa.Text(), nullable=True),
+        sa.Column('from_name', sa.String(255), nullable=True),
+        sa.Column('from_address', sa.String(255), nullable=True),
+        sa.Column('to_addresses', sa.Text(), nullable=True),
+        sa.Column('cc_addresses', sa.Text(), nullable=True),
+        sa.Column('direction', sa.String(10), nullable=False),
+        sa.Column('counterpart_address', sa.String(255), nullable=True),
+        sa.Column('sent_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('size', sa.Integer(), nullable=True),
+        sa.Column('body_text', sa.Text(), nullable=True),
+        sa.Column('body_html', sa.Text(), nullable=True),
+        sa.Column('body_truncated', sa.Boolean(), nullable=False),
+        sa.Column('body_fetched_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email_account_id', 'folder', 'uid_validity', 'uid', name='uq_email_messages_account_folder_uid'),
+    )
+    for column in ('id', 'message_id', 'in_reply_to'):
+        op.create_index(f'ix_email_messages_{column}', 'email_messages', [column])
+    op.create_index('ix_email_messages_account_counterpart_date', 'email_messages',
+                    ['email_account_id', 'counterpart_address', 'sent_at'])
+    op.create_index('ix_email_messages_account_date', 'email_messages', ['email_account_id', 'sent_at'])
+    op.create_index('ix_email_messages_user_counterpart_date', 'email_messages',
+                    ['user_id', 'counterpart_address', 'sent_at'])
+    
+    op.create_table(
+        'email_sync_states',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email_account_id', sa.Integer(), sa.ForeignKey('email_accounts.id'), nullable=False),
+        sa.Column('folder', sa.String(255), nullable=False),
+        sa.Column('uid_validity', sa.BigInteger(), nullable=True),
+        sa.Column('last_uid', sa.BigInteger(), nullable=False),
+        sa.Column('last_synced_at', sa.DateTime(timezone=True), nullable=True),
+        *_timestamps(),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email_account_id', 'folder', name='uq_email_sync_states_account_folder'),
+    )
+    op.create_index('ix_email_sync_states_id', 'email_sync_states', ['id'])
+    op.create_index('ix_email_sync_states_email_account_id', 'email_sync_states', ['email_account_id'])
+    
+    op.create_table(
+        'email_attachments',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email_message_id', sa.Integer(), sa.ForeignKey('email_messages.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('filename', sa.String(255), nullable=False),
+        sa.Column('content_type', sa.String(255), nullable=True),
+        sa.Column('content_id', sa.String(255), nullable=True),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('storage_bucket', sa.String(255), nullable=False),
+        sa.Column('storage_key', sa.String(1024), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_email_attachments_id', 'email_attachments', ['id'])
+    op.create_index('ix_email_attachments_email_message_id', 'email_attachments', ['email_message_id'])
+
+
+def downgrade():
+    for table in ('email_attachments', 'email_sync_states', 'email_messages'):
+        op.drop_table(table)
+    op.drop_index('ix_customers_contact_id', table_name='customers')
+    op.drop_column('customers', 'contact_id')
+    op.drop_index('ix_contact_tag_associations_tag_id', table_name='contact_tag_associations')
+    _replace_tag_association_foreign_keys(None)
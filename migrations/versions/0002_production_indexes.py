@@ -0,0 +1,129 @@
+"""生产索引：与服务查询匹配的复合索引、部分索引和按用户唯一约束
+
+所有索引都用CREATE INDEX CONCURRENTLY在线创建，建索引期间表仍可读写。
+在线建索引不能放在事务里，中断后会留下无效索引，重新执行迁移时先删除再重建。
+唯一索引创建前先检查已有数据是否重复，有重复时中止迁移，处理后再执行。
+
+Revision ID: 0002
+Revises: 0001a
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0002'
+down_revision = '0001a'
+branch_labels = None
+depends_on = None
+
+# (索引名, 表名, 索引定义, 是否唯一)
+INDEXES = [
+    # 联系人/客户列表和导出：WHERE user_id = ? ORDER BY created_at DESC, id DESC
+    ('ix_contacts_user_created', 'contacts', '(user_id, created_at, id)', False),
+    ('ix_customers_user_created', 'customers', '(user_id, created_at, id)', False),
+    # 客户按沟通进度/感兴趣程度筛选和统计
+    ('ix_customers_user_progress', 'customers', '(user_id, communication_progress)', False),
+    ('ix_customers_user_interest', 'customers', '(user_id, interest_level)', False),
+    # 邮箱账户、模板列表
+    ('ix_email_accounts_user_created', 'email_accounts', '(user_id, created_at)', False),
+    ('ix_email_templates_user_created', 'email_templates', '(user_id, created_at)', False),
+    # 邮件列表：ORDER BY sent_at DESC NULLS LAST, id DESC
+    ('ix_email_messages_user_date', 'email_messages', '(user_id, sent_at DESC NULLS LAST, id DESC)', False),
+    # 标签重建任务只扫描仍有旧版标签JSON的联系人
+    ('ix_contacts_legacy_tags', 'contacts', '(id) WHERE tags IS NOT NULL', False),
+    # 按用户唯一，INSERT ... ON CONFLICT依赖这些索引
+    ('uq_contacts_user_email', 'contacts', '(user_id, lower(email))', True),
+    ('uq_customers_user_email', 'customers', '(user_id, lower(email))', True),
+    ('uq_contact_tags_user_name', 'contact_tags', '(user_id, name)', True),
+    ('uq_email_accounts_user_email', 'email_accounts', '(user_id, email_address)', True),
+]
+
+# 建好唯一索引后升级为约束的（模型中声明为UniqueConstraint，ON CONFLICT ON CONSTRAINT按约束名引用）
+CONSTRAINTS = [
+    ('uq_contact_tags_user_name', 'contact_tags'),
+    ('uq_email_accounts_user_email', 'email_accounts'),
+]
+
+# 被复合索引取代的单列索引（查询都限定在当前用户内，低基数的单列索引不会被使用）
+SUPERSEDED = [
+    ('ix_customers_communication_progress', 'customers', '(communication_progress)'),
+    ('ix_customers_interest_level', 'customers', '(interest_level)'),
+]
+
+# 唯一索引对应的重复数据检查：(索引名, 重复分组查询, 处理建议)
+DUPLICATE_CHECKS = [
+    ('uq_contacts_user_email',
+     'SELECT 1 FROM contacts GROUP BY user_id, lower(email) HAVING count(*) > 1',
+     '联系人邮箱重复，可调用 POST /contacts/merge 自动合并邮箱相同的联系人'),
+    ('uq_customers_user_email',
+     'SELECT 1 FROM customers GROUP BY user_id, lower(email) HAVING count(*) > 1',
+     '客户邮箱重复（不区分大小写），需手动合并或删除重复客户'),
+    ('uq_contact_tags_user_name',
+     'SELECT 1 FROM contact_tags GROUP BY user_id, name HAVING count(*) > 1',
+     '同一用户下存在同名标签，需合并后删除多余标签'),
+    ('uq_email_accounts_user_email',
+     'SELECT 1 FROM email_accounts GROUP BY user_id, email_address HAVING count(*) > 1',
+     '同一用户重复绑定了相同邮箱，需删除多余的邮箱账户'),
+]
+
+
+def _index_valid(name: str):
+    """索引状态：None不存在，False为中断的在线建索引留下的无效索引，True可用"""
+    return op.get_bind().execute(
+        sa.text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"), {"name": name}
+    ).scalar()
+
+
+def _constraint_exists(name: str) -> bool:
+    return op.get_bind().execute(
+        sa.text("SELECT 1 FROM pg_constraint WHERE conname = :name"), {"name": name}
+    ).scalar() is not None
+
+
+def _check_duplicates():
+    problems = []
+    for name, query, advice in DUPLICATE_CHECKS:
+        if _index_valid(name):
+            continue
+        groups = op.get_bind().execute(sa.text(f"SELECT count(*) FROM ({query}) AS duplicates")).scalar()
+        if groups:
+            problems.append(f"{name}: {groups}组重复 - {advice}")
+    if problems:
+        raise RuntimeError("无法创建唯一索引，请先处理重复数据：\n" + "\n".join(problems))
+
+
+def upgrade():
+    # alembic upgrade --sql 只输出语句，不检查数据库现状
+    offline = op.get_context().as_sql
+    if not offline:
+        _check_duplicates()
+    
+    with op.get_context().autocommit_block():
+        for name, table, definition, unique in INDEXES:
+            state = None if offline else _index_valid(name)
+            if state:
+                continue
+            if state is False:
+                op.execute(f"DROP INDEX CONCURRENTLY {name}")
+            op.execute(f"CREATE {'UNIQUE ' if unique else ''}INDEX CONCURRENTLY {name} ON {table} {definition}")
+        
+        for name, table, _ in SUPERSEDED:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    
+    # 用已建好的唯一索引创建约束，不需要再扫描表
+    for name, table in CONSTRAINTS:
+        if offline or not _constraint_exists(name):
+            op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE USING INDEX {name}")
+
+
+def downgrade():
+    for name, table in CONSTRAINTS:
+        op.execute(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {name}")
+    
+    with op.get_context().autocommit_block():
+        for name, table, definition in SUPERSEDED:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {definition}")
+        for name, _, _, _ in INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
@@ -0,0 +1,95 @@
+"""联系人表按user_id哈希分区（可选）
+
+分区数取自配置contact_partitions（环境变量CONTACT_PARTITIONS），为0时本迁移不做修改。
+已经升级过本版本后再启用分区：设置分区数后执行 alembic downgrade 0002 && alembic upgrade head
+（升级和降级都按数据库中contacts的实际状态判断，不会重复转换）。
+
+转换时复制整张contacts表，期间阻塞联系人写入（读取不受影响），应在维护窗口执行。
+分区后引用contacts.id的外键（标签关联、客户来源联系人）由删除触发器代替。
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.config import settings
+from app.core.partitioning import DROP_CONTACT_REFERENCES, contact_partition_ddl
+
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+CONTACT_INDEXES = [
+    "CREATE INDEX ix_contacts_id ON contacts (id)",
+    "CREATE INDEX ix_contacts_name ON contacts (name)",
+    "CREATE INDEX ix_contacts_first_name ON contacts (first_name)",
+    "CREATE INDEX ix_contacts_last_name ON contacts (last_name)",
+    "CREATE INDEX ix_contacts_email ON contacts (email)",
+    "CREATE INDEX ix_contacts_company ON contacts (company)",
+    "CREATE UNIQUE INDEX uq_contacts_user_email ON contacts (user_id, lower(email))",
+    "CREATE INDEX ix_contacts_user_created ON contacts (user_id, created_at, id)",
+    "CREATE INDEX ix_contacts_legacy_tags ON contacts (id) WHERE tags IS NOT NULL",
+]
+
+# (表名, 外键名, 列名, 删除规则)
+REFERENCING_FOREIGN_KEYS = [
+    ('contact_tag_associations', 'contact_tag_associations_contact_id_fkey', 'contact_id', 'CASCADE'),
+    ('customers', 'customers_contact_id_fkey', 'contact_id', 'SET NULL'),
+]
+
+
+def _partitioned() -> bool:
+    return bool(op.get_bind().execute(
+        sa.text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('contacts')")
+    ).scalar())
+
+
+def _rebuild_contacts(primary_key: str, partition_clause: str, extra_ddl):
+    """用新的表定义重建contacts并复制数据（索引在数据复制完成后创建）"""
+    op.execute("LOCK TABLE contacts IN EXCLUSIVE MODE")
+    op.execute("ALTER TABLE contacts RENAME TO contacts_old")
+    op.execute("ALTER TABLE contacts_old RENAME CONSTRAINT contacts_pkey TO contacts_old_pkey")
+    for statement in CONTACT_INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {statement.split(' ON ')[0].split()[-1]}")
+    
+    op.execute(
+        "CREATE TABLE contacts (LIKE contacts_old INCLUDING DEFAULTS, "
+        f"PRIMARY KEY ({primary_key}), FOREIGN KEY (user_id) REFERENCES users (id)) {partition_clause}"
+    )
+    for statement in extra_ddl:
+        op.execute(statement)
+    op.execute("INSERT INTO contacts SELECT * FROM contacts_old")
+    op.execute("ALTER SEQUENCE contacts_id_seq OWNED BY contacts.id")
+    op.execute("DROP TABLE contacts_old")
+    for statement in CONTACT_INDEXES:
+        op.execute(statement)
+    op.execute("ANALYZE contacts")
+
+
+def upgrade():
+    partitions = settings.contact_partitions
+    if partitions <= 0 or _partitioned():
+        return
+    
+    for table, name, _, _ in REFERENCING_FOREIGN_KEYS:
+        op.execute(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {name}")
+    _rebuild_contacts("id, user_id", "PARTITION BY HASH (user_id)", contact_partition_ddl(partitions))
+
+
+def downgrade():
+    if not _partitioned():
+        return
+    
+    for statement in DROP_CONTACT_REFERENCES:
+        op.execute(statement)
+    _rebuild_contacts("id", "", [])
+    for table, name, column, ondelete in REFERENCING_FOREIGN_KEYS:
+        op.execute(
+            f"ALTER TABLE {table} ADD CONSTRAINT {name} FOREIGN KEY ({column}) "
+            f"REFERENCES contacts (id) ON DELETE {ondelete}"
+        )
@@ -0,0 +1,29 @@
+"""用户数据变更计数表（接口ETag）
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'user_change_counters',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('scope', sa.String(50), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('user_id', 'scope'),
+    )
+
+
+def downgrade():
+    op.drop_table('user_change_counters')
@@ -0,0 +1,37 @@
+"""email_messages.uid_validity改为非空（服务器未返回UIDVALIDITY时为0）
+
+唯一约束uq_email_messages_account_folder_uid包含uid_validity，NULL互不相等，
+服务器未返回UIDVALIDITY时重复同步的邮件不会被ON CONFLICT去重。
+先删除已经重复插入的记录（保留最早的一条），再把NULL改为0并设为非空。
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        DELETE FROM email_messages duplicate
+        USING email_messages original
+        WHERE duplicate.uid_validity IS NULL AND original.uid_validity IS NULL
+          AND duplicate.email_account_id = original.email_account_id
+          AND duplicate.folder = original.folder
+          AND duplicate.uid = original.uid
+          AND duplicate.id > original.id
+    """)
+    op.execute("UPDATE email_messages SET uid_validity = 0 WHERE uid_validity IS NULL")
+    op.alter_column('email_messages', 'uid_validity', existing_type=sa.BigInteger(), nullable=False)
+
+
+def downgrade():
+    op.alter_column('email_messages', 'uid_validity', existing_type=sa.BigInteger(), nullable=True)
@@ -0,0 +1,125 @@
+"""
+批量操作服务测试（需要数据库）
+"""
+
+from sqlalchemy import select
+
+from app.core.database import change_version
+from app.models.batch import BatchOperation, BatchOperationItem
+from app.models.contact import Contact, ContactTag, contact_tag_association
+from app.models.customer import Customer, CustomerCreate
+from app.services.contact_service import ContactService
+from app.services.customer_service import CustomerService
+
+
+def create(**data) -> BatchOperationItem:
+    return BatchOperationItem(op=BatchOperation.CREATE, data=data)
+
+
+def update(record_id, **data) -> BatchOperationItem:
+    return BatchOperationItem(op=BatchOperation.UPDATE, id=record_id, data=data)
+
+
+def remove(record_id) -> BatchOperationItem:
+    return BatchOperationItem(op=BatchOperation.DELETE, id=record_id)
+
+
+def customer(email: str, name: str = "客户") -> dict:
+    return {"name": name, "email": email, "company": "甲公司"}
+
+
+def add_customers(db, user_id: int, *emails: str) -> list:
+    service = CustomerService(db)
+    return [service.create_customer(CustomerCreate(**customer(email)), user_id).id for email in emails]
+
+
+def customer_emails(db, user_id: int) -> dict:
+    return dict(db.execute(select(Customer.id, Customer.email).where(Customer.user_id == user_id)).all())
+
+
+def test_each_item_is_reported_and_valid_items_are_applied(db, user_id, other_user_id):
+    kept, deleted = add_customers(db, user_id, "kept@example.com", "deleted@example.com")
+    foreign, = add_customers(db, other_user_id, "foreign@example.com")
+    
+    response = CustomerService(db).batch_operations([
+        create(**customer("new@example.com")),
+        create(**customer("NEW@example.com")),  # 与同一批前面的创建项重复
+        create(**customer("kept@example.com")),  # 已存在
+        create(name="缺少邮箱", company="甲公司"),
+        update(kept, name="已更新"),
+        update(kept, name="重复"),
+        update(foreign, name="别人的客户"),
+        remove(deleted),
+        remove(None),
+    ], user_id)
+    
+    results = response.results
+    assert [result.success for result in results] == [True, False, False, False, True, False, False, True, False]
+    assert (response.total, response.succeeded, response.failed) == (9, 3, 6)
+    assert not response.success and response.error_message is None
+    assert results[1].error_message == results[2].error_message == "该邮箱已存在"
+    assert results[3].error_message.startswith("email:")
+    assert results[5].error_message == "同一记录在批量操作中重复出现"
+    assert results[6].error_message == "记录不存在"
+    assert results[8].error_message == "缺少记录ID"
+    
+    assert customer_emails(db, user_id) == {kept: "kept@example.com", results[0].id: "new@example.com"}
+    assert db.get(Customer, kept).name == "已更新"
+    assert db.get(Customer, foreign).name == "客户"
+
+
+def test_database_error_rolls_back_the_whole_batch(db, user_id):
+    first, second = add_customers(db, user_id, "first@example.com", "second@example.com")
+    
+    response = CustomerService(db).batch_operations([
+        create(**customer("third@example.com")),
+        update(first, email="SECOND@example.com"),  # 违反(user_id, lower(email))唯一索引
+        remove(second),
+    ], user_id)
+    
+    assert response.succeeded == 0
+    assert response.error_message.startswith("批量操作执行失败，已全部回滚")
+    assert all(result.error_message == response.error_message for result in response.results)
+    assert customer_emails(db, user_id) == {first: "first@example.com", second: "second@example.com"}
+
+
+def test_writes_bump_only_the_users_change_counter(db, user_id, other_user_id):
+    record_id, = add_customers(db, user_id, "counted@example.com")
+    add_customers(db, other_user_id, "other@example.com")
+    before = change_version(db, user_id, "customers")
+    other_before = change_version(db, other_user_id, "customers")
+    db.commit()
+    
+    response = CustomerService(db).batch_operations([update(record_id, name="改名")], user_id)
+    
+    assert response.success
+    global_before, user_before = before.split(".")
+    global_after, user_after = change_version(db, user_id, "customers").split(".")
+    assert global_after == global_before
+    assert int(user_after) == int(user_before) + 1
+    assert change_version(db, other_user_id, "customers") == other_before
+
+
+def test_contact_batch_writes_and_replaces_tags(db, user_id):
+    service = ContactService(db)
+    created = service.batch_operations([
+        create(name="张三", email="zs@example.com", company="甲公司", tag_names=["VIP", "老客户"]),
+    ], user_id)
+    contact_id = created.results[0].id
+    
+    def tag_names():
+        return set(db.execute(
+            select(ContactTag.name)
+            .join(contact_tag_association, contact_tag_association.c.tag_id == ContactTag.id)
+            .where(contact_tag_association.c.contact_id == contact_id)
+        ).scalars())
+    
+    assert created.success
+    assert tag_names() == {"VIP", "老客户"}
+    
+    assert service.batch_operations([update(contact_id, tag_names=["新标签"])], user_id).success
+    assert tag_names() == {"新标签"}
+    
+    assert service.batch_operations([remove(contact_id)], user_id).success
+    assert db.get(Contact, contact_id) is None
+    assert tag_names() == set()
@@ -0,0 +1,92 @@
+"""
+联系人导入的文件读取和行校验测试
+"""
+
+import io
+
+import pytest
+from pydantic import ValidationError
+
+from app.models.contact import ContactCreate
+from app.services.contact_import_service import (
+    ContactImportService, check_csv_encoding, detect_file_format, iter_csv_rows, iter_xlsx_rows
+)
+
+
+def csv_file(text: str, encoding: str = "utf-8") -> io.BytesIO:
+    return io.BytesIO(text.encode(encoding))
+
+
+@pytest.mark.parametrize("file_format, content_type, filename, expected", [
+    ("XLSX", None, "a.csv", "xlsx"),
+    (None, "application/vnd.ms-excel", "contacts.csv", "csv"),
+    (None, None, "contacts.XLSX", "xlsx"),
+    (None, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", None, "xlsx"),
+    (None, "application/vnd.ms-excel", None, "csv"),
+    (None, None, None, "csv"),
+])
+def test_detect_file_format(file_format, content_type, filename, expected):
+    assert detect_file_format(file_format, content_type, filename) == expected
+
+
+def test_csv_rows_map_header_aliases_and_skip_blank_lines():
+    fileobj = csv_file("\ufeff姓名,E-mail,公司,备注,标签\n张三,zs@example.com,甲公司,忽略,VIP\n,,,,\n李四,ls@example.com,乙公司,,\n")
+    assert list(iter_csv_rows(fileobj)) == [
+        (2, {"name": "张三", "email": "zs@example.com", "company": "甲公司", "tag_names": "VIP"}),
+        (4, {"name": "李四", "email": "ls@example.com", "company": "乙公司", "tag_names": ""}),
+    ]
+
+
+def test_utf8_csv_passes_encoding_check_and_rewinds():
+    fileobj = csv_file("姓名,邮箱\n张三,zs@example.com\n")
+    check_csv_encoding(fileobj, chunk_size=4)  # 多字节字符跨块也能解码
+    assert fileobj.tell() == 0
+
+
+def test_non_utf8_csv_is_rejected_with_line_number():
+    fileobj = csv_file("name,email,company\nzs,zs@example.com,acme\n张三,a@example.com,甲公司\n", "gbk")
+    with pytest.raises(ValueError, match="第3行"):
+        check_csv_encoding(fileobj, chunk_size=8)
+
+
+def test_validate_row_matches_contact_create():
+    contact = ContactImportService.validate_row({
+        "name": " 张三 ", "email": "ZS@Example.com", "company": "甲公司", "position": "",
+        "tag_names": "VIP，重要客户; ;老客户",
+    })
+    assert contact == ContactCreate(
+        name="张三", email="ZS@example.com", company="甲公司", tag_names=["VIP", "重要客户", "老客户"]
+    )
+    assert contact.position is None
+
+
+@pytest.mark.parametrize("email", ["not-an-email", "a@b", "a..b@example.com", "a@-example.com"])
+def test_validate_row_rejects_what_contact_create_rejects(email):
+    row = {"name": "张三", "email": email, "company": "甲公司"}
+    with pytest.raises(ValidationError):
+        ContactCreate(**row)
+    with pytest.raises(ValidationError):
+        ContactImportService.validate_row(row)
+
+
+def test_validate_row_requires_contact_create_fields():
+    with pytest.raises(ValidationError) as error:
+        ContactImportService.validate_row({"name": "张三", "email": "zs@example.com", "company": " "})
+    assert [item["loc"] for item in error.value.errors()] == [("company",)]
+
+
+def test_xlsx_rows_are_read_as_strings():
+    openpyxl = pytest.importorskip("openpyxl")
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["Name", "Email", "Company", "Position"])
+    sheet.append(["张三", "zs@example.com", "甲公司", 3])
+    sheet.append([None, None, None, None])
+    sheet.append(["李四", "ls@example.com", "乙公司", None])
+    fileobj = io.BytesIO()
+    workbook.save(fileobj)
+    fileobj.seek(0)
+    assert list(iter_xlsx_rows(fileobj)) == [
+        (2, {"name": "张三", "email": "zs@example.com", "company": "甲公司", "position": "3"}),
+        (4, {"name": "李四", "email": "ls@example.com", "company": "乙公司", "position": ""}),
+    ]
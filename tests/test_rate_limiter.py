@@ -0,0 +1,107 @@
+"""
+邮件发送限流器测试
+"""
+
+import asyncio
+
+import pytest
+
+from app.email.rate_limiter import SendRateLimiter, TokenBucket
+
+
+def make_limiter(**overrides) -> SendRateLimiter:
+    options = dict(account_rate=0.001, account_burst=2, domain_rate=0.001, domain_burst=5, max_wait=10000)
+    options.update(overrides)
+    return SendRateLimiter(**options)
+
+
+def test_bucket_allows_burst_then_queues_reservations():
+    bucket = TokenBucket(rate=1, capacity=2)
+    now = bucket.updated_at
+    assert bucket.reserve(now) == 0.0
+    assert bucket.reserve(now) == 0.0
+    # 透支后按预约顺序排队：第3个等1秒，第4个等2秒
+    assert bucket.reserve(now) == pytest.approx(1.0)
+    assert bucket.reserve(now) == pytest.approx(2.0)
+
+
+def test_bucket_refills_with_elapsed_time_up_to_capacity():
+    bucket = TokenBucket(rate=2, capacity=3)
+    now = bucket.updated_at
+    for _ in range(3):
+        bucket.reserve(now)
+    assert bucket.snapshot(now)["tokens"] == 0
+    assert bucket.snapshot(now + 1)["tokens"] == 2
+    assert not bucket.is_idle(now + 1)
+    assert bucket.is_idle(now + 100)
+    assert bucket.snapshot(now + 100)["tokens"] == 3
+
+
+def test_bucket_cancel_returns_token():
+    bucket = TokenBucket(rate=1, capacity=1)
+    now = bucket.updated_at
+    bucket.reserve(now)
+    assert bucket.reserve(now) == pytest.approx(1.0)
+    bucket.cancel()
+    assert bucket.snapshot(now)["wait_seconds"] == 0.0
+    bucket.cancel()
+    bucket.cancel()
+    assert bucket.snapshot(now)["tokens"] == 1  # 退还不超过容量
+
+
+def test_get_domains_dedupes_case_insensitively():
+    assert SendRateLimiter.get_domains(["a@Example.com", "b@example.COM ", "c@other.org"]) == [
+        "example.com", "other.org"
+    ]
+
+
+def test_reserve_uses_the_longest_wait_of_account_and_domains():
+    limiter = make_limiter(account_burst=10, domain_burst=1)
+    assert limiter.reserve(1, ["a@example.com"]) == (True, 0.0)
+    # 账户桶还有令牌，域名桶已空（所有账户共享）
+    acquired, wait = limiter.reserve(2, ["b@example.com"])
+    assert acquired
+    assert wait == pytest.approx(1000, rel=1e-3)
+
+
+def test_reserve_over_max_wait_is_rejected_and_released():
+    limiter = make_limiter(max_wait=1)
+    assert limiter.reserve(1, ["a@example.com"]) == (True, 0.0)
+    assert limiter.reserve(1, ["a@example.com"]) == (True, 0.0)
+    acquired, wait = limiter.reserve(1, ["a@example.com"])
+    assert not acquired
+    assert wait == pytest.approx(1000, rel=1e-3)
+    # 被拒绝的发送不占用令牌，域名桶仍只被占用2个
+    status = limiter.get_status()
+    assert status["accounts"]["1"]["tokens"] == pytest.approx(0, abs=0.01)
+    assert status["domains"]["example.com"]["tokens"] == pytest.approx(3, abs=0.01)
+
+
+def test_status_only_lists_domains_of_requested_accounts():
+    limiter = make_limiter()
+    limiter.reserve(1, ["a@mine.com"])
+    limiter.reserve(2, ["b@theirs.com"])
+    status = limiter.get_status([1, 3])
+    assert list(status["accounts"]) == ["1"]
+    assert list(status["domains"]) == ["mine.com"]
+    assert set(limiter.get_status()["domains"]) == {"mine.com", "theirs.com"}
+
+
+def test_idle_buckets_are_evicted_with_their_domain_records():
+    limiter = make_limiter(account_rate=1e9, domain_rate=1e9)
+    limiter.MAX_BUCKETS = 2
+    limiter.reserve(1, ["a@one.com"])
+    limiter.reserve(2, ["b@two.com"])
+    limiter.reserve(3, ["c@three.com"])
+    status = limiter.get_status()
+    assert list(status["accounts"]) == ["3"]
+    assert list(status["domains"]) == ["three.com"]
+    assert limiter.get_status([1])["domains"] == {}
+
+
+def test_acquire_waits_for_reserved_token():
+    limiter = make_limiter(account_rate=50, account_burst=1, domain_rate=50, domain_burst=1)
+    assert asyncio.run(limiter.acquire(1, ["a@example.com"])) == (True, 0.0)
+    acquired, wait = asyncio.run(limiter.acquire(1, ["a@example.com"]))
+    assert acquired
+    assert 0 < wait <= 0.02
@@ -0,0 +1,171 @@
+"""
+快速JSON响应测试：列投影结果直接转换的响应数据必须与Pydantic模型的输出一致
+"""
+
+from collections import namedtuple
+from datetime import date, datetime, timezone, timedelta
+import json
+from typing import Optional
+
+import pytest
+from pydantic import BaseModel
+from sqlalchemy import update
+
+from fastapi import Request
+from fastapi.testclient import TestClient
+
+from app.core import responses
+from app.core.responses import dumps, make_etag, not_modified, response_rows
+from app.main import app
+from app.models.contact import Contact, ContactCreate, ContactResponse
+from app.models.customer import CommunicationProgress
+from app.routers.overseas import MockUser, get_current_user
+from app.services.contact_service import ContactService, LIST_FIELDS
+
+
+class Item(BaseModel):
+    id: int
+    name: str
+    progress: CommunicationProgress
+    created_at: datetime
+    due: Optional[date] = None
+    label: str = ""
+
+
+ITEM = Item(
+    id=1, name="张三 \"引号\"", progress=CommunicationProgress.PENDING,
+    created_at=datetime(2026, 10, 19, 8, 30, 15, 123456, tzinfo=timezone.utc), due=date(2026, 12, 31)
+)
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_dumps_matches_pydantic_json(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(responses, "orjson", None)
+    elif responses.orjson is None:
+        pytest.skip("未安装orjson")
+    
+    local = ITEM.model_copy(update={"created_at": datetime(2026, 1, 1, 9, tzinfo=timezone(timedelta(hours=8)))})
+    naive = ITEM.model_copy(update={"created_at": datetime(2026, 1, 1, 9)})
+    for item in (ITEM, local, naive):
+        assert json.loads(dumps(item.model_dump())) == json.loads(item.model_dump_json())
+    assert dumps(ITEM.model_dump()).decode("utf-8") == ITEM.model_dump_json()
+
+
+def test_response_rows_follow_model_field_order_and_drop_extra_columns():
+    Row = namedtuple("Row", ["created_at", "name", "id", "internal", "progress", "due", "label"])
+    rows = [
+        Row(ITEM.created_at, ITEM.name, 1, "不返回", CommunicationProgress.PENDING, ITEM.due, ""),
+        Row(ITEM.created_at, "李四", 2, "不返回", CommunicationProgress.PENDING, None, ""),
+    ]
+    data = response_rows(Item, rows)
+    assert [list(row) for row in data] == [list(Item.model_fields)] * 2
+    assert data[0] == ITEM.model_dump()
+    assert data[1]["due"] is None
+
+
+def test_response_rows_computed_fields_run_in_order():
+    Row = namedtuple("Row", ["id", "name", "progress", "created_at", "due"])
+    rows = [Row(1, "a", CommunicationProgress.PENDING, ITEM.created_at, None)]
+    data = response_rows(
+        Item, rows,
+        name=lambda columns: [name.upper() for name in columns["name"]],
+        label=lambda columns: [f"{record_id}:{name}" for record_id, name in zip(columns["id"], columns["name"])],
+    )
+    assert (data[0]["name"], data[0]["label"]) == ("A", "1:A")
+
+
+def test_response_rows_of_empty_result():
+    assert response_rows(Item, []) == []
+
+
+def test_contact_list_rows_match_contact_response(db, user_id):
+    service = ContactService(db)
+    contact = service.create_contact(ContactCreate(
+        name="张三", email="zs@example.com", company="甲公司", position="经理", tag_names=["VIP", "老客户"]
+    ), user_id)
+    # 尚未转换的旧版JSON标签也要合并进列表
+    db.execute(update(Contact).where(Contact.id == contact.id).values(tags='["VIP", "旧标签"]'))
+    db.commit()
+    
+    rows, total = service.get_contacts(user_id=user_id)
+    listed = json.loads(dumps(response_rows(ContactResponse, rows, **LIST_FIELDS)))
+    
+    db.expire_all()
+    contact = service.get_contact_with_tags(contact.id, user_id)
+    expected = ContactResponse(
+        id=contact.id, user_id=contact.user_id, name=contact.name, first_name=contact.first_name,
+        last_name=contact.last_name, email=contact.email, company=contact.company, domain=contact.domain,
+        position=contact.position, tag_names=contact.tag_names, created_at=contact.created_at,
+        updated_at=contact.updated_at, description=contact.description, tags=contact.tag_names
+    )
+    assert total == 1
+    assert listed == [json.loads(expected.model_dump_json())]
+    assert listed[0]["tags"] == ["VIP", "老客户", "旧标签"]
+
+
+def make_request(if_none_match: Optional[str] = None) -> Request:
+    headers = [(b"if-none-match", if_none_match.encode("latin-1"))] if if_none_match is not None else []
+    return Request({
+        "type": "http", "method": "GET", "path": "/contacts/", "query_string": b"",
+        "headers": headers, "server": ("testserver", 80), "scheme": "http",
+    })
+
+
+def test_make_etag_is_weak_and_depends_on_every_part():
+    etag = make_etag("contacts", 1, "0.5", "page=1")
+    assert etag.startswith('W/"') and etag.endswith('"')
+    assert etag == make_etag("contacts", 1, "0.5", "page=1")
+    assert etag != make_etag("contacts", 1, "0.6", "page=1")
+    assert etag != make_etag("contacts", 1, "0.5", "page=2")
+    assert etag != make_etag("contacts", 2, "0.5", "page=1")
+
+
+@pytest.mark.parametrize("header, matches", [
+    (None, False),
+    ("", False),
+    ('W/"other"', False),
+    ('W/"abc"', True),
+    ('"abc"', True),  # 弱比较：不区分W/前缀
+    ('W/"other", W/"abc"', True),
+    ('"ab"', False),
+])
+def test_not_modified_compares_if_none_match_weakly(header, matches):
+    response = not_modified(make_request(header), 'W/"abc"', "private, no-cache")
+    if not matches:
+        assert response is None
+        return
+    assert response.status_code == 304
+    assert response.body == b""
+    assert response.headers["etag"] == 'W/"abc"'
+    assert response.headers["cache-control"] == "private, no-cache"
+
+
+@pytest.fixture
+def client(user_id):
+    user = MockUser()
+    user.id = user_id
+    app.dependency_overrides[get_current_user] = lambda: user
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+
+
+def test_contact_list_revalidates_until_contacts_change(client):
+    first = client.get("/contacts/", params={"page_size": 5})
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    
+    cached = client.get("/contacts/", params={"page_size": 5}, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+    # 查询参数不同时ETag也不同
+    assert client.get("/contacts/", params={"page_size": 6}, headers={"If-None-Match": etag}).status_code == 200
+    
+    created = client.post("/contacts/", json={"name": "张三", "email": "zs@example.com", "company": "甲公司"})
+    assert created.status_code < 300
+    changed = client.get("/contacts/", params={"page_size": 5}, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert [contact["email"] for contact in changed.json()["contacts"]] == ["zs@example.com"]